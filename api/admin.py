@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Count, OuterRef
 from .models import User, Batch, Student, Attendance, AttendanceRecord, FeePayment, Test, TestMark
+from .queries import subquery_aggregate
 
 
 @admin.register(User)
@@ -34,9 +36,15 @@ class BatchAdmin(admin.ModelAdmin):
     search_fields = ['name', 'user__name', 'user__institute_name']
     readonly_fields = ['created_at', 'updated_at']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _student_count=subquery_aggregate(Student.objects.filter(batch=OuterRef('pk')), Count('id')),
+        )
+
     def student_count(self, obj):
-        return obj.students.count()
+        return obj._student_count
     student_count.short_description = 'Students'
+    student_count.admin_order_field = '_student_count'
 
 
 @admin.register(Student)
@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .phones import to_e164
+
+
+class PhoneBackend(ModelBackend):
+    """
+    Authenticate by phone through the indexed `phone_e164` column.
+
+    ModelBackend would look the user up by `phone`, which parses the typed
+    number with `phonenumbers` on every login attempt.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        e164 = to_e164(str(username))
+        user = get_user_model()._default_manager.filter(phone_e164=e164).first() if e164 else None
+        if user is None:
+            # Run the hasher anyway to keep timing the same for unknown numbers
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,265 @@
+"""
+Set-based bulk operations on a tenant's students.
+
+    POST /api/students/bulk/
+    {"ids": [...]} / {"batch_id": "<uuid>" | "none"} / {"all": true}   which students
+    + {"operation": {"type": "move_batch", "batch": "<uuid>" | null}}
+      {"operation": {"type": "adjust_fees", "percent": 10}}            or "amount" / "set"
+      {"operation": {"type": "delete"}}
+    + {"dry_run": true}                                                preview only
+
+The matching ids are read once and the operation runs as one UPDATE (or one
+DELETE per dependent table) per BULK_CHUNK_SIZE ids, each chunk in its own
+transaction so no lock is held for the whole run. Querysets update and
+delete without model signals, so the side effects the signals would have had
+are applied here once per chunk: updated_at for sync, tombstones, rollups and
+the tenant data version.
+"""
+from decimal import Decimal, InvalidOperation
+from uuid import UUID
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .cache import bump_tenant_version
+from .imports import chunked
+from .models import (
+    Attendance, AttendanceRecord, Batch, FeePayment, FeeSnapshot, Student, SyncTombstone, Test, TestMark,
+)
+from .rollups import mark_rollups_dirty
+from .sync import ENTITY_NAMES, touch_sync_parents
+
+BULK_CHUNK_SIZE = 1000
+PREVIEW_SIZE    = 20
+MAX_FEES        = Decimal('99999999.99')        # Student.total_fees max_digits=10
+
+
+class BulkError(ValueError):
+    """The request cannot be applied; nothing was written."""
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Selection
+# ─────────────────────────────────────────────────────────────────────────────
+
+def select_students(user, data):
+    """The tenant's students picked by "ids", "batch_id" and/or "all"."""
+    students = Student.objects.filter(user=user)
+    if not any(key in data for key in ('ids', 'batch_id', 'all')):
+        raise BulkError('Choose students with "ids", "batch_id" or "all": true')
+
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids:
+            raise BulkError('"ids" must be a non-empty list')
+        students = students.filter(id__in=[_uuid(value, 'ids') for value in ids])
+    if 'batch_id' in data:
+        batch_id = data['batch_id']
+        students = (students.filter(batch__isnull=True) if batch_id in (None, 'none')
+                    else students.filter(batch_id=_uuid(batch_id, 'batch_id')))
+    if 'all' in data and data['all'] is not True:
+        raise BulkError('"all" must be true')
+    return students
+
+
+def _uuid(value, label):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise BulkError(f'"{value}" in "{label}" is not a valid id')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Operations
+# ─────────────────────────────────────────────────────────────────────────────
+
+class MoveBatch:
+    name = 'move_batch'
+
+    def __init__(self, user, data):
+        batch_id = data.get('batch')
+        self.batch = None
+        if batch_id is not None:
+            self.batch = Batch.objects.filter(user=user, id=_uuid(batch_id, 'batch')).first()
+            if self.batch is None:
+                raise BulkError('Invalid batch selected')
+
+    def changing(self, students):
+        # Students already in the target batch are not touched
+        if self.batch is None:
+            return students.filter(batch__isnull=False)
+        return students.exclude(batch_id=self.batch.id)
+
+    def values(self):
+        return {'batch': self.batch}
+
+    def check(self, students):
+        pass
+
+    def preview(self, student):
+        return {'batch': str(student.batch_id) if student.batch_id else None,
+                'new_batch': str(self.batch.id) if self.batch else None}
+
+
+class AdjustFees:
+    name = 'adjust_fees'
+
+    def __init__(self, user, data):
+        given = [key for key in ('percent', 'amount', 'set') if data.get(key) not in (None, '')]
+        if len(given) != 1:
+            raise BulkError('adjust_fees needs exactly one of "percent", "amount" or "set"')
+        self.kind = given[0]
+        try:
+            self.value = Decimal(str(data[self.kind]))
+        except InvalidOperation:
+            raise BulkError(f'"{self.kind}" must be a number')
+        if not self.value.is_finite() or (self.kind == 'percent' and self.value < -100):
+            raise BulkError(f'"{self.kind}" is out of range')
+
+    def expression(self):
+        if self.kind == 'percent':
+            return Round(F('total_fees') * Value(1 + self.value / 100), 2)
+        if self.kind == 'amount':
+            return F('total_fees') + Value(self.value)
+        return Value(self.value)
+
+    def changing(self, students):
+        return students
+
+    def values(self):
+        return {'total_fees': self.expression()}
+
+    def check(self, students):
+        bounds = students.aggregate(low=Min(self.expression()), high=Max(self.expression()))
+        if bounds['low'] is not None and (bounds['low'] < 0 or bounds['high'] > MAX_FEES):
+            raise BulkError(f'New total fees would range from {bounds["low"]} to {bounds["high"]}, '
+                            f'outside 0 to {MAX_FEES}')
+
+    def preview(self, student):
+        if self.kind == 'percent':
+            new = (student.total_fees * (1 + self.value / 100)).quantize(Decimal('0.01'))
+        elif self.kind == 'amount':
+            new = student.total_fees + self.value
+        else:
+            new = self.value
+        return {'total_fees': str(student.total_fees), 'new_total_fees': str(new)}
+
+
+class Delete:
+    name = 'delete'
+
+    def __init__(self, user, data):
+        pass
+
+    def changing(self, students):
+        return students
+
+    def check(self, students):
+        pass
+
+    def preview(self, student):
+        return {}
+
+
+OPERATIONS = {op.name: op for op in (MoveBatch, AdjustFees, Delete)}
+
+
+def parse_operation(user, data):
+    if not isinstance(data, dict) or data.get('type') not in OPERATIONS:
+        raise BulkError(f'"operation" needs a "type": {", ".join(OPERATIONS)}')
+    return OPERATIONS[data['type']](user, data)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Dry run / apply
+# ─────────────────────────────────────────────────────────────────────────────
+
+def preview_operation(students, operation):
+    """What `operation` would do, without writing."""
+    changing = operation.changing(students)
+    operation.check(changing)
+
+    sample = changing.order_by('name', 'id').only('id', 'name', 'roll', 'batch_id', 'total_fees')
+    result = {
+        'matched':  students.count(),
+        'affected': changing.count(),
+        'preview':  [
+            {'id': str(s.id), 'name': s.name, 'roll': s.roll, **operation.preview(s)}
+            for s in sample[:PREVIEW_SIZE]
+        ],
+    }
+    if isinstance(operation, Delete):
+        result['deleted'] = {
+            'students':           result['affected'],
+            'attendance_records': AttendanceRecord.objects.filter(student__in=changing).count(),
+            'test_marks':         TestMark.objects.filter(student__in=changing).count(),
+            'fee_payments':       FeePayment.objects.filter(student__in=changing).count(),
+        }
+    return result
+
+
+def apply_operation(user, students, operation):
+    """Run `operation` chunk by chunk; returns the counts written."""
+    operation.check(operation.changing(students))
+    matched = list(students.order_by('id').values_list('id', flat=True))
+
+    result = {'matched': len(matched), 'affected': 0}
+    if isinstance(operation, Delete):
+        result['deleted'] = dict.fromkeys(('students', 'attendance_records', 'test_marks', 'fee_payments'), 0)
+
+    for chunk in chunked(matched, BULK_CHUNK_SIZE):
+        with transaction.atomic():
+            rows = operation.changing(Student.objects.filter(user=user, id__in=chunk))
+            if isinstance(operation, Delete):
+                counts = _delete_chunk(user, rows)
+                for key, count in counts.items():
+                    result['deleted'][key] += count
+                result['affected'] += counts['students']
+            else:
+                # updated_at is what delta sync reads (api/sync.py)
+                result['affected'] += rows.update(**operation.values(), updated_at=timezone.now())
+
+    if result['affected']:
+        bump_tenant_version(user.id)
+    return result
+
+
+def _delete_chunk(user, students):
+    """
+    Delete students and everything that cascades from them with one DELETE
+    per table. The cascade collector would load every attendance record,
+    mark and payment and send a signal for each one.
+    """
+    ids      = list(students.values_list('id', flat=True))
+    records  = AttendanceRecord.objects.filter(student_id__in=ids)
+    marks    = TestMark.objects.filter(student_id__in=ids)
+    payments = FeePayment.objects.filter(student_id__in=ids)
+
+    # Sessions and tests lose rows (synced inside them), and their days'
+    # rollups lose facts
+    sessions    = dict(records.values_list('attendance_id', 'attendance__date').distinct())
+    tests       = dict(marks.values_list('test_id', 'test__date').distinct())
+    paid        = dict(payments.values_list('id', 'payment_date'))
+
+    # SET_NULL references are the collector's job too
+    FeeSnapshot.objects.filter(student_id__in=ids).update(student=None)
+
+    counts = {
+        'attendance_records': records._raw_delete(records.db),
+        'test_marks':         marks._raw_delete(marks.db),
+        'fee_payments':       payments._raw_delete(payments.db),
+        'students':           Student.objects.filter(id__in=ids)._raw_delete(students.db),
+    }
+
+    SyncTombstone.objects.bulk_create(
+        [SyncTombstone(user=user, entity=ENTITY_NAMES[Student], object_id=pk) for pk in ids]
+        + [SyncTombstone(user=user, entity=ENTITY_NAMES[FeePayment], object_id=pk) for pk in paid]
+    )
+    touch_sync_parents(Attendance, *sessions)
+    touch_sync_parents(Test, *tests)
+    mark_rollups_dirty(
+        user.id, *sessions.values(), *tests.values(), *(timezone.localdate(at) for at in paid.values() if at),
+    )
+    return counts
@@ -0,0 +1,200 @@
+"""
+Per-tenant response cache.
+
+Every tenant has a data version that is bumped whenever one of its rows is
+written (see api/signals.py). Cached responses are keyed on that version, so
+a single write makes all of the tenant's cached reports stale at once without
+having to know which keys exist.
+
+The same version drives conditional GET (@conditional_get): clients that send
+back the ETag of their copy get 304 Not Modified without the view running.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from rest_framework.response import Response
+
+from .json_sql import RawJSONResponse
+
+RESPONSE_CACHE_TIMEOUT = 60 * 15
+
+# Endpoint names registered through @cached_tenant_response, for the stats view
+CACHED_ENDPOINTS: list[str] = []
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Tenant data version
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _version_key(user_id):
+    return f'tenant-version:{user_id}'
+
+
+def tenant_version(user_id):
+    """Current data version of a tenant (microseconds since epoch of the last write)."""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Unknown (cold or evicted) — start a fresh version, which simply
+        # makes anything cached under an older one unreachable.
+        fresh = time.time_ns() // 1000
+        cache.add(_version_key(user_id), fresh, None)
+        # A dummy cache (benchmarks) keeps nothing: every request is a new version
+        version = cache.get(_version_key(user_id), fresh)
+    return version
+
+
+def bump_tenant_version(user_id):
+    """Mark a tenant's data as changed once the current transaction commits."""
+    if user_id is not None:
+        transaction.on_commit(lambda: _bump(user_id))
+
+
+def _bump(user_id):
+    previous = cache.get(_version_key(user_id)) or 0
+    cache.set(_version_key(user_id), max(time.time_ns() // 1000, previous + 1), None)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Response cache
+# ─────────────────────────────────────────────────────────────────────────────
+
+def cached_tenant_response(endpoint, timeout=RESPONSE_CACHE_TIMEOUT):
+    """
+    Cache successful GET responses of a function view per tenant.
+
+    Place it directly above the view function (below @permission_classes) so
+    that it runs after authentication. The key covers the tenant's data
+    version, today's date, the URL kwargs and the query string.
+    """
+    CACHED_ENDPOINTS.append(endpoint)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            key  = _response_key(endpoint, request, kwargs)
+            data = cache.get(key)
+            if data is not None:
+                _count(endpoint, 'hits')
+                # bytes: a document rendered by the database (api/json_sql.py)
+                return RawJSONResponse(data) if isinstance(data, bytes) else Response(data)
+
+            _count(endpoint, 'misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                if isinstance(response, Response):
+                    cache.set(key, response.data, timeout)
+                elif isinstance(response, RawJSONResponse):
+                    cache.set(key, response.content, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def _response_key(endpoint, request, kwargs):
+    user_id = request.user.id
+    params  = sorted(request.query_params.lists())
+    digest  = hashlib.sha1(repr((sorted(kwargs.items()), params)).encode()).hexdigest()
+    return (
+        f'tenant-response:{endpoint}:{user_id}:{tenant_version(user_id)}:'
+        f'{timezone.localdate()}:{digest}'
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Conditional GET
+# ─────────────────────────────────────────────────────────────────────────────
+
+def tenant_data_version(request):
+    return tenant_version(request.user.id)
+
+
+def user_data_version(request):
+    """Version of data that lives on the user row itself (the auth profile)."""
+    return int(request.user.updated_at.timestamp() * 1_000_000)
+
+
+def conditional_get(version=tenant_data_version):
+    """
+    Answer GET/HEAD with 304 Not Modified while the client's copy is current.
+
+    The ETag comes from `version(request)` (microseconds since epoch of the
+    last write), so checking it queries and serializes nothing. It also
+    changes at local midnight, as reports depend on today's date, and at each
+    MEDIA_URL_TTL boundary, as responses embed signed media links that expire.
+
+    No Last-Modified is sent: at one-second resolution it cannot tell apart
+    two writes in the same second, and If-Modified-Since would then answer
+    304 for the second one.
+
+    Place it directly above the view function (and above
+    @cached_tenant_response) so that it runs after authentication.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            etag     = _etag(view, request, version(request))
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            # Tenant data: never shared, always revalidated
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
+
+
+def _etag(view, request, version):
+    ttl   = getattr(settings, 'MEDIA_URL_TTL', 3600)
+    today = timezone.localdate()
+
+    # The renderer is part of the representation (JSON vs browsable API)
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+    state    = (view.__module__, view.__name__, request.user.id, version, str(today),
+                int(time.time()) // ttl, renderer)
+    return '"' + hashlib.sha1(repr(state).encode()).hexdigest() + '"'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Hit / miss counters
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _count(endpoint, kind):
+    key = f'cache-stats:{endpoint}:{kind}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First count, or a backend that keeps nothing (DummyCache)
+        cache.add(key, 1, None)
+
+
+def cache_stats():
+    """Hit/miss counters for every cached endpoint."""
+    keys   = [f'cache-stats:{e}:{k}' for e in CACHED_ENDPOINTS for k in ('hits', 'misses')]
+    values = cache.get_many(keys)
+
+    stats = {}
+    for endpoint in CACHED_ENDPOINTS:
+        hits   = values.get(f'cache-stats:{endpoint}:hits', 0)
+        misses = values.get(f'cache-stats:{endpoint}:misses', 0)
+        stats[endpoint] = {
+            'hits':      hits,
+            'misses':    misses,
+            'hit_ratio': round(hits / (hits + misses) * 100, 2) if hits + misses else 0,
+        }
+    return stats
@@ -0,0 +1,146 @@
+"""
+Profile picture processing.
+
+Uploads are stored as-is and the student is marked `pending`; the heavy work
+then runs on a small thread pool after the transaction commits:
+
+- apply the EXIF orientation and re-encode without metadata (GPS, camera
+  serial, ...), capped at PROFILE_PIC_MAX_SIZE pixels on the long edge;
+- write square thumbnails for every size in THUMBNAIL_SIZES, as WebP and JPEG;
+- record the thumbnail names and mark the student `ready` (or `failed`).
+
+PROFILE_PIC_WORKERS = 0 processes inline, which is what the tests use. Jobs
+live in memory only: `python manage.py resume_profile_pics` processes the
+pictures a restart left `pending` (resume_pending below).
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache import bump_tenant_version
+from .models import Student
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = {'small': 96, 'medium': 320}
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+THUMBNAIL_DIR = 'student_thumbs'
+
+PROFILE_PIC_MAX_SIZE = 1600
+JPEG_QUALITY = 85
+
+_executor = None
+
+
+def schedule_profile_pic(student):
+    """Process `student.profile_pic` once the current transaction commits."""
+    now = timezone.now()
+    # Synced devices only see rows whose updated_at moved (api/sync.py)
+    Student.objects.filter(pk=student.pk).update(
+        profile_pic_status=Student.PIC_PENDING, profile_pic_thumbs={}, updated_at=now,
+    )
+    student.profile_pic_status, student.profile_pic_thumbs, student.updated_at = Student.PIC_PENDING, {}, now
+
+    job = (student.pk, student.profile_pic.name)
+    transaction.on_commit(lambda: _submit(*job))
+
+
+def _submit(student_id, name):
+    workers = getattr(settings, 'PROFILE_PIC_WORKERS', 2)
+    if not workers:
+        _process(student_id, name)
+        return
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='profile-pic')
+    _executor.submit(_run_in_worker, student_id, name)
+
+
+def resume_pending(older_than):
+    """Process the pictures still `pending` after `older_than`; returns how many."""
+    students = Student.objects.filter(
+        profile_pic_status=Student.PIC_PENDING, updated_at__lt=timezone.now() - older_than,
+    ).exclude(profile_pic='').values_list('pk', 'profile_pic')
+
+    count = 0
+    for student_id, name in students.iterator():
+        # A newer upload meanwhile wins, as for any job (_finish)
+        _process(student_id, name)
+        count += 1
+    return count
+
+
+def _run_in_worker(student_id, name):
+    close_old_connections()
+    try:
+        _process(student_id, name)
+    finally:
+        close_old_connections()
+
+
+def _process(student_id, name):
+    # Whatever goes wrong, the student must not be left `pending`
+    try:
+        process_profile_pic(student_id, name)
+    except Exception:
+        logger.exception('Processing profile picture %s failed', name)
+        _finish(student_id, name, profile_pic_status=Student.PIC_FAILED)
+
+
+def process_profile_pic(student_id, name):
+    """Orient, strip and thumbnail the uploaded file `name` of a student."""
+    try:
+        with default_storage.open(name) as f:
+            image = Image.open(f)
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGB')
+    except (FileNotFoundError, UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        logger.warning('Profile picture %s could not be read', name)
+        _finish(student_id, name, profile_pic_status=Student.PIC_FAILED)
+        return
+
+    image.thumbnail((PROFILE_PIC_MAX_SIZE, PROFILE_PIC_MAX_SIZE))
+    stem  = os.path.splitext(os.path.basename(name))[0]
+    clean = default_storage.save(
+        Student._meta.get_field('profile_pic').generate_filename(None, f'{stem}.jpg'),
+        ContentFile(_encode(image, 'JPEG')),
+    )
+
+    thumbs = {}
+    for size_name, size in THUMBNAIL_SIZES.items():
+        thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for ext, fmt in THUMBNAIL_FORMATS.items():
+            thumbs[f'{size_name}_{ext}'] = default_storage.save(
+                f'{THUMBNAIL_DIR}/{stem}_{size_name}.{ext}', ContentFile(_encode(thumb, fmt)),
+            )
+
+    # Files are content-addressed and may be shared (api/storage.py), so the
+    # raw upload, or everything when a newer upload won, is left to sweep_media.
+    _finish(student_id, name, profile_pic=clean, profile_pic_status=Student.PIC_READY,
+            profile_pic_thumbs=thumbs)
+
+
+def _finish(student_id, name, **values):
+    """Store the result unless the picture changed meanwhile; True if stored."""
+    user_id = Student.objects.filter(pk=student_id).values_list('user_id', flat=True).first()
+    updated = Student.objects.filter(pk=student_id, profile_pic=name).update(updated_at=timezone.now(), **values)
+    if updated:
+        bump_tenant_version(user_id)
+    return bool(updated)
+
+
+def _encode(image, fmt):
+    # Pillow writes no EXIF/ICC/XMP unless passed explicitly
+    out = BytesIO()
+    options = {'quality': JPEG_QUALITY, 'optimize': True} if fmt == 'JPEG' else {'quality': 80, 'method': 4}
+    image.save(out, fmt, **options)
+    return out.getvalue()
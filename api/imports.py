@@ -0,0 +1,74 @@
+import csv
+import io
+from itertools import islice
+
+
+class SpreadsheetError(ValueError):
+    """Raised when an uploaded sheet cannot be read."""
+
+
+def iter_sheet_rows(uploaded_file):
+    """
+    Yield the rows of an uploaded CSV or XLSX file as lists of stripped strings.
+
+    Rows are read incrementally, so memory stays flat regardless of file size.
+    Completely empty rows are skipped.
+    """
+    name = (getattr(uploaded_file, 'name', '') or '').lower()
+
+    if name.endswith('.xlsx'):
+        rows = _iter_xlsx(uploaded_file)
+    elif name.endswith('.csv') or not name:
+        rows = _iter_csv(uploaded_file)
+    else:
+        raise SpreadsheetError('Unsupported file type. Upload a .csv or .xlsx file.')
+
+    for row in rows:
+        cells = ['' if c is None else str(c).strip() for c in row]
+        if any(cells):
+            yield cells
+
+
+def _iter_csv(uploaded_file):
+    raw = getattr(uploaded_file, 'file', uploaded_file)
+    raw.seek(0)
+    text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise SpreadsheetError(f'Could not read CSV file: {e}')
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(uploaded_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SpreadsheetError('XLSX import is not available on this server. Upload a .csv file.')
+
+    uploaded_file.seek(0)
+    try:
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    except Exception as e:
+        raise SpreadsheetError(f'Could not read XLSX file: {e}')
+
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield [_xlsx_cell(c) for c in row]
+    finally:
+        workbook.close()
+
+
+def _xlsx_cell(value):
+    # Excel stores every number as a float; keep "101" rolls from turning into "101.0"
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` items from `iterable`."""
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
@@ -0,0 +1,225 @@
+"""
+JSON assembled inside PostgreSQL.
+
+The student profile and attendance report are mostly long lists (one entry
+per attendance day, payment or mark). On PostgreSQL those lists are built by
+the database with json_agg / json_object_agg / json_build_object and come
+back as text, which is spliced into the response unparsed:
+
+    RawJSON(text)              a pre-encoded fragment
+    render_json(obj)           encode like DRF's JSONRenderer, copying RawJSON as-is
+    RawJSONResponse(content)   application/json response for the result
+
+Other backends keep building the same documents with the ORM; callers check
+`supports_sql_json()`. Each function here runs ONE query.
+"""
+from django.db import connection
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Attendance, AttendanceRecord, Batch, FeePayment, Student, Test, TestMark
+
+_renderer = JSONRenderer()
+
+
+def supports_sql_json():
+    return connection.vendor == 'postgresql'
+
+
+class RawJSON:
+    """JSON text that render_json() copies into its output unchanged."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f'RawJSON({self.text[:40]!r})'
+
+
+def render_json(obj):
+    """`obj` encoded as bytes, with RawJSON fragments (inside dicts/lists) spliced in."""
+    if isinstance(obj, RawJSON):
+        return obj.text.encode()
+    if isinstance(obj, dict):
+        return b'{' + b','.join(
+            _renderer.render(str(key)) + b':' + render_json(value) for key, value in obj.items()
+        ) + b'}'
+    if isinstance(obj, (list, tuple)):
+        return b'[' + b','.join(render_json(value) for value in obj) + b']'
+    if obj is None:
+        return b'null'                  # JSONRenderer renders None as an empty body
+    return _renderer.render(obj)
+
+
+class RawJSONResponse(HttpResponse):
+
+    def __init__(self, content, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content, **kwargs)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SQL
+# Mirrors the Python paths in api/views/student_views.py and
+# attendance_views.py: percentages are float8 and round() on float8 rounds
+# half to even like Python's round(); datetimes use DRF's DATETIME_FORMAT in
+# the current time zone; decimals the serializers render as strings are
+# rendered as numeric text.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _tables():
+    return {
+        'records':     AttendanceRecord._meta.db_table,
+        'attendances': Attendance._meta.db_table,
+        'payments':    FeePayment._meta.db_table,
+        'students':    Student._meta.db_table,
+        'marks':       TestMark._meta.db_table,
+        'tests':       Test._meta.db_table,
+        'batches':     Batch._meta.db_table,
+    }
+
+
+ATTENDANCE_CTES = """
+    rec AS (
+        SELECT a."date" AS day, r."status"
+        FROM {records} r
+        JOIN {attendances} a ON a."id" = r."attendance_id"
+        WHERE r."student_id" = %(student)s AND a."user_id" = %(user)s {date_filter}
+    ),
+    months AS (
+        SELECT to_char(day, 'YYYY-MM') AS month,
+               count(*) FILTER (WHERE "status" = 'present') AS "present",
+               count(*) FILTER (WHERE "status" = 'absent')  AS "absent",
+               count(*) FILTER (WHERE "status" = 'leave')   AS "leave",
+               count(*)                                     AS "total"
+        FROM rec
+        GROUP BY 1
+    )"""
+
+ATTENDANCE_COLUMNS = """
+    (SELECT coalesce(json_object_agg(day::text, "status" ORDER BY day), '{{}}')::text FROM rec) AS date_map,
+    (SELECT coalesce(json_object_agg(month, json_build_object(
+                'present', "present", 'absent', "absent", 'leave', "leave", 'total', "total",
+                'pct', round("present"::float8 / "total" * 100)::int
+            ) ORDER BY month), '{{}}')::text
+       FROM months) AS monthly,
+    (SELECT coalesce(sum("present"), 0)::int FROM months) AS att_present,
+    (SELECT coalesce(sum("absent"), 0)::int  FROM months) AS att_absent,
+    (SELECT coalesce(sum("leave"), 0)::int   FROM months) AS att_leave,
+    (SELECT coalesce(sum("total"), 0)::int   FROM months) AS att_total"""
+
+# FeePaymentSerializer, field for field
+PAYMENT_COLUMNS = """
+    (SELECT coalesce(json_agg(json_build_object(
+                'id', p."id",
+                'student', p."student_id",
+                'student_name', s."name",
+                'amount', p."amount"::text,
+                'payment_date', to_char(p."payment_date" AT TIME ZONE %(tz)s, 'YYYY-MM-DD HH24:MI:SS'),
+                'notes', p."notes",
+                'created_at', to_char(p."created_at" AT TIME ZONE %(tz)s, 'YYYY-MM-DD HH24:MI:SS')
+            ) ORDER BY p."payment_date" DESC), '[]')::text
+       FROM {payments} p
+       JOIN {students} s ON s."id" = p."student_id"
+      WHERE p."student_id" = %(student)s) AS payments"""
+
+MARKS_CTE = """
+    marks AS (
+        SELECT t."id", t."name", t."date", t."board", b."name" AS batch_name,
+               t."total_marks", m."marks_obtained",
+               CASE WHEN t."total_marks" > 0
+                    THEN round(m."marks_obtained"::float8 / t."total_marks" * 100)::int
+                    ELSE 0 END AS pct
+        FROM {marks} m
+        JOIN {tests} t ON t."id" = m."test_id"
+        LEFT JOIN {batches} b ON b."id" = t."batch_id"
+        WHERE m."student_id" = %(student)s
+    )"""
+
+# Same bands as student_views._grade()
+GRADE_SQL = """CASE WHEN pct >= 90 THEN 'A+' WHEN pct >= 80 THEN 'A' WHEN pct >= 70 THEN 'B'
+                    WHEN pct >= 60 THEN 'C' WHEN pct >= 50 THEN 'D' WHEN pct >= 33 THEN 'E'
+                    ELSE 'F' END"""
+
+MARKS_COLUMNS = """
+    (SELECT coalesce(json_agg(json_build_object(
+                'test_id', "id", 'test_name', "name", 'date', "date"::text, 'board', "board",
+                'batch_name', coalesce(batch_name, ''), 'total_marks', "total_marks",
+                'marks_obtained', "marks_obtained"::float8, 'pct', pct, 'grade', """ + GRADE_SQL + """
+            ) ORDER BY "date" DESC), '[]')::text
+       FROM marks) AS tests,
+    (SELECT count(*)::int FROM marks) AS tests_count,
+    (SELECT coalesce(sum(pct), 0)::int FROM marks) AS tests_pct_sum"""
+
+
+def profile_sections(student, sections):
+    """
+    The heavy parts of the student profile for `sections`:
+
+        {'attendance': {'date_map': RawJSON, 'monthly': RawJSON,
+                        'totals': {total, present, absent, leave}},
+         'payments':   RawJSON,
+         'tests':      (RawJSON, count, sum of pct)}
+    """
+    ctes, columns = [], []
+    if 'attendance' in sections:
+        ctes.append(ATTENDANCE_CTES.replace('{date_filter}', ''))
+        columns.append(ATTENDANCE_COLUMNS)
+    if 'fees' in sections:
+        columns.append(PAYMENT_COLUMNS)
+    if 'tests' in sections:
+        ctes.append(MARKS_CTE)
+        columns.append(MARKS_COLUMNS)
+    if not columns:
+        return {}
+
+    row = _fetch(ctes, columns, {
+        'student': student.id, 'user': student.user_id, 'tz': timezone.get_current_timezone_name(),
+    })
+    result = {}
+    if 'attendance' in sections:
+        result['attendance'] = {
+            'date_map': RawJSON(row['date_map']),
+            'monthly':  RawJSON(row['monthly']),
+            'totals': {
+                'total':   row['att_total'],
+                'present': row['att_present'],
+                'absent':  row['att_absent'],
+                'leave':   row['att_leave'],
+            },
+        }
+    if 'fees' in sections:
+        result['payments'] = RawJSON(row['payments'])
+    if 'tests' in sections:
+        result['tests'] = (RawJSON(row['tests']), row['tests_count'], row['tests_pct_sum'])
+    return result
+
+
+def attendance_report(student, start=None, end=None):
+    """Date map, monthly counts and totals of a student, days in [start, end)."""
+    date_filter = 'AND a."date" >= %(start)s AND a."date" < %(end)s' if start else ''
+    row = _fetch(
+        [ATTENDANCE_CTES.replace('{date_filter}', date_filter)], [ATTENDANCE_COLUMNS],
+        {'student': student.id, 'user': student.user_id, 'start': start, 'end': end},
+    )
+    return {
+        'date_map': RawJSON(row['date_map']),
+        'monthly':  RawJSON(row['monthly']),
+        'present':  row['att_present'],
+        'absent':   row['att_absent'],
+        'leave':    row['att_leave'],
+        'total':    row['att_total'],
+    }
+
+
+def _fetch(ctes, columns, params):
+    sql = ''
+    if ctes:
+        sql = 'WITH ' + ','.join(ctes) + '\n'
+    sql += 'SELECT ' + ','.join(columns)
+    sql = sql.format(**_tables())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [col[0] for col in cursor.description]
+        return dict(zip(names, cursor.fetchone()))
@@ -0,0 +1,395 @@
+"""
+Latency benchmarks for the heavy API endpoints.
+
+Every scenario seeds a throw-away tenant inside a transaction that is rolled
+back afterwards, so it is safe to point at any database:
+
+    python manage.py benchmark dashboard_overview --students 5000 --runs 50
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import (
+    User, Batch, Student, Attendance, AttendanceRecord, FeePayment, Test, TestMark,
+)
+from api.phones import phone_columns, to_e164
+from api.rollups import rebuild_rollups_range
+
+SCENARIOS = {}
+CHUNK = 5000
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Seed a temporary tenant and report p50/p95 latency and query counts for an endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--batches',  type=int, default=50)
+        parser.add_argument('--days',     type=int, default=30, help='days of attendance history')
+        parser.add_argument('--tests',    type=int, default=4,  help='tests per batch')
+        parser.add_argument('--runs',     type=int, default=30)
+        parser.add_argument('--seed',     type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.factory = APIRequestFactory()
+
+        # Measure the views themselves, not the tenant response cache
+        try:
+            with override_settings(CACHES=NO_CACHE), transaction.atomic():
+                started = time.perf_counter()
+                user = seed_tenant(
+                    students=options['students'], batches=options['batches'],
+                    days=options['days'], tests=options['tests'],
+                )
+                self.stdout.write(f'seeded tenant in {time.perf_counter() - started:.1f}s')
+                SCENARIOS[options['scenario']](self, user, options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def time_callable(self, label, func, runs):
+        """Call `func` `runs` times (after one warm-up) and print the timings."""
+        timings, queries = [], 0
+        for i in range(runs + 1):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                func()
+                elapsed = (time.perf_counter() - started) * 1000
+            if i:
+                timings.append(elapsed)
+            queries = len(ctx)
+        self._report(label, timings, queries, '-')
+        return timings
+
+    def time_view(self, label, view, user, runs, path='/', **view_kwargs):
+        """Call `view` `runs` times (after one warm-up) and print the timings."""
+        params = view_kwargs.pop('params', {})
+        timings, queries, size = [], 0, 0
+
+        for i in range(runs + 1):
+            request = self.factory.get(path, params)
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as ctx:
+                started  = time.perf_counter()
+                response = view(request, **view_kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                content = (
+                    b''.join(response.streaming_content)
+                    if response.streaming else response.content
+                )
+                elapsed = (time.perf_counter() - started) * 1000
+            if i:                                   # skip the warm-up run
+                timings.append(elapsed)
+            queries, size = len(ctx), len(content)
+
+        self._report(label, timings, queries, size)
+        return timings
+
+    def _report(self, label, timings, queries, size):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+        self.stdout.write(
+            f'{label:<32} p50 {statistics.median(timings):8.1f} ms   '
+            f'p95 {p95:8.1f} ms   queries {queries:4d}   bytes {size}'
+        )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Seeding
+# ─────────────────────────────────────────────────────────────────────────────
+
+def seed_tenant(students=5000, batches=50, days=30, tests=4):
+    """Create one tenant with realistic volumes using bulk inserts."""
+    user = User.objects.create_user(
+        phone=f'+9170{random.randint(10000000, 99999999)}', password=None,
+        name='Benchmark', institute_name='Benchmark Institute',
+    )
+    today = timezone.localdate()
+
+    batch_objs = Batch.objects.bulk_create([
+        Batch(user=user, name=f'Batch {b + 1}', timing='4:00 PM') for b in range(batches)
+    ])
+
+    student_objs = []
+    for s in range(students):
+        total = Decimal(random.choice([6000, 9000, 12000]))
+        student = Student(
+            user=user, batch=batch_objs[s % batches], name=f'Student {s:05d}',
+            phone=f'+9198{s:08d}', roll=str(s + 1), total_fees=total,
+            fees_paid=(total * Decimal(random.choice([0, 0.5, 1]))).quantize(Decimal('1')),
+        )
+        # bulk_create skips save(), which fills these
+        student.phone_e164, student.phone_last10 = phone_columns(student.phone)
+        student_objs.append(student)
+    Student.objects.bulk_create(student_objs, batch_size=CHUNK)
+
+    by_batch = {}
+    for st in student_objs:
+        by_batch.setdefault(st.batch_id, []).append(st)
+
+    sessions = Attendance.objects.bulk_create([
+        Attendance(user=user, batch=b, date=today - timedelta(days=d))
+        for b in batch_objs for d in range(days)
+    ], batch_size=CHUNK)
+    _bulk(AttendanceRecord, (
+        AttendanceRecord(
+            attendance=session, student=st,
+            status=random.choices(['present', 'absent', 'leave'], [8, 2, 1])[0],
+        )
+        for session in sessions for st in by_batch.get(session.batch_id, [])
+    ))
+
+    now = timezone.now()
+    _bulk(FeePayment, (
+        FeePayment(
+            user=user, student=st, amount=st.fees_paid,
+            payment_date=now - timedelta(days=random.randint(0, 365)),
+        )
+        for st in student_objs if st.fees_paid
+    ))
+
+    test_objs = Test.objects.bulk_create([
+        Test(user=user, batch=b, name=f'Unit Test {t + 1}', total_marks=100, duration=1,
+             date=today - timedelta(days=7 * t))
+        for b in batch_objs for t in range(tests)
+    ])
+    _bulk(TestMark, (
+        TestMark(test=t, student=st, marks_obtained=random.randint(20, 100))
+        for t in test_objs for st in by_batch.get(t.batch_id, [])
+    ))
+
+    # bulk_create sends no signals, so fill the daily rollups explicitly
+    rebuild_rollups_range(user.id, today - timedelta(days=366), today)
+    return user
+
+
+def _bulk(model, objs):
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) == CHUNK:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Scenarios
+# ─────────────────────────────────────────────────────────────────────────────
+
+@scenario('dashboard_overview')
+def bench_dashboard_overview(cmd, user, options):
+    from api.views import dashboard_overview_view
+    cmd.time_view('dashboard_overview_view', dashboard_overview_view, user, options['runs'])
+
+
+@scenario('dashboard_analytics')
+def bench_dashboard_analytics(cmd, user, options):
+    from api.views import dashboard_analytics_view
+    for period in ('month', 'year'):
+        cmd.time_view(
+            f'dashboard_analytics_view ({period})', dashboard_analytics_view, user,
+            options['runs'], params={'period': period},
+        )
+
+
+@scenario('student_search')
+def bench_student_search(cmd, user, options):
+    """Old icontains union vs the indexed search, e.g. --students 50000 --days 0 --tests 0."""
+    from api.search import search_students
+
+    students = Student.objects.filter(user=user).select_related('batch')
+    for term in ('Student 4321', '432', '98000043', 'udent 43'):
+        cmd.time_callable(
+            f'union icontains {term!r}',
+            lambda: list(students.filter(name__icontains=term) | students.filter(phone__icontains=term)),
+            options['runs'],
+        )
+        cmd.time_callable(
+            f'search_students {term!r}', lambda: search_students(user, term), options['runs'],
+        )
+
+
+@scenario('phone_lookup')
+def bench_phone_lookup(cmd, user, options):
+    """Lookups by parsed `phone` vs the normalized columns (no password hashing)."""
+    import phonenumbers
+    from api.search import search_students
+
+    typed = ['98765 43210', '+91 9876543210', '09876543210', str(user.phone.national_number)]
+    runs  = options['runs'] * 10
+
+    # 1000 calls each, so the reported ms read as µs per call
+    cmd.time_callable(
+        'phonenumbers.parse x1000', lambda: [phonenumbers.parse(raw, 'IN') for raw in typed * 250], runs,
+    )
+    cmd.time_callable(
+        'to_e164 uncached x1000', lambda: [to_e164.__wrapped__(raw) for raw in typed * 250], runs,
+    )
+
+    cmd.time_callable(
+        'User by phone (parsed)', lambda: User.objects.filter(phone=typed[-1]).first(), runs,
+    )
+    cmd.time_callable(
+        'User by phone_e164', lambda: User.objects.filter(phone_e164=to_e164(typed[-1])).first(), runs,
+    )
+    cmd.time_callable(
+        'Student search by phone digits', lambda: search_students(user, '98000043'), options['runs'],
+    )
+
+
+@scenario('list_pages')
+def bench_list_pages(cmd, user, options):
+    """Keyset page 1 vs a deep page of the student list, and OFFSET for contrast."""
+    from api.pagination import _encode_cursor
+    from api.views import student_list_create_view
+    from api.views.student_views import STUDENT_ORDERING
+
+    students = Student.objects.filter(user=user).order_by(*STUDENT_ORDERING)
+    deep     = students.count() - 200
+    cursor   = _encode_cursor(students[deep - 1], STUDENT_ORDERING)
+
+    cmd.time_view(
+        'students page 1', student_list_create_view, user, options['runs'],
+        params={'page_size': 100},
+    )
+    cmd.time_view(
+        f'students keyset @ row {deep}', student_list_create_view, user, options['runs'],
+        params={'page_size': 100, 'cursor': cursor},
+    )
+    cmd.time_callable(
+        f'students OFFSET {deep} (old style)', lambda: list(students[deep:deep + 100]), options['runs'],
+    )
+
+
+@scenario('student_fields')
+def bench_student_fields(cmd, user, options):
+    """Full student list page vs the sparse fieldset a mobile list screen uses."""
+    from api.views import student_list_create_view
+
+    for label, params in (
+        ('students (all fields)', {}),
+        ('students ?fields= (4 fields)', {'fields': 'id,name,roll,phone'}),
+        ('students ?exclude= (4 fields)', {'exclude': 'profile_pic,created_at,updated_at,batch_name'}),
+    ):
+        cmd.time_view(
+            label, student_list_create_view, user, options['runs'],
+            params={'page_size': 500, **params},
+        )
+
+
+@scenario('student_profile')
+def bench_student_profile(cmd, user, options):
+    """
+    The full profile of one student, whole and per section. For three years
+    of history seed with e.g. --students 300 --batches 10 --days 1095 --tests 156.
+    """
+    from api.views import student_full_profile_view
+
+    student = Student.objects.filter(user=user).order_by('name').first()
+    records = AttendanceRecord.objects.filter(student=student).count()
+    marks   = TestMark.objects.filter(student=student).count()
+    cmd.stdout.write(f'student has {records} attendance records and {marks} marks')
+
+    for label, params in (
+        ('profile (all sections)', {}),
+        ('profile ?sections=attendance', {'sections': 'attendance'}),
+        ('profile ?sections=fees', {'sections': 'fees'}),
+        ('profile ?sections=tests', {'sections': 'tests'}),
+    ):
+        cmd.time_view(
+            label, student_full_profile_view, user, options['runs'],
+            params=params, student_id=student.id,
+        )
+
+
+@scenario('export_memory')
+def bench_export_memory(cmd, user, options):
+    """
+    Peak Python memory of the attendance CSV export, streamed vs built in
+    memory. A million records: --students 5000 --batches 50 --days 200 --tests 0
+    """
+    import csv
+    import io
+    import tracemalloc
+    from api.exports import export_rows
+    from api.views import export_view
+
+    records = AttendanceRecord.objects.filter(attendance__user=user).count()
+    recent  = str(timezone.localdate() - timedelta(days=max(options['days'] // 10, 1) - 1))
+    cmd.stdout.write(f'{records} attendance records')
+
+    def streamed(params):
+        request = cmd.factory.get('/', params)
+        force_authenticate(request, user=user)
+        response = export_view(request, name='attendance')
+        return sum(len(chunk) for chunk in response.streaming_content)
+
+    def materialized():
+        # What a non-streaming response holds: every row, then the whole file
+        rows   = list(export_rows(user, 'attendance', {}))
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return len(buffer.getvalue().encode())
+
+    for label, func in (
+        (f'streamed (from {recent})', lambda: streamed({'from': recent})),
+        ('streamed (all)', lambda: streamed({})),
+        ('materialized (all)', materialized),
+    ):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size    = func()
+        elapsed = time.perf_counter() - started
+        peak    = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        cmd.stdout.write(f'{label:<32} {elapsed:8.1f} s   peak {peak / 2**20:8.1f} MiB   bytes {size}')
+
+
+@scenario('promotion')
+def bench_promotion(cmd, user, options):
+    """One whole-tenant roll-over (rehearsed, then real), with the queries it takes."""
+    from api.models import Promotion
+    from api.promotions import parse_plan, run_promotion
+
+    # Timed once each: a real roll-over cannot be repeated on the same data
+    plan = parse_plan(user, {'session': 'next', 'pass_percentage': 40})
+    for rehearsal in (True, False):
+        promotion = Promotion.objects.create(user=user, session='next', rehearsal=rehearsal, plan=plan)
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            run_promotion(promotion.id)
+            elapsed = (time.perf_counter() - started) * 1000
+        promotion.refresh_from_db()
+        result = promotion.result
+        label = f'roll-over ({"rehearsal" if rehearsal else "real"})'
+        cmd.stdout.write(
+            f'{label:<32} {elapsed:8.1f} ms   '
+            f'queries {len(ctx):4d}   {promotion.status}: {result.get("promoted")} promoted, '
+            f'{result.get("held_back")} held back, {len(result.get("batches", []))} batches'
+        )
@@ -0,0 +1,29 @@
+"""
+Delete sync tombstones older than SYNC_TOMBSTONE_DAYS.
+
+Clients whose cursor is older than that get 410 from /api/sync/ and sync
+from scratch, so older tombstones are never read. Run daily:
+
+    python manage.py prune_sync_tombstones
+    python manage.py prune_sync_tombstones --days 30
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import SyncTombstone
+
+
+class Command(BaseCommand):
+    help = 'Remove sync tombstones no cursor can still need.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='keep this many days (default: SYNC_TOMBSTONE_DAYS)')
+
+    def handle(self, *args, **options):
+        days    = options['days'] or getattr(settings, 'SYNC_TOMBSTONE_DAYS', 90)
+        cutoff  = timezone.now() - timedelta(days=days)
+        deleted = SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} tombstones older than {days} days'))
@@ -0,0 +1,64 @@
+"""
+Rebuild the daily rollup tables from the fact tables.
+
+Run once after migrating, and whenever rollups are suspected to be stale:
+
+    python manage.py rebuild_rollups
+    python manage.py rebuild_rollups --start 2024-04-01 --end 2025-03-31 --user <uuid>
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from api.models import User, Attendance, FeePayment, Test
+from api.rollups import rebuild_rollups_range
+
+
+class Command(BaseCommand):
+    help = 'Backfill TenantDailyRollup / BatchDailyRollup for a date range.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=_parse_date, help='first day (YYYY-MM-DD); default: earliest data')
+        parser.add_argument('--end',   type=_parse_date, help='last day (YYYY-MM-DD); default: today')
+        parser.add_argument('--user',  help='only rebuild this tenant (user id)')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(pk=options['user'])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} not found")
+
+        end = options['end'] or timezone.localdate()
+        total = 0
+
+        for user_id in users.values_list('id', flat=True).iterator():
+            start = options['start'] or _earliest_day(user_id)
+            if start is None or start > end:
+                continue
+            written = rebuild_rollups_range(user_id, start, end)
+            total += written
+            self.stdout.write(f'{user_id}: {start} → {end}, {written} rows')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt daily rollups ({total} rows)'))
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Invalid date: {value}')
+
+
+def _earliest_day(user_id):
+    days = [
+        Attendance.objects.filter(user_id=user_id).aggregate(day=Min('date'))['day'],
+        Test.objects.filter(user_id=user_id).aggregate(day=Min('date'))['day'],
+    ]
+    first_payment = FeePayment.objects.filter(user_id=user_id).aggregate(at=Min('payment_date'))['at']
+    if first_payment:
+        days.append(timezone.localdate(first_payment))
+    days = [d for d in days if d]
+    return min(days) if days else None
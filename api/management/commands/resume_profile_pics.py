@@ -0,0 +1,29 @@
+"""
+Process profile pictures that a restart left `pending`.
+
+Picture jobs run on an in-process thread pool (api/images.py), so jobs queued
+when the server stops are lost. Run this after each deploy or restart, or
+periodically:
+
+    python manage.py resume_profile_pics
+    python manage.py resume_profile_pics --min-age 30
+
+Pictures uploaded less than --min-age minutes ago are left to the pool that
+may still be working on them.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.images import resume_pending
+
+
+class Command(BaseCommand):
+    help = 'Process profile pictures still pending after a restart.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=10, help='skip uploads newer than this many minutes')
+
+    def handle(self, *args, **options):
+        count = resume_pending(timedelta(minutes=options['min_age']))
+        self.stdout.write(self.style.SUCCESS(f'Processed {count} pending profile pictures'))
@@ -0,0 +1,107 @@
+"""
+Delete media files that no row references any more.
+
+Content-addressed files are shared between students, so they are never
+deleted on write (api/storage.py). Run this periodically instead:
+
+    python manage.py sweep_media --dry-run
+    python manage.py sweep_media --min-age 6
+
+Only the directories the app writes to are swept, and files younger than
+--min-age hours are kept so uploads still being processed are not lost.
+References are read up front, so each file is checked again just before it
+is removed, in case an upload of the same bytes started using it meanwhile.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.images import THUMBNAIL_DIR, THUMBNAIL_FORMATS, THUMBNAIL_SIZES
+from api.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Remove unreferenced profile pictures and thumbnails, reporting the space reclaimed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='only report what would be removed')
+        parser.add_argument('--min-age', type=float, default=1, help='keep files newer than this many hours')
+
+    def handle(self, *args, **options):
+        root       = os.fspath(settings.MEDIA_ROOT)
+        referenced = _referenced_names()
+        cutoff     = time.time() - options['min_age'] * 3600
+        dry_run    = options['dry_run']
+
+        scanned = removed = reclaimed = 0
+        for directory in _managed_dirs():
+            for path, stat in _walk(os.path.join(root, directory)):
+                scanned += 1
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name in referenced or stat.st_mtime > cutoff:
+                    continue
+                if _still_used(path, name, cutoff):
+                    continue
+                if not dry_run:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                removed   += 1
+                reclaimed += stat.st_size
+
+        verb = 'Would remove' if dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} of {scanned} files, {_human(reclaimed)} reclaimed'
+        ))
+
+
+def _managed_dirs():
+    return [Student._meta.get_field('profile_pic').upload_to.strip('/'), THUMBNAIL_DIR]
+
+
+def _referenced_names():
+    names = set()
+    rows  = Student.objects.values_list('profile_pic', 'profile_pic_thumbs').iterator(chunk_size=5000)
+    for pic, thumbs in rows:
+        if pic:
+            names.add(pic)
+        names.update((thumbs or {}).values())
+    return names
+
+
+def _still_used(path, name, cutoff):
+    try:
+        if os.stat(path).st_mtime > cutoff:         # reused by a save since the scan
+            return True
+    except FileNotFoundError:
+        return True
+    lookups = Q(profile_pic=name)
+    for size in THUMBNAIL_SIZES:
+        for ext in THUMBNAIL_FORMATS:
+            lookups |= Q(**{f'profile_pic_thumbs__{size}_{ext}': name})
+    return Student.objects.filter(lookups).exists()
+
+
+def _walk(directory):
+    """(path, stat) of every file under `directory`, without building a list."""
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry.path, entry.stat(follow_symlinks=False)
+
+
+def _human(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+        size /= 1024
@@ -0,0 +1,88 @@
+"""
+Access-controlled media delivery.
+
+Media is served through /api/media/<name>, never straight from MEDIA_ROOT:
+
+- Serializers embed signed links (`?exp=…&sig=…`). The expiry is rounded up
+  to a MEDIA_URL_TTL boundary, so a picture keeps the same URL for a while and
+  browsers and the response cache can reuse it; an <img> tag needs no token.
+- Without a valid signature the request must be authenticated and the file
+  must belong to one of the tenant's students.
+- Django only checks access; the front server sends the bytes
+  (MEDIA_DELIVERY = 'x-accel' for nginx, 'x-sendfile' for Apache/lighttpd).
+  Content-hashed names never change meaning and are cached for a year.
+"""
+import mimetypes
+import posixpath
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .images import THUMBNAIL_DIR, THUMBNAIL_FORMATS, THUMBNAIL_SIZES
+from .models import Student
+from .storage import is_hashed_name
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MUTABLE_MAX_AGE   = 60 * 5
+
+_signer = signing.Signer(salt='api.media')
+
+
+def _ttl():
+    return getattr(settings, 'MEDIA_URL_TTL', 3600)
+
+
+def media_url(name, request=None):
+    """Signed URL of the stored file `name`, valid for at least MEDIA_URL_TTL."""
+    ttl = _ttl()
+    exp = -(-(int(time.time()) + ttl) // ttl) * ttl          # round up to a TTL boundary
+    url = reverse('media-file', args=[name]) + '?' + urlencode({'exp': exp, 'sig': _signature(name, exp)})
+    return request.build_absolute_uri(url) if request else url
+
+
+def valid_signature(name, exp, sig):
+    try:
+        expires = int(exp)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return signing.constant_time_compare(sig or '', _signature(name, expires))
+
+
+def _signature(name, exp):
+    return _signer.signature(f'{name}:{exp}')
+
+
+def clean_name(name):
+    """`name` normalized, or None if it is outside the served directories."""
+    name = posixpath.normpath(name or '')
+    if name.startswith(('/', '..')) or '\\' in name:
+        return None
+    served = (Student._meta.get_field('profile_pic').upload_to.strip('/'), THUMBNAIL_DIR)
+    if name.split('/', 1)[0] not in served:
+        return None
+    return name
+
+
+def tenant_owns(user, name):
+    """Whether one of `user`'s students references the file `name`."""
+    match = Q(profile_pic=name)
+    for size in THUMBNAIL_SIZES:
+        for ext in THUMBNAIL_FORMATS:
+            match |= Q(**{f'profile_pic_thumbs__{size}_{ext}': name})
+    return Student.objects.filter(match, user=user).exists()
+
+
+def cache_control(name):
+    if is_hashed_name(name):
+        return f'private, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'private, max-age={MUTABLE_MAX_AGE}'
+
+
+def content_type(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-19 06:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='status',
+            field=models.CharField(choices=[('present', 'Present'), ('absent', 'Absent'), ('leave', 'Leave')], default='absent', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='BatchDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('leave', models.PositiveIntegerField(default=0)),
+                ('amount_collected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('test_count', models.PositiveIntegerField(default=0)),
+                ('mark_count', models.PositiveIntegerField(default=0)),
+                ('percentage_sum', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='api.batch')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'batch_daily_rollups',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['user', 'date'], name='batch_daily_user_id_a5c15a_idx')],
+                'unique_together': {('batch', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TenantDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('leave', models.PositiveIntegerField(default=0)),
+                ('amount_collected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('test_count', models.PositiveIntegerField(default=0)),
+                ('mark_count', models.PositiveIntegerField(default=0)),
+                ('percentage_sum', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'tenant_daily_rollups',
+                'ordering': ['date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
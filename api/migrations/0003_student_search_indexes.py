@@ -0,0 +1,36 @@
+# Trigram indexes for api/search.py. PostgreSQL only; other backends search
+# through the in-process index and need nothing here.
+
+from django.db import migrations
+
+INDEXES = {
+    'students_name_trgm':  'UPPER(("name")::text) gin_trgm_ops',
+    'students_roll_trgm':  'UPPER(("roll")::text) gin_trgm_ops',
+    'students_phone_trgm': "(REGEXP_REPLACE(\"phone\", '[^0-9]', '', 'g')) gin_trgm_ops",
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON students USING gin ({expression})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+from api.phones import phone_columns
+
+CHUNK = 2000
+
+
+def fill_phone_columns(apps, schema_editor):
+    # Historical models have no custom save(), so fill the columns here.
+    for model_name in ('User', 'Student'):
+        model = apps.get_model('api', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'phone').iterator(chunk_size=CHUNK):
+            obj.phone_e164, obj.phone_last10 = phone_columns(obj.phone)
+            batch.append(obj)
+            if len(batch) == CHUNK:
+                model.objects.bulk_update(batch, ['phone_e164', 'phone_last10'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['phone_e164', 'phone_last10'])
+
+
+def swap_phone_search_index(apps, schema_editor):
+    # Student search matches phone digits through phone_last10 now
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS students_phone_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS students_last10_trgm ON students USING gin (("phone_last10")::text gin_trgm_ops)'
+    )
+
+
+def restore_phone_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS students_last10_trgm')
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS students_phone_trgm ON students USING gin "
+        "((REGEXP_REPLACE(\"phone\", '[^0-9]', '', 'g')) gin_trgm_ops)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_student_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='phone_e164',
+            field=models.CharField(default='', editable=False, max_length=16),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_last10',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='phone_last10',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.RunPython(fill_phone_columns, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='phone_e164',
+            field=models.CharField(editable=False, max_length=16, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['user', 'phone_e164'], name='students_user_e164_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['user', 'phone_last10'], name='students_user_last10_idx'),
+        ),
+        migrations.RunPython(swap_phone_search_index, restore_phone_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_phone_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['user', 'date', 'id'], name='attendances_user_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='batches_user_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feepayment',
+            index=models.Index(fields=['user', 'payment_date', 'id'], name='fee_payments_user_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['user', 'name', 'id'], name='students_user_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['user', 'date', 'id'], name='tests_user_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='profile_pic_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='profile_pic_thumbs',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('session', models.CharField(max_length=50)),
+                ('rehearsal', models.BooleanField(default=False)),
+                ('plan', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'promotions',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeeSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_fees', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fees_paid', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('batch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.batch')),
+                ('student', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.student')),
+                ('promotion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_snapshots', to='api.promotion')),
+            ],
+            options={
+                'db_table': 'promotion_fee_snapshots',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='promotion',
+            index=models.Index(fields=['user', 'created_at'], name='promotions_user_idx'),
+        ),
+    ]
@@ -4,6 +4,19 @@ from phonenumber_field.modelfields import PhoneNumberField
 from django.utils import timezone
 import uuid
 
+from .phones import phone_columns
+
+
+class PhoneColumnsMixin:
+    """Keeps phone_e164 / phone_last10 in step with `phone` on every save."""
+
+    def save(self, *args, **kwargs):
+        self.phone_e164, self.phone_last10 = phone_columns(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164', 'phone_last10'}
+        super().save(*args, **kwargs)
+
 
 class UserManager(BaseUserManager):
     def create_user(self, phone, password=None, **extra_fields):
@@ -21,9 +34,11 @@ class UserManager(BaseUserManager):
         return self.create_user(phone, password, **extra_fields)
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(PhoneColumnsMixin, AbstractBaseUser, PermissionsMixin):
     id             = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     phone          = PhoneNumberField(unique=True, region='IN')
+    phone_e164     = models.CharField(max_length=16, unique=True, editable=False)
+    phone_last10   = models.CharField(max_length=10, db_index=True, editable=False)
     name           = models.CharField(max_length=255)
     institute_name = models.CharField(max_length=255)
     email          = models.EmailField(max_length=255, blank=True, null=True)
@@ -64,12 +79,16 @@ class Batch(models.Model):
     class Meta:
         db_table = 'batches'
         ordering = ['-created_at']
+        indexes  = [
+            models.Index(fields=['user', 'created_at', 'id'], name='batches_user_keyset_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='batches_user_sync_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Student(models.Model):
+class Student(PhoneColumnsMixin, models.Model):
     id    = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user  = models.ForeignKey(User, on_delete=models.CASCADE, related_name='students')
     batch = models.ForeignKey(Batch, on_delete=models.SET_NULL, null=True, related_name='students')
@@ -78,10 +97,20 @@ class Student(models.Model):
     phone = PhoneNumberField(region='IN')
     roll  = models.CharField(max_length=50, blank=True)
 
+    # Normalized copies of `phone` for indexed lookups (api/phones.py)
+    phone_e164   = models.CharField(max_length=16, blank=True, editable=False)
+    phone_last10 = models.CharField(max_length=10, blank=True, editable=False)
+
     total_fees = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     fees_paid  = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    PIC_PENDING, PIC_READY, PIC_FAILED = 'pending', 'ready', 'failed'
+    PIC_STATUS_CHOICES = [(PIC_PENDING, 'Pending'), (PIC_READY, 'Ready'), (PIC_FAILED, 'Failed')]
+
     profile_pic = models.ImageField(upload_to='student_profiles/', blank=True, null=True)
+    # Filled in by api/images.py after upload: {'small_webp': <storage name>, ...}
+    profile_pic_status = models.CharField(max_length=10, choices=PIC_STATUS_CHOICES, blank=True, editable=False)
+    profile_pic_thumbs = models.JSONField(default=dict, blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -90,6 +119,12 @@ class Student(models.Model):
         db_table       = 'students'
         ordering       = ['name']
         unique_together = ['user', 'roll']
+        indexes = [
+            models.Index(fields=['user', 'phone_e164'], name='students_user_e164_idx'),
+            models.Index(fields=['user', 'phone_last10'], name='students_user_last10_idx'),
+            models.Index(fields=['user', 'name', 'id'], name='students_user_keyset_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='students_user_sync_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.roll}"
@@ -111,6 +146,10 @@ class Attendance(models.Model):
         db_table       = 'attendances'
         ordering       = ['-date']
         unique_together = ['user', 'batch', 'date']
+        indexes        = [
+            models.Index(fields=['user', 'date', 'id'], name='attendances_user_keyset_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='attendances_user_sync_idx'),
+        ]
 
     def __str__(self):
         return f"{self.batch.name} - {self.date}"
@@ -153,6 +192,10 @@ class FeePayment(models.Model):
     class Meta:
         db_table = 'fee_payments'
         ordering = ['-payment_date']
+        indexes  = [
+            models.Index(fields=['user', 'payment_date', 'id'], name='fee_payments_user_keyset_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='fee_payments_user_sync_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.name} - ₹{self.amount}"
@@ -182,6 +225,10 @@ class Test(models.Model):
     class Meta:
         db_table = 'tests'
         ordering = ['-date']
+        indexes  = [
+            models.Index(fields=['user', 'date', 'id'], name='tests_user_keyset_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='tests_user_sync_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -206,4 +253,123 @@ class TestMark(models.Model):
 
     @property
     def percentage(self):
-        return (self.marks_obtained / self.test.total_marks) * 100 if self.test.total_marks > 0 else 0
\ No newline at end of file
+        return (self.marks_obtained / self.test.total_marks) * 100 if self.test.total_marks > 0 else 0
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Daily rollups
+# Pre-aggregated per-day facts so year-scale analytics read ≤365 rows.
+# Kept current by api/rollups.py on write; repair with
+#   python manage.py rebuild_rollups --start YYYY-MM-DD --end YYYY-MM-DD
+# ─────────────────────────────────────────────────────────────────────────────
+
+class DailyRollup(models.Model):
+    date = models.DateField()
+
+    present = models.PositiveIntegerField(default=0)
+    absent  = models.PositiveIntegerField(default=0)
+    leave   = models.PositiveIntegerField(default=0)
+
+    amount_collected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payment_count    = models.PositiveIntegerField(default=0)
+
+    test_count     = models.PositiveIntegerField(default=0)
+    mark_count     = models.PositiveIntegerField(default=0)
+    percentage_sum = models.FloatField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class TenantDailyRollup(DailyRollup):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+
+    class Meta:
+        db_table        = 'tenant_daily_rollups'
+        ordering        = ['date']
+        unique_together = ['user', 'date']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date}"
+
+
+class BatchDailyRollup(DailyRollup):
+    user  = models.ForeignKey(User,  on_delete=models.CASCADE, related_name='batch_daily_rollups')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='daily_rollups')
+
+    class Meta:
+        db_table        = 'batch_daily_rollups'
+        ordering        = ['date']
+        unique_together = ['batch', 'date']
+        indexes         = [models.Index(fields=['user', 'date'])]
+
+    def __str__(self):
+        return f"{self.batch_id} - {self.date}"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sync tombstones
+# One row per deleted batch/student/session/payment/test, so offline clients
+# can pull deletes since their cursor (api/sync.py). Pruned after
+# SYNC_TOMBSTONE_DAYS by `python manage.py prune_sync_tombstones`.
+# ─────────────────────────────────────────────────────────────────────────────
+
+class SyncTombstone(models.Model):
+    user       = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    entity     = models.CharField(max_length=20)
+    object_id  = models.UUIDField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'sync_tombstones'
+        indexes  = [models.Index(fields=['user', 'deleted_at', 'id'], name='sync_tombstones_user_idx')]
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id}"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Session roll-over
+# A promotion job clones a tenant's batches for the new session and moves the
+# students who passed into them (api/promotions.py). The old session's fees
+# are kept per student in FeeSnapshot before they are reset.
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Promotion(models.Model):
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id        = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user      = models.ForeignKey(User, on_delete=models.CASCADE, related_name='promotions')
+    session   = models.CharField(max_length=50)
+    rehearsal = models.BooleanField(default=False)
+    plan      = models.JSONField(default=dict)
+    status    = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    result    = models.JSONField(default=dict, blank=True)
+    error     = models.TextField(blank=True)
+
+    created_at  = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'promotions'
+        ordering = ['-created_at']
+        indexes  = [models.Index(fields=['user', 'created_at'], name='promotions_user_idx')]
+
+    def __str__(self):
+        return f"{self.session} - {self.status}"
+
+
+class FeeSnapshot(models.Model):
+    promotion  = models.ForeignKey(Promotion, on_delete=models.CASCADE, related_name='fee_snapshots')
+    student    = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True, related_name='+')
+    batch      = models.ForeignKey(Batch, on_delete=models.SET_NULL, null=True, related_name='+')
+    total_fees = models.DecimalField(max_digits=10, decimal_places=2)
+    fees_paid  = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        db_table = 'promotion_fee_snapshots'
+
+    def __str__(self):
+        return f"{self.student_id} - {self.fees_paid}/{self.total_fees}"
@@ -0,0 +1,186 @@
+"""
+Several GET requests in one round trip.
+
+    POST /api/multi/
+    {"requests": [
+        {"id": "overview", "path": "/api/dashboard/overview/"},
+        {"id": "batches",  "path": "/api/batches/?page_size=20"},
+        {"id": "profile",  "path": "/api/auth/profile/", "headers": {"If-None-Match": "\"…\""}}
+    ]}
+
+The outer request is authenticated once and every sub-request runs the
+ordinary view as that user (DRF's forced authentication), so caching,
+conditional GET and tenant scoping behave exactly as for direct calls.
+
+Sub-requests are read-only, so they run concurrently on MULTI_REQUEST_WORKERS
+threads, each with its own database connection. They run one after another
+when that would not be safe or useful: on SQLite (one writer, in-memory test
+databases) and inside a transaction, whose uncommitted rows other connections
+cannot see.
+
+A request may hold MULTI_REQUEST_LIMIT sub-requests whose COSTS add up to at
+most MULTI_REQUEST_MAX_COST; heavy reports cost more than plain lists.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .json_sql import RawJSON, RawJSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Relative cost per URL name; anything else costs 1
+COSTS = {
+    'dashboard-overview':         3,
+    'dashboard-analytics':        5,
+    'fee-analytics':              3,
+    'batch-fee-overview':         2,
+    'class-attendance-report':    3,
+    'student-attendance-report':  2,
+    'student-full-profile':       3,
+    'student-test-report':        2,
+    'test-comparison':            3,
+    'sync':                       5,
+}
+
+# Never run as sub-requests: itself, and file downloads
+EXCLUDED = {'multi-request', 'media-file', 'export'}
+
+# Request headers a sub-request may set
+FORWARDED_HEADERS = {'if-none-match', 'if-modified-since', 'accept-language'}
+
+# Outer request headers not passed on to sub-requests
+_DROPPED_META = {
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+    'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE', 'HTTP_AUTHORIZATION', 'HTTP_COOKIE',
+}
+
+_renderer = JSONRenderer()
+_executor = None
+
+
+class MultiRequestError(ValueError):
+    """The envelope itself is invalid; nothing was run."""
+
+
+def parse_requests(items):
+    """Validate the sub-requests and resolve their views; raises MultiRequestError."""
+    limit    = getattr(settings, 'MULTI_REQUEST_LIMIT', 10)
+    max_cost = getattr(settings, 'MULTI_REQUEST_MAX_COST', 20)
+
+    if not isinstance(items, list) or not items:
+        raise MultiRequestError('"requests" must be a non-empty list')
+    if len(items) > limit:
+        raise MultiRequestError(f'At most {limit} requests per call')
+
+    calls, cost = [], 0
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise MultiRequestError(f'Request {index} needs a "path"')
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict) or not set(map(str.lower, headers)) <= FORWARDED_HEADERS:
+            raise MultiRequestError(
+                f'Request {index}: only {", ".join(sorted(FORWARDED_HEADERS))} headers are allowed'
+            )
+
+        url   = urlsplit(item['path'])
+        match = None
+        if url.path.startswith('/api/'):
+            try:
+                match = resolve(url.path)
+            except Resolver404:
+                pass
+        if match is not None and match.url_name in EXCLUDED:
+            raise MultiRequestError(f'Request {index}: {url.path} cannot be batched')
+
+        cost += COSTS.get(match.url_name, 1) if match else 1
+        calls.append({
+            'id':      item.get('id', index),
+            'path':    url.path,
+            'query':   url.query,
+            'headers': headers,
+            'match':   match,
+        })
+
+    if cost > max_cost:
+        raise MultiRequestError(f'Requests cost {cost}, more than the limit of {max_cost}')
+    return calls
+
+
+def run_requests(request, calls):
+    """One result per call, in order: {"id", "status", "headers", "body"}."""
+    workers = getattr(settings, 'MULTI_REQUEST_WORKERS', 4)
+    if workers < 2 or len(calls) < 2 or not _can_run_concurrently():
+        return [_run(request, call) for call in calls]
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='multi-request')
+    futures = [_executor.submit(_run_in_worker, request, call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def _can_run_concurrently():
+    return connection.vendor != 'sqlite' and not connection.in_atomic_block
+
+
+def _run_in_worker(request, call):
+    try:
+        return _run(request, call)
+    finally:
+        close_old_connections()
+
+
+def _run(request, call):
+    result = {'id': call['id'], 'status': 404, 'headers': {}, 'body': None}
+    if call['match'] is None:
+        result['body'] = {'detail': 'Not found.'}
+        return result
+
+    try:
+        response = call['match'].func(_sub_request(request, call), *call['match'].args, **call['match'].kwargs)
+    except Exception:
+        logger.exception('Sub-request %s failed', call['path'])
+        result.update(status=500, body={'detail': 'Internal server error.'})
+        return result
+
+    result['status'] = response.status_code
+    for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+        if response.has_header(header):
+            result['headers'][header] = response[header]
+
+    # Encoded here, once, and spliced into the envelope as-is
+    if isinstance(response, Response):
+        result['body'] = RawJSON(_renderer.render(response.data).decode())
+    elif isinstance(response, RawJSONResponse):
+        result['body'] = RawJSON(response.content.decode())
+    return result
+
+
+def _sub_request(request, call):
+    outer = request._request
+    sub   = HttpRequest()
+    sub.method    = 'GET'
+    sub.path      = sub.path_info = call['path']
+    sub.META      = {key: value for key, value in outer.META.items() if key not in _DROPPED_META}
+    sub.META.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO':      call['path'],
+        'QUERY_STRING':   call['query'],
+    })
+    for name, value in call['headers'].items():
+        sub.META['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    sub.GET = QueryDict(call['query'])
+    sub.resolver_match = call['match']
+
+    # Authenticated once, by the outer request
+    sub._force_auth_user  = request.user
+    sub._force_auth_token = request.auth
+    return sub
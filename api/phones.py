@@ -0,0 +1,83 @@
+"""
+Normalized phone columns.
+
+User.phone and Student.phone are stored in NATIONAL format, so matching a
+typed number against them means parsing it with `phonenumbers` first. The
+models also keep `phone_e164` and `phone_last10` (indexed) in sync on save;
+lookups go through those instead, and the common input shapes are
+normalized here without parsing.
+"""
+import re
+from functools import lru_cache
+
+import phonenumbers
+from django.conf import settings
+from phonenumber_field.phonenumber import PhoneNumber
+
+NATIONAL_NUMBER_LENGTH = 10     # Indian mobile numbers; models use region='IN'
+
+
+def phone_columns(phone):
+    """(phone_e164, phone_last10) for a PhoneNumberField value."""
+    if not getattr(phone, 'national_number', None):
+        return '', ''
+    return phone.as_e164, str(phone.national_number)[-NATIONAL_NUMBER_LENGTH:]
+
+
+@lru_cache(maxsize=1)
+def _country_code():
+    return str(phonenumbers.country_code_for_region(settings.PHONENUMBER_DEFAULT_REGION))
+
+
+@lru_cache(maxsize=4096)
+def to_e164(raw):
+    """
+    E.164 form of a typed phone number, or None if it is not one.
+
+    "9876543210", "098765 43210", "919876543210" and "+91 98765 43210" are
+    recognised from their digits alone; anything else is parsed.
+    """
+    raw    = (raw or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    code   = _country_code()
+
+    if not raw.startswith('+'):
+        if len(digits) == NATIONAL_NUMBER_LENGTH:
+            return f'+{code}{digits}'
+        if len(digits) == NATIONAL_NUMBER_LENGTH + 1 and digits.startswith('0'):
+            return f'+{code}{digits[1:]}'
+        if len(digits) == NATIONAL_NUMBER_LENGTH + len(code) and digits.startswith(code):
+            return f'+{digits}'
+    elif digits.startswith(code) and len(digits) == NATIONAL_NUMBER_LENGTH + len(code):
+        return f'+{digits}'
+
+    try:
+        number = phonenumbers.parse(raw, settings.PHONENUMBER_DEFAULT_REGION)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+@lru_cache(maxsize=4096)
+def parse_phone(raw):
+    """
+    Validated PhoneNumber for a typed number, or None.
+
+    Cached like to_e164: a bulk import repeats the same parent numbers, and
+    the instance can be assigned to PhoneNumberField without parsing again.
+    """
+    e164 = to_e164(raw)
+    if e164 is None:
+        return None
+    number = PhoneNumber.from_string(e164)
+    return number if number.is_valid() else None
+
+
+def search_digits(term):
+    """Digits of a search term comparable with phone_last10."""
+    digits = re.sub(r'\D', '', term)
+    if term.lstrip().startswith('+') and digits.startswith(_country_code()):
+        digits = digits[len(_country_code()):]
+    return digits[-NATIONAL_NUMBER_LENGTH:]
@@ -0,0 +1,400 @@
+"""
+Session roll-over: promote a tenant's students into next session's batches.
+
+    POST /api/promotions/
+    {"session": "2026-27", "pass_percentage": 33, "rehearsal": true}
+
+A promotion job, run on a background thread once the request commits:
+
+1. holds back students below `pass_percentage` over their batch's tests
+   (since `since`, if given; students without marks pass) and anyone
+   listed in `hold_back`;
+2. stores every student's total_fees / fees_paid in FeeSnapshot;
+3. clones each batch (one INSERT) as "<name> (<session>)" unless renamed;
+4. moves the other students into the clone with one UPDATE per batch,
+   resetting fees_paid and, where given, total_fees.
+
+All of it runs in one transaction, so a failure leaves nothing half done. A
+rehearsal runs the same transaction and rolls it back, so its result is
+exactly what the real run would do. A real run locks the tenant's user row,
+as does the request that queues it, and records `done` in its transaction,
+so two runs can never both apply: the later one sees the earlier and fails. Progress is kept in the cache, since
+the job's own writes are invisible to other connections until it commits.
+
+PROMOTION_WORKERS = 0 runs the job inline, which is what the tests use.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .cache import bump_tenant_version
+from .imports import chunked
+from .models import Batch, FeeSnapshot, Promotion, Student, TestMark, User
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CHUNK_SIZE = 2000
+PROGRESS_TTL        = 60 * 60 * 24
+
+# A job still pending/running after this long died with its process
+STALE_AFTER = timedelta(hours=1)
+
+_executor = None
+
+
+class PromotionError(ValueError):
+    """The plan cannot be run; no job was created."""
+
+
+class PromotionConflict(PromotionError):
+    """Another real roll-over is running, or already moved the students."""
+
+
+class _Rehearsal(Exception):
+    def __init__(self, result):
+        self.result = result
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Plan
+# ─────────────────────────────────────────────────────────────────────────────
+
+def parse_plan(user, data):
+    """Validate a roll-over request into the plan stored on the job."""
+    if not isinstance(data, dict):
+        raise PromotionError('The body must be a JSON object')
+    session = str(data.get('session') or '').strip()
+    if not session or len(session) > 50:
+        raise PromotionError('"session" is required (e.g. "2026-27"), at most 50 characters')
+
+    batches = {b.id: b for b in Batch.objects.filter(user=user)}
+    items   = data.get('batches')
+    if items is None:
+        items = [{'from': str(pk)} for pk in batches]
+    if not isinstance(items, list) or not items:
+        raise PromotionError('"batches" must be a non-empty list')
+
+    plan_batches, seen = [], set()
+    for item in items:
+        if not isinstance(item, dict):
+            raise PromotionError('Each of "batches" needs a "from" batch id')
+        source = batches.get(_uuid(item.get('from'), 'from'))
+        if source is None or source.id in seen:
+            raise PromotionError(f'Invalid or repeated batch "{item.get("from")}"')
+        seen.add(source.id)
+
+        name = str(item.get('name') or f'{source.name} ({session})').strip()[:255]
+        fees = item.get('total_fees')
+        plan_batches.append({
+            'from':       str(source.id),
+            'name':       name,
+            'timing':     str(item.get('timing') or source.timing)[:100],
+            'total_fees': None if fees in (None, '') else str(_amount(fees, 'total_fees')),
+        })
+
+    pass_percentage = data.get('pass_percentage')
+    if pass_percentage not in (None, ''):
+        pass_percentage = _amount(pass_percentage, 'pass_percentage')
+        if pass_percentage > 100:
+            raise PromotionError('"pass_percentage" must be between 0 and 100')
+        pass_percentage = str(pass_percentage)
+    else:
+        pass_percentage = None
+
+    since = data.get('since')
+    if since:
+        try:
+            day = parse_date(str(since))
+        except ValueError:        # well formed but not a day, e.g. 2024-02-30
+            day = None
+        if day is None:
+            raise PromotionError('"since" must be a date (YYYY-MM-DD)')
+        since = str(day)
+
+    hold_back = data.get('hold_back') or []
+    if not isinstance(hold_back, list):
+        raise PromotionError('"hold_back" must be a list of student ids')
+
+    return {
+        'batches':         plan_batches,
+        'pass_percentage': pass_percentage,
+        'since':           since or None,
+        'hold_back':       [str(_uuid(pk, 'hold_back')) for pk in hold_back],
+        'reset_fees':      data.get('reset_fees', True) is not False,
+    }
+
+
+def active_promotion(user):
+    """A real roll-over of this tenant that is queued or running, if any."""
+    return Promotion.objects.filter(
+        user=user, rehearsal=False, status__in=[Promotion.PENDING, Promotion.RUNNING],
+        created_at__gte=timezone.now() - STALE_AFTER,
+    ).first()
+
+
+def lock_tenant(user_id):
+    """Lock the tenant's user row until the transaction ends (a no-op on SQLite)."""
+    User.objects.select_for_update().only('pk').get(pk=user_id)
+
+
+def check_roll_over(user_id, session, promotion=None):
+    """
+    Raise PromotionConflict unless a real roll-over to `session` may run.
+
+    Called under lock_tenant, by the request before it queues `promotion`
+    (None) and again by the job itself before it moves anyone.
+    """
+    done = Promotion.objects.filter(user_id=user_id, rehearsal=False, status=Promotion.DONE)
+    if promotion is None:
+        if active_promotion(user_id):
+            raise PromotionConflict('A roll-over is already running')
+    else:
+        done = done.exclude(pk=promotion.pk)
+        if done.filter(finished_at__gt=promotion.created_at).exists():
+            raise PromotionConflict('Another roll-over finished after this one was started')
+    if done.filter(session=session).exists():
+        raise PromotionConflict(f'Already rolled over to {session}')
+
+
+def _uuid(value, label):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise PromotionError(f'"{value}" in "{label}" is not a valid id')
+
+
+def _amount(value, label):
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise PromotionError(f'"{label}" must be a number')
+    if not amount.is_finite() or amount < 0 or amount != amount.quantize(Decimal('0.01')):
+        raise PromotionError(f'"{label}" must be a positive amount with at most 2 decimals')
+    return amount
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Background job
+# ─────────────────────────────────────────────────────────────────────────────
+
+def schedule_promotion(promotion):
+    """Run the job once the current transaction commits."""
+    pk = promotion.pk
+    transaction.on_commit(lambda: _submit(pk))
+
+
+def _submit(promotion_id):
+    workers = getattr(settings, 'PROMOTION_WORKERS', 1)
+    if not workers:
+        run_promotion(promotion_id)
+        return
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='promotion')
+    _executor.submit(_run_in_worker, promotion_id)
+
+
+def _run_in_worker(promotion_id):
+    close_old_connections()
+    try:
+        run_promotion(promotion_id)
+    finally:
+        close_old_connections()
+
+
+def run_promotion(promotion_id):
+    """Run (or rehearse) a roll-over and record its result on the job."""
+    promotion = Promotion.objects.get(pk=promotion_id)
+    Promotion.objects.filter(pk=promotion_id).update(status=Promotion.RUNNING)
+    progress = _Progress(promotion_id, steps=len(promotion.plan['batches']) + 3)
+
+    try:
+        with transaction.atomic():
+            result = _roll_over(promotion, progress)
+            if promotion.rehearsal:
+                raise _Rehearsal(result)
+            # Committed with the roll-over itself, for check_roll_over
+            _finish(promotion_id, status=Promotion.DONE, result=result)
+    except _Rehearsal as rehearsal:
+        _finish(promotion_id, status=Promotion.DONE, result=rehearsal.result)
+    except PromotionConflict as e:
+        logger.warning('Promotion %s not run: %s', promotion_id, e)
+        _finish(promotion_id, status=Promotion.FAILED, error=str(e))
+    except Exception as e:
+        logger.exception('Promotion %s failed', promotion_id)
+        _finish(promotion_id, status=Promotion.FAILED, error=str(e) or e.__class__.__name__)
+
+
+def _finish(promotion_id, **values):
+    Promotion.objects.filter(pk=promotion_id).update(finished_at=timezone.now(), **values)
+    cache.delete(_progress_key(promotion_id))
+
+
+class _Progress:
+    def __init__(self, promotion_id, steps):
+        self.key, self.steps, self.done = _progress_key(promotion_id), steps, 0
+
+    def step(self, label):
+        cache.set(self.key, {'percent': round(100 * self.done / self.steps), 'step': label}, PROGRESS_TTL)
+        self.done += 1
+
+
+def _progress_key(promotion_id):
+    return f'promotion-progress:{promotion_id}'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Roll-over
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _roll_over(promotion, progress):
+    plan, user_id = promotion.plan, promotion.user_id
+    if not promotion.rehearsal:
+        lock_tenant(user_id)
+        check_roll_over(user_id, promotion.session, promotion)
+    now = timezone.now()
+
+    # Locked so that nobody edits them halfway (a no-op on SQLite)
+    sources  = Batch.objects.select_for_update().filter(user_id=user_id).in_bulk(
+        [item['from'] for item in plan['batches']],
+    )
+    items    = [item for item in plan['batches'] if UUID(item['from']) in sources]
+    students = Student.objects.filter(user_id=user_id, batch_id__in=sources)
+
+    progress.step('Checking results')
+    held = _held_back(students, plan)
+
+    progress.step('Saving fee snapshot')
+    before = {
+        row['batch_id']: row
+        for row in students.values('batch_id').annotate(
+            students=Count('id'), total_fees=Sum('total_fees'), fees_paid=Sum('fees_paid'),
+        ).order_by()
+    }
+    rows = students.order_by().values_list('id', 'batch_id', 'total_fees', 'fees_paid')
+    for chunk in chunked(rows.iterator(chunk_size=SNAPSHOT_CHUNK_SIZE), SNAPSHOT_CHUNK_SIZE):
+        FeeSnapshot.objects.bulk_create([
+            FeeSnapshot(promotion=promotion, student_id=pk, batch_id=batch_id,
+                        total_fees=total_fees, fees_paid=fees_paid)
+            for pk, batch_id, total_fees, fees_paid in chunk
+        ])
+
+    progress.step('Creating batches')
+    clones = Batch.objects.bulk_create([
+        Batch(user_id=user_id, name=item['name'], timing=item['timing']) for item in items
+    ])
+
+    result = {'batches': [], 'promoted': 0, 'held_back': len(held), 'snapshot': {
+        'students':   sum(row['students'] for row in before.values()),
+        'total_fees': _money(sum(row['total_fees'] for row in before.values())),
+        'fees_paid':  _money(sum(row['fees_paid'] for row in before.values())),
+    }}
+    for item, clone in zip(items, clones):
+        source = sources[UUID(item['from'])]
+        progress.step(f'Promoting {source.name}')
+
+        values = {'batch': clone, 'updated_at': now}
+        if plan['reset_fees']:
+            values['fees_paid'] = Decimal('0')
+            if item['total_fees'] is not None:
+                values['total_fees'] = Decimal(item['total_fees'])
+        promoted = students.filter(batch=source).exclude(id__in=held).update(**values)
+
+        fees = before.get(source.id, {})
+        result['promoted'] += promoted
+        result['batches'].append({
+            'from':       str(source.id),
+            'from_name':  source.name,
+            'id':         None if promotion.rehearsal else str(clone.id),
+            'name':       clone.name,
+            'promoted':   promoted,
+            'held_back':  sum(1 for batch_id in held.values() if batch_id == source.id),
+            'total_fees': _money(fees.get('total_fees')),
+            'fees_paid':  _money(fees.get('fees_paid')),
+        })
+
+    if held and plan['reset_fees']:
+        # They repeat the session in their old batch, at the same fees
+        Student.objects.filter(id__in=held).update(fees_paid=Decimal('0'), updated_at=now)
+
+    bump_tenant_version(user_id)
+    return result
+
+
+def _money(value):
+    # SQLite sums come back without the column's 2 decimals
+    return str(Decimal(value or 0).quantize(Decimal('0.01')))
+
+
+def _held_back(students, plan):
+    """{student id: batch id} of the students who stay in their batch."""
+    held = set(map(UUID, plan['hold_back']))
+
+    if plan['pass_percentage'] is not None:
+        # Marks of the tests of each student's own batch, one row per student
+        marks = TestMark.objects.filter(student__in=students, test__batch_id=F('student__batch_id'))
+        if plan['since']:
+            marks = marks.filter(test__date__gte=plan['since'])
+        pass_percentage = Decimal(plan['pass_percentage'])
+        held |= {
+            row['student_id']
+            for row in marks.values('student_id').annotate(
+                obtained=Sum('marks_obtained'), out_of=Sum('test__total_marks'),
+            ).order_by()
+            if row['out_of'] and row['obtained'] * 100 < pass_percentage * row['out_of']
+        }
+
+    return dict(students.filter(id__in=held).values_list('id', 'batch_id')) if held else {}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Status
+# ─────────────────────────────────────────────────────────────────────────────
+
+def promotion_data(promotion):
+    if promotion.status in (Promotion.PENDING, Promotion.RUNNING) and \
+            promotion.created_at < timezone.now() - STALE_AFTER:
+        _fail_stale(promotion)
+
+    data = {
+        'id':          str(promotion.id),
+        'session':     promotion.session,
+        'rehearsal':   promotion.rehearsal,
+        'status':      promotion.status,
+        'progress':    None,
+        'plan':        promotion.plan,
+        'result':      promotion.result or None,
+        'error':       promotion.error or None,
+        'created_at':  timezone.localtime(promotion.created_at).strftime('%Y-%m-%d %H:%M:%S'),
+        'finished_at': (timezone.localtime(promotion.finished_at).strftime('%Y-%m-%d %H:%M:%S')
+                        if promotion.finished_at else None),
+    }
+    if promotion.status == Promotion.DONE:
+        data['progress'] = {'percent': 100, 'step': 'Done'}
+    elif promotion.status in (Promotion.PENDING, Promotion.RUNNING):
+        data['progress'] = cache.get(_progress_key(promotion.id)) or {'percent': 0, 'step': 'Waiting'}
+    return data
+
+
+def _fail_stale(promotion):
+    """Mark a job that outlived STALE_AFTER failed: its process died mid-way."""
+    values = {
+        'status':      Promotion.FAILED,
+        'error':       'The job stopped unexpectedly; nothing was changed',
+        'finished_at': timezone.now(),
+    }
+    # Unless it finished meanwhile
+    if Promotion.objects.filter(pk=promotion.pk, status=promotion.status).update(**values):
+        for field, value in values.items():
+            setattr(promotion, field, value)
+        cache.delete(_progress_key(promotion.pk))
@@ -0,0 +1,40 @@
+from django.db.models import F, FloatField, IntegerField, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def mark_percentage(prefix=''):
+    """
+    Percentage scored on a TestMark as a DB expression.
+
+    `prefix` is the lookup path to the TestMark (e.g. 'test_marks__') when
+    the expression is used from a related model. A test with no total marks
+    scores 0, like TestMark.percentage, rather than dividing by zero.
+    """
+    return Coalesce(
+        Cast(F(f'{prefix}marks_obtained'), FloatField()) * 100.0
+        / Cast(NullIf(F(f'{prefix}test__total_marks'), 0), FloatField()),
+        Value(0.0),
+    )
+
+
+def subquery_aggregate(queryset, aggregate, default=0, output_field=None):
+    """
+    Correlated scalar subquery returning `aggregate` over `queryset`.
+
+    Filter `queryset` with OuterRef(...) to tie it to the outer row; an empty
+    match yields `default` instead of NULL. Pass `output_field` for anything
+    other than an integer result.
+    """
+    output_field = output_field or IntegerField()
+    inner = (
+        queryset.order_by()
+        .annotate(_one=Value(1))
+        .values('_one')                 # constant group → a single row
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(
+        Subquery(inner, output_field=output_field),
+        Value(default, output_field=output_field),
+        output_field=output_field,
+    )
@@ -0,0 +1,163 @@
+"""
+Daily rollups of attendance, fee collections and test marks.
+
+Writes mark the (tenant, day) pairs they touch as dirty; once the transaction
+commits, those days are recomputed from the fact tables and replaced in
+TenantDailyRollup / BatchDailyRollup. Recomputing a whole day (rather than
+applying +/- deltas) keeps updates, moves and deletes trivially correct.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import (
+    AttendanceRecord, FeePayment, TestMark, TenantDailyRollup, BatchDailyRollup,
+)
+from .queries import mark_percentage
+from .cache import bump_tenant_version
+
+ROLLUP_FIELDS = (
+    'present', 'absent', 'leave', 'amount_collected', 'payment_count',
+    'test_count', 'mark_count', 'percentage_sum',
+)
+
+# Days waiting for the current transaction to commit, {user_id: {day}}; kept
+# on the connection, which is per thread like the transaction itself
+_PENDING = 'api_rollups_pending'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Dirty tracking
+# ─────────────────────────────────────────────────────────────────────────────
+
+def mark_rollups_dirty(user_id, *days):
+    """Schedule the given days of a tenant for recomputation on commit."""
+    days = {d for d in days if d is not None}
+    if user_id is None or not days:
+        return
+
+    pending = getattr(connection, _PENDING, None)
+    if pending is None:
+        pending = defaultdict(set)
+        setattr(connection, _PENDING, pending)
+    pending[user_id] |= days
+
+    # Every call registers the flush, and the first one to run takes the whole
+    # set while the others find it empty. A flush discarded with a rolled-back
+    # savepoint therefore loses nothing, and days left by a rolled-back
+    # transaction are simply recomputed with the next one.
+    transaction.on_commit(_flush)     # runs now outside a transaction
+
+
+def _flush():
+    pending = getattr(connection, _PENDING, None)
+    setattr(connection, _PENDING, None)
+    for user_id, days in (pending or {}).items():
+        rebuild_rollups(user_id, days)
+        # Cached analytics must not outlive the rollups they were built from
+        bump_tenant_version(user_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Recompute
+# ─────────────────────────────────────────────────────────────────────────────
+
+def rebuild_rollups(user_id, days):
+    """
+    Recompute the rollup rows of one tenant for a set of days.
+
+    Returns the number of (tenant + batch) rows written.
+    """
+    days = sorted(set(days))
+    if not days:
+        return 0
+
+    batch_rows = defaultdict(_empty)      # (batch_id, day) → counters
+    tenant_rows = defaultdict(_empty)     # day → counters
+
+    attendance = (
+        AttendanceRecord.objects
+        .filter(attendance__user_id=user_id, attendance__date__in=days)
+        .values('attendance__batch_id', 'attendance__date')
+        .annotate(
+            present=Count('id', filter=Q(status='present')),
+            absent=Count('id', filter=Q(status='absent')),
+            leave=Count('id', filter=Q(status='leave')),
+        )
+        .order_by()
+    )
+    for row in attendance:
+        _add(batch_rows, tenant_rows, row['attendance__batch_id'], row['attendance__date'], row)
+
+    payments = (
+        FeePayment.objects
+        .filter(user_id=user_id, payment_date__date__in=days)
+        .annotate(day=TruncDate('payment_date'))
+        .values('student__batch_id', 'day')
+        .annotate(amount_collected=Sum('amount'), payment_count=Count('id'))
+        .order_by()
+    )
+    for row in payments:
+        _add(batch_rows, tenant_rows, row['student__batch_id'], row['day'], row)
+
+    marks = (
+        TestMark.objects
+        .filter(test__user_id=user_id, test__date__in=days)
+        .values('test__batch_id', 'test__date')
+        .annotate(
+            test_count=Count('test', distinct=True),
+            mark_count=Count('id'),
+            percentage_sum=Sum(mark_percentage()),
+        )
+        .order_by()
+    )
+    for row in marks:
+        _add(batch_rows, tenant_rows, row['test__batch_id'], row['test__date'], row)
+
+    with transaction.atomic():
+        TenantDailyRollup.objects.filter(user_id=user_id, date__in=days).delete()
+        BatchDailyRollup.objects.filter(user_id=user_id, date__in=days).delete()
+        TenantDailyRollup.objects.bulk_create([
+            TenantDailyRollup(user_id=user_id, date=day, **counters)
+            for day, counters in tenant_rows.items()
+        ])
+        BatchDailyRollup.objects.bulk_create([
+            BatchDailyRollup(user_id=user_id, batch_id=batch_id, date=day, **counters)
+            for (batch_id, day), counters in batch_rows.items()
+        ])
+
+    return len(tenant_rows) + len(batch_rows)
+
+
+def rebuild_rollups_range(user_id, start, end, window=31):
+    """Recompute every day in [start, end], `window` days per pass."""
+    written = 0
+    day = start
+    while day <= end:
+        last = min(day + timedelta(days=window - 1), end)
+        days = [day + timedelta(days=i) for i in range((last - day).days + 1)]
+        written += rebuild_rollups(user_id, days)
+        day = last + timedelta(days=1)
+    return written
+
+
+def _empty():
+    return {
+        'present': 0, 'absent': 0, 'leave': 0,
+        'amount_collected': Decimal('0.00'), 'payment_count': 0,
+        'test_count': 0, 'mark_count': 0, 'percentage_sum': 0.0,
+    }
+
+
+def _add(batch_rows, tenant_rows, batch_id, day, row):
+    targets = [tenant_rows[day]]
+    if batch_id is not None:              # students may have no batch
+        targets.append(batch_rows[(batch_id, day)])
+    for counters in targets:
+        for field in ROLLUP_FIELDS:
+            if field in row and row[field] is not None:
+                counters[field] += row[field]
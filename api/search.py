@@ -0,0 +1,175 @@
+"""
+Ranked student search over name, roll number and phone digits.
+
+On PostgreSQL the match runs in SQL against pg_trgm GIN indexes (see
+migrations 0003_student_search_indexes and 0004_phone_columns). Other
+backends (SQLite in development and CI) use an in-process trigram index per
+tenant, rebuilt lazily whenever the tenant's data version changes.
+
+Ranking, highest first: exact roll, name prefix, roll prefix, phone digits,
+name substring; ties are broken by trigram similarity (PostgreSQL) and name.
+"""
+import threading
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Func, IntegerField, Q, Value, When
+
+from .cache import tenant_version
+from .models import Student
+from .phones import search_digits
+
+SEARCH_LIMIT = 100
+MIN_PHONE_DIGITS = 3
+
+RANK_ROLL_EXACT  = 5
+RANK_NAME_PREFIX = 4
+RANK_ROLL_PREFIX = 3
+RANK_PHONE       = 2
+RANK_NAME        = 1
+
+
+def search_students(user, term, batch_id=None, limit=SEARCH_LIMIT):
+    """Return up to `limit` of the tenant's students matching `term`, best first."""
+    term = term.strip()
+    if not term:
+        return []
+
+    if connection.vendor == 'postgresql':
+        return list(_search_sql(user, term, batch_id)[:limit])
+
+    # The ids come from this tenant's index; a plain primary-key lookup keeps
+    # SQLite from scanning the tenant through the user_id index instead.
+    ids = _tenant_index(user.id).search(term, batch_id, limit)
+    students = Student.objects.select_related('batch').in_bulk(ids)
+    return [students[pk] for pk in ids if pk in students]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PostgreSQL
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _search_sql(user, term, batch_id):
+    students = Student.objects.filter(user=user).select_related('batch')
+    if batch_id:
+        students = students.filter(batch_id=batch_id)
+
+    digits  = search_digits(term)
+    matches = Q(name__icontains=term) | Q(roll__istartswith=term)
+    ranks   = [
+        When(roll__iexact=term, then=Value(RANK_ROLL_EXACT)),
+        When(name__istartswith=term, then=Value(RANK_NAME_PREFIX)),
+        When(roll__istartswith=term, then=Value(RANK_ROLL_PREFIX)),
+    ]
+    if len(digits) >= MIN_PHONE_DIGITS:
+        matches |= Q(phone_last10__contains=digits)
+        ranks.append(When(phone_last10__contains=digits, then=Value(RANK_PHONE)))
+
+    return students.filter(matches).annotate(
+        rank=Case(*ranks, default=Value(RANK_NAME), output_field=IntegerField()),
+        similarity=Func(F('name'), Value(term), function='SIMILARITY', output_field=FloatField()),
+    ).order_by('-rank', '-similarity', 'name')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# In-process index (other backends)
+# ─────────────────────────────────────────────────────────────────────────────
+
+INDEX_CACHE_SIZE = 32
+
+_indexes = OrderedDict()          # user_id → (version, StudentSearchIndex)
+_indexes_lock = threading.Lock()
+
+
+def _tenant_index(user_id):
+    version = tenant_version(user_id)
+    with _indexes_lock:
+        cached = _indexes.get(user_id)
+        if cached and cached[0] == version:
+            _indexes.move_to_end(user_id)
+            return cached[1]
+
+    index = StudentSearchIndex(
+        Student.objects.filter(user_id=user_id).values_list(
+            'id', 'name', 'roll', 'phone_last10', 'batch_id'
+        )
+    )
+    with _indexes_lock:
+        _indexes[user_id] = (version, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class StudentSearchIndex:
+    """Trigram postings over lower-cased name, roll and phone digits."""
+
+    def __init__(self, rows):
+        self.entries  = []        # (id, name, roll, digits, batch_id, sort name)
+        self.postings = {}        # trigram → set of entry positions
+
+        for pos, (pk, name, roll, digits, batch_id) in enumerate(rows):
+            name_key = (name or '').lower()
+            roll_key = (roll or '').lower()
+            digits   = digits or ''
+            self.entries.append((pk, name_key, roll_key, digits, str(batch_id or ''), name or ''))
+            for gram in _trigrams(name_key) | _trigrams(roll_key) | _trigrams(digits):
+                self.postings.setdefault(gram, set()).add(pos)
+
+    def search(self, term, batch_id=None, limit=SEARCH_LIMIT):
+        key    = term.lower()
+        digits = search_digits(term)
+        if len(digits) < MIN_PHONE_DIGITS:
+            digits = None
+
+        candidates = self._candidates(key, digits)
+        batch_id   = str(batch_id) if batch_id else None
+
+        ranked = []
+        for pos in candidates:
+            pk, name, roll, entry_digits, entry_batch, sort_name = self.entries[pos]
+            if batch_id and entry_batch != batch_id:
+                continue
+            rank = self._rank(key, digits, name, roll, entry_digits)
+            if rank:
+                ranked.append((-rank, sort_name, pos, pk))
+
+        ranked.sort()
+        return [pk for *_, pk in ranked[:limit]]
+
+    def _candidates(self, key, digits):
+        # Short terms (e.g. roll "12") scan every entry; longer ones only the
+        # entries holding every trigram of the term across their fields.
+        if len(key) < 3:
+            return range(len(self.entries))
+
+        found = self._lookup(key)
+        if digits:
+            found |= self._lookup(digits)
+        return found
+
+    def _lookup(self, text):
+        postings = [self.postings.get(gram) for gram in _trigrams(text)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    @staticmethod
+    def _rank(key, digits, name, roll, entry_digits):
+        if roll == key:
+            return RANK_ROLL_EXACT
+        if name.startswith(key):
+            return RANK_NAME_PREFIX
+        if roll.startswith(key):
+            return RANK_ROLL_PREFIX
+        if digits and digits in entry_digits:
+            return RANK_PHONE
+        if key in name:
+            return RANK_NAME
+        return 0
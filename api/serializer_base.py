@@ -0,0 +1,275 @@
+"""
+Base class for the API's model serializers.
+
+RelationAwareSerializer knows which relations and annotations its fields
+read, and prepares data accordingly so that serializing N rows never costs
+N extra queries:
+
+- querysets passed with many=True are optimized automatically
+  (select_related / Prefetch / annotate, plus only() for sparse fieldsets);
+- a single instance gets its relations loaded with prefetch_related_objects
+  before serialization.
+
+Relations are derived from each field's `source`. Properties and method
+fields declare what they read in Meta.field_requires, and values computed in
+SQL in Meta.field_annotations. What each field needs is worked out once per
+serializer class and model; a request only merges the fields it renders.
+
+With settings.SERIALIZER_STRICT_RELATIONS = True (the test suite sets it),
+any query issued while rows are being serialized raises LazyRelationAccess.
+
+?fields=a,b and ?exclude=c on GET requests prune both the output and the
+query, provided the request is in the serializer context.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import Manager, Prefetch, QuerySet, prefetch_related_objects
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class LazyRelationAccess(AssertionError):
+    """A query ran while serializing rows (strict mode only)."""
+
+
+@contextmanager
+def lazy_relation_guard():
+    """Fail on any query inside the block when SERIALIZER_STRICT_RELATIONS is on."""
+    if not getattr(settings, 'SERIALIZER_STRICT_RELATIONS', False):
+        yield
+        return
+
+    def forbid(execute, sql, params, many, context):
+        raise LazyRelationAccess(f'Query during serialization: {sql}')
+
+    with connection.execute_wrapper(forbid):
+        yield
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Serializers
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RelationAwareListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, (Manager, QuerySet)) else data)
+        with lazy_relation_guard():
+            return [self.child.to_representation(item) for item in items]
+
+
+class RelationAwareSerializer(serializers.ModelSerializer):
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, 'Meta', None)
+        if meta is not None and not hasattr(meta, 'list_serializer_class'):
+            meta.list_serializer_class = RelationAwareListSerializer
+        cls._field_plans_cache = {}       # (model, parent_field) → {field name: _Plan}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context.get('request'))
+        if wanted is not None:
+            for name in list(self.fields):
+                if name not in wanted:
+                    self.fields.pop(name)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        if args and isinstance(args[0], QuerySet) and args[0]._result_cache is None:
+            request = (kwargs.get('context') or {}).get('request')
+            args = (cls.optimize_queryset(args[0], request), *args[1:])
+        return super().many_init(*args, **kwargs)
+
+    def to_representation(self, instance):
+        if self.parent is not None:
+            return super().to_representation(instance)
+
+        self._load_relations(instance)
+        with lazy_relation_guard():
+            return super().to_representation(instance)
+
+    # ── Query planning ───────────────────────────────────────────────────────
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request=None, parent_field=None):
+        """
+        Return `queryset` with the joins, prefetches and annotations the
+        (requested) fields need, and only() their columns on sparse requests.
+        `parent_field` is the FK back to the parent when prefetched as a child.
+        """
+        plan = cls._plan(queryset.model, request, parent_field)
+
+        queryset = queryset.select_related(None)
+        if plan.joins:
+            queryset = queryset.select_related(*plan.joins)
+        if plan.prefetches:
+            # The serializer's lookups replace any the caller made for the same path
+            kept = [
+                lookup for lookup in queryset._prefetch_related_lookups
+                if getattr(lookup, 'prefetch_to', lookup) not in plan.prefetches
+            ]
+            queryset = queryset.prefetch_related(None).prefetch_related(*kept, *plan.prefetch_lookups())
+        annotations = {k: v for k, v in plan.annotations.items() if k not in queryset.query.annotations}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+
+        if requested_fields(request) is not None and plan.columns is not None:
+            columns = set(plan.columns)
+            # Keep the ordering columns so cursors can be built without reloading
+            for order in queryset.query.order_by or queryset.model._meta.ordering:
+                if isinstance(order, str):
+                    columns.add(order.lstrip('-'))
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def _load_relations(self, instance):
+        """Single-instance counterpart of optimize_queryset()."""
+        if instance is None or not isinstance(instance, self.Meta.model):
+            return
+        plan = self._plan(type(instance), self.context.get('request'))
+
+        lookups = [*plan.joins, *plan.prefetch_lookups()]
+        if lookups:
+            prefetch_related_objects([instance], *lookups)
+
+        missing = {k: v for k, v in plan.annotations.items() if not hasattr(instance, k)}
+        if missing:
+            values = type(instance)._default_manager.filter(pk=instance.pk).values(**missing).first()
+            for name, value in (values or {}).items():
+                setattr(instance, name, value)
+
+    @classmethod
+    def _plan(cls, model, request, parent_field=None):
+        """The plan for the fields `request` selects (all of them without one)."""
+        key = (model, parent_field)
+        field_plans = cls._field_plans_cache.get(key)
+        if field_plans is None:
+            field_plans = cls._field_plans_cache[key] = cls._field_plans(model, parent_field)
+
+        wanted = requested_fields(request)
+        plan   = _Plan(model)
+        for name, field_plan in field_plans.items():
+            if wanted is None or name in wanted:
+                plan.update(field_plan)
+        return plan
+
+    @classmethod
+    def _field_plans(cls, model, parent_field):
+        """{field name: _Plan} of every readable field of the serializer."""
+        requires    = getattr(cls.Meta, 'field_requires', {})
+        annotations = getattr(cls.Meta, 'field_annotations', {})
+
+        field_plans = {}
+        for name, field in cls().fields.items():
+            if field.write_only:
+                continue
+            plan = field_plans[name] = _Plan(model)
+            if name in annotations:
+                plan.annotations[name] = annotations[name]
+                continue
+
+            child = getattr(field, 'child', field)
+            if isinstance(child, RelationAwareSerializer) and field.source != '*':
+                plan.add_nested(field.source, type(child))
+                continue
+
+            if name in requires:
+                paths = requires[name]
+            elif field.source == '*':
+                plan.columns = None               # reads the whole object
+                continue
+            else:
+                paths = ['__'.join(field.source_attrs)]
+            for path in paths:
+                plan.add_path(path)
+
+            if parent_field:
+                plan.joins = {j for j in plan.joins if j.split('__')[0] != parent_field}
+        return field_plans
+
+
+class _Plan:
+    """Columns, joins, prefetches and annotations a field set needs."""
+
+    def __init__(self, model):
+        self.model       = model
+        self.columns     = {model._meta.pk.name}
+        self.joins       = set()
+        self.prefetches  = {}
+        self.annotations = {}
+
+    def add_path(self, path):
+        parts, model = path.split('__'), self.model
+        for i, part in enumerate(parts):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                self.columns = None               # not a model path; keep every column
+                return
+            prefix = '__'.join(parts[:i + 1])
+            if field.is_relation and (field.one_to_many or field.many_to_many or not field.concrete):
+                self.prefetches.setdefault(prefix, prefix)
+                return
+            if field.is_relation and i < len(parts) - 1:
+                self.joins.add(prefix)
+                model = field.related_model
+                continue
+            if self.columns is not None:
+                self.columns.add(prefix)
+            return
+
+    def add_nested(self, source, child_cls):
+        relation = self.model._meta.get_field(source)
+        queryset = child_cls.optimize_queryset(
+            relation.related_model._default_manager.all(),
+            parent_field=relation.field.name if relation.one_to_many else None,
+        )
+        self.prefetches[source] = Prefetch(source, queryset=queryset)
+
+    def update(self, other):
+        """Add what `other` needs to this plan."""
+        if self.columns is not None:
+            self.columns = None if other.columns is None else self.columns | other.columns
+        self.joins |= other.joins
+        for path, lookup in other.prefetches.items():
+            # A nested serializer's Prefetch wins over a plain path
+            if isinstance(lookup, Prefetch) or path not in self.prefetches:
+                self.prefetches[path] = lookup
+        self.annotations.update(other.annotations)
+
+    def prefetch_lookups(self):
+        # Prefetching sets hints on the Prefetch's queryset; cached plans hand out copies
+        return [
+            Prefetch(lookup.prefetch_through, queryset=lookup.queryset.all())
+            if isinstance(lookup, Prefetch) else lookup
+            for lookup in self.prefetches.values()
+        ]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sparse fieldsets
+# ─────────────────────────────────────────────────────────────────────────────
+
+def requested_fields(request):
+    """Names asked for through ?fields= / ?exclude=, or None for "all fields"."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params  = getattr(request, 'query_params', request.GET)
+    fields  = {f.strip() for f in params.get('fields', '').split(',') if f.strip()}
+    exclude = {f.strip() for f in params.get('exclude', '').split(',') if f.strip()}
+    if not fields and not exclude:
+        return None
+    return _FieldSelection(fields, exclude)
+
+
+class _FieldSelection:
+    def __init__(self, fields, exclude):
+        self.fields, self.exclude = fields, exclude
+
+    def __contains__(self, name):
+        return (not self.fields or name in self.fields) and name not in self.exclude
@@ -1,13 +1,21 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum
 from .models import User, Batch, Student, Attendance, AttendanceRecord, FeePayment, Test, TestMark
+from .images import schedule_profile_pic
+from .media import media_url
+from .queries import subquery_aggregate
+from .serializer_base import RelationAwareSerializer
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Auth
 # ─────────────────────────────────────────────────────────────────────────────
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(RelationAwareSerializer):
     phone = serializers.CharField()
 
     class Meta:
@@ -82,36 +90,100 @@ class ChangePasswordSerializer(serializers.Serializer):
 # Batch
 # ─────────────────────────────────────────────────────────────────────────────
 
-class BatchSerializer(serializers.ModelSerializer):
+class BatchSerializer(RelationAwareSerializer):
     student_count = serializers.SerializerMethodField()
 
     class Meta:
         model  = Batch
         fields = ['id', 'name', 'timing', 'student_count', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        field_annotations = {
+            'student_count': subquery_aggregate(Student.objects.filter(batch=OuterRef('pk')), Count('id')),
+        }
 
     def get_student_count(self, obj):
-        return obj.students.count()
+        count = getattr(obj, 'student_count', None)
+        return obj.students.count() if count is None else count
+
+
+class BatchStatsSerializer(BatchSerializer):
+    """BatchSerializer plus the overview figures, for ?with=stats."""
+    fees_due             = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    last_attendance_date = serializers.DateField(read_only=True, allow_null=True)
+    tests_count          = serializers.IntegerField(read_only=True)
+
+    class Meta(BatchSerializer.Meta):
+        fields = BatchSerializer.Meta.fields + ['fees_due', 'last_attendance_date', 'tests_count']
+        field_annotations = {
+            **BatchSerializer.Meta.field_annotations,
+            'fees_due': subquery_aggregate(
+                Student.objects.filter(batch=OuterRef('pk')),
+                Sum(F('total_fees') - F('fees_paid')),
+                default=Decimal('0'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            'last_attendance_date': Subquery(
+                Attendance.objects.filter(batch=OuterRef('pk')).order_by('-date').values('date')[:1],
+            ),
+            'tests_count': subquery_aggregate(Test.objects.filter(batch=OuterRef('pk')), Count('id')),
+        }
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Student
 # ─────────────────────────────────────────────────────────────────────────────
 
-class StudentSerializer(serializers.ModelSerializer):
+class SignedImageField(serializers.ImageField):
+    """ImageField rendered as a signed /api/media/ link (api/media.py)."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return media_url(value.name, self.context.get('request'))
+
+
+class StudentSerializer(RelationAwareSerializer):
     batch_name  = serializers.CharField(source='batch.name', read_only=True)
     fees_due    = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     phone       = serializers.CharField()
-    profile_pic = serializers.ImageField(required=False, allow_null=True, use_url=True)
+    profile_pic = SignedImageField(required=False, allow_null=True)
+    profile_pic_thumbs = serializers.SerializerMethodField()
 
     class Meta:
         model  = Student
         fields = [
             'id', 'batch', 'batch_name', 'name', 'phone', 'roll',
             'total_fees', 'fees_paid', 'fees_due', 'profile_pic',
+            'profile_pic_status', 'profile_pic_thumbs',
             'created_at', 'updated_at',
         ]
-        read_only_fields = ['id', 'fees_due', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'fees_due', 'profile_pic_status', 'created_at', 'updated_at']
+        field_requires = {
+            'fees_due':           ['total_fees', 'fees_paid'],
+            'profile_pic_thumbs': ['profile_pic_thumbs'],
+        }
+
+    def get_profile_pic_thumbs(self, obj):
+        """{'small': {'webp': url, 'jpeg': url}, 'medium': {...}} once processed."""
+        request = self.context.get('request')
+        thumbs  = {}
+        for key, name in (obj.profile_pic_thumbs or {}).items():
+            size, ext = key.split('_', 1)
+            thumbs.setdefault(size, {})[ext] = media_url(name, request)
+        return thumbs
+
+    def create(self, validated_data):
+        student = super().create(validated_data)
+        if student.profile_pic:
+            schedule_profile_pic(student)
+        return student
+
+    def update(self, instance, validated_data):
+        new_pic = validated_data.get('profile_pic')
+        student = super().update(instance, validated_data)
+        if new_pic:
+            schedule_profile_pic(student)
+        return student
 
     def to_internal_value(self, data):
         # Remove profile_pic from data if it's not an actual file object
@@ -127,7 +199,7 @@ class StudentSerializer(serializers.ModelSerializer):
 # Attendance
 # ─────────────────────────────────────────────────────────────────────────────
 
-class AttendanceRecordSerializer(serializers.ModelSerializer):
+class AttendanceRecordSerializer(RelationAwareSerializer):
     student_name = serializers.CharField(source='student.name', read_only=True)
 
     class Meta:
@@ -144,7 +216,7 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
         return value
 
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(RelationAwareSerializer):
     records    = AttendanceRecordSerializer(many=True)
     batch_name = serializers.CharField(source='batch.name', read_only=True)
 
@@ -153,6 +225,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
         fields = ['id', 'batch', 'batch_name', 'date', 'records', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    @transaction.atomic
     def create(self, validated_data):
         records_data = validated_data.pop('records')
         attendance   = Attendance.objects.create(**validated_data)
@@ -160,6 +233,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
             AttendanceRecord.objects.create(attendance=attendance, **rec)
         return attendance
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         records_data = validated_data.pop('records', None)
 
@@ -180,7 +254,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
 # Fee
 # ─────────────────────────────────────────────────────────────────────────────
 
-class FeePaymentSerializer(serializers.ModelSerializer):
+class FeePaymentSerializer(RelationAwareSerializer):
     student_name = serializers.CharField(source='student.name', read_only=True)
 
     class Meta:
@@ -193,16 +267,17 @@ class FeePaymentSerializer(serializers.ModelSerializer):
 # Test / Marks
 # ─────────────────────────────────────────────────────────────────────────────
 
-class TestMarkSerializer(serializers.ModelSerializer):
+class TestMarkSerializer(RelationAwareSerializer):
     student_name = serializers.CharField(source='student.name', read_only=True)
     percentage   = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
 
     class Meta:
         model  = TestMark
         fields = ['id', 'student', 'student_name', 'marks_obtained', 'percentage']
+        field_requires = {'percentage': ['marks_obtained', 'test__total_marks']}
 
 
-class TestSerializer(serializers.ModelSerializer):
+class TestSerializer(RelationAwareSerializer):
     batch_name     = serializers.CharField(source='batch.name', read_only=True)
     marks          = TestMarkSerializer(many=True, read_only=True)
     average_marks  = serializers.SerializerMethodField()
@@ -214,6 +289,7 @@ class TestSerializer(serializers.ModelSerializer):
             'duration', 'board', 'marks', 'average_marks', 'created_at', 'updated_at',
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        field_requires = {'average_marks': ['marks']}
 
     def get_average_marks(self, obj):
         marks = obj.marks.all()
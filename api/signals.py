@@ -0,0 +1,237 @@
+from functools import lru_cache
+
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    User, Batch, Student, Attendance, AttendanceRecord, FeePayment, Test, TestMark, SyncTombstone,
+)
+from .cache import bump_tenant_version
+from .rollups import mark_rollups_dirty
+from .sync import ENTITY_NAMES, touch_sync_parents
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Tenant lookup
+# Attendance sessions and tests never change owner, so their tenant can be
+# memoised instead of being fetched once per record/mark.
+# ─────────────────────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=4096)
+def _attendance_tenant(attendance_id):
+    return Attendance.objects.filter(pk=attendance_id).values_list('user_id', flat=True).first()
+
+
+@lru_cache(maxsize=4096)
+def _test_tenant(test_id):
+    return Test.objects.filter(pk=test_id).values_list('user_id', flat=True).first()
+
+
+# Deletes cascading to records/marks schedule their sessions' and tests' days
+# up front (see "Cascaded deletes" below); those rows then skip their own
+# per-row lookups. The origin's own signals bump the tenant version.
+def _parent_scheduled(instance, origin):
+    parents = getattr(origin, '_deleted_row_parents', None)
+    if not parents:
+        return False
+    if isinstance(instance, AttendanceRecord):
+        return (Attendance, instance.attendance_id) in parents
+    if isinstance(instance, TestMark):
+        return (Test, instance.test_id) in parents
+    return False
+
+
+def tenant_id(instance):
+    """Return the owning user id of any tenant-scoped model instance."""
+    if isinstance(instance, AttendanceRecord):
+        if AttendanceRecord.attendance.is_cached(instance):
+            return instance.attendance.user_id
+        return _attendance_tenant(instance.attendance_id)
+    if isinstance(instance, TestMark):
+        if TestMark.test.is_cached(instance):
+            return instance.test.user_id
+        return _test_tenant(instance.test_id)
+    return instance.user_id
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Tenant data version
+# ─────────────────────────────────────────────────────────────────────────────
+
+TENANT_MODELS = (Batch, Student, Attendance, AttendanceRecord, FeePayment, Test, TestMark)
+
+
+def bump_version_on_write(sender, instance, origin=None, **kwargs):
+    if not _parent_scheduled(instance, origin):
+        bump_tenant_version(tenant_id(instance))
+
+
+for model in TENANT_MODELS:
+    post_save.connect(
+        bump_version_on_write, sender=model, dispatch_uid=f'tenant-version-save-{model.__name__}'
+    )
+    post_delete.connect(
+        bump_version_on_write, sender=model, dispatch_uid=f'tenant-version-delete-{model.__name__}'
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Delta sync (api/sync.py)
+# Deletes leave a tombstone; record and mark writes move their parent's
+# updated_at, since they are synced inside it.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _deleting_user(origin):
+    return isinstance(origin, User) or (isinstance(origin, QuerySet) and origin.model is User)
+
+
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    # A deleted account takes its tombstones with it; nobody syncs it again
+    if not _deleting_user(origin):
+        SyncTombstone.objects.create(
+            user_id=instance.user_id, entity=ENTITY_NAMES[sender], object_id=instance.pk,
+        )
+
+
+for model in ENTITY_NAMES:
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'sync-tombstone-{model.__name__}')
+
+
+@receiver(pre_delete, sender=Batch)
+def touch_students_of_deleted_batch(sender, instance, origin=None, **kwargs):
+    # Their batch is about to be set to NULL by a plain UPDATE
+    if not _deleting_user(origin):
+        Student.objects.filter(batch=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=AttendanceRecord)
+def touch_session_of_record(sender, instance, **kwargs):
+    touch_sync_parents(Attendance, instance.attendance_id)
+
+
+@receiver(post_save, sender=TestMark)
+def touch_test_of_mark(sender, instance, **kwargs):
+    touch_sync_parents(Test, instance.test_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Daily rollups
+# The day a fact counts towards is its session / payment / test date. When
+# that date is edited, both the old and the new day are recomputed.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _stash_old_date(model, instance, field):
+    if not instance._state.adding and instance.pk:
+        instance._rollup_old_date = (
+            model.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        )
+
+
+def _payment_day(value):
+    if value is None:
+        return None
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+@receiver(pre_save, sender=Attendance)
+def stash_attendance_date(sender, instance, **kwargs):
+    _stash_old_date(Attendance, instance, 'date')
+
+
+@receiver(pre_save, sender=Test)
+def stash_test_date(sender, instance, **kwargs):
+    _stash_old_date(Test, instance, 'date')
+
+
+@receiver(pre_save, sender=FeePayment)
+def stash_payment_date(sender, instance, **kwargs):
+    _stash_old_date(FeePayment, instance, 'payment_date')
+
+
+@receiver([post_save, post_delete], sender=Attendance)
+@receiver([post_save, post_delete], sender=Test)
+def rollups_for_dated_session(sender, instance, **kwargs):
+    mark_rollups_dirty(instance.user_id, instance.date, getattr(instance, '_rollup_old_date', None))
+
+
+@receiver([post_save, post_delete], sender=FeePayment)
+def rollups_for_payment(sender, instance, **kwargs):
+    mark_rollups_dirty(
+        instance.user_id,
+        _payment_day(instance.payment_date),
+        _payment_day(getattr(instance, '_rollup_old_date', None)),
+    )
+
+
+@receiver([post_save, post_delete], sender=AttendanceRecord)
+def rollups_for_attendance_record(sender, instance, origin=None, **kwargs):
+    if _parent_scheduled(instance, origin):
+        return
+    if AttendanceRecord.attendance.is_cached(instance):
+        owner, day = instance.attendance.user_id, instance.attendance.date
+    else:
+        owner, day = Attendance.objects.filter(pk=instance.attendance_id).values_list(
+            'user_id', 'date'
+        ).first() or (None, None)
+    mark_rollups_dirty(owner, day)
+
+
+@receiver([post_save, post_delete], sender=TestMark)
+def rollups_for_test_mark(sender, instance, origin=None, **kwargs):
+    if _parent_scheduled(instance, origin):
+        return
+    if TestMark.test.is_cached(instance):
+        owner, day = instance.test.user_id, instance.test.date
+    else:
+        owner, day = Test.objects.filter(pk=instance.test_id).values_list(
+            'user_id', 'date'
+        ).first() or (None, None)
+    mark_rollups_dirty(owner, day)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cascaded deletes
+# The collector sends every pre_delete before deleting anything, and the
+# records and marks it collects do not carry their session / test. Their
+# (owner, day) pairs are read here, once per deleted student, session or test
+# (a batch cascades to its sessions and tests), and stashed on the delete's
+# origin for the per-row receivers above.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _schedule_parents(origin, model, rows):
+    if origin is None or _deleting_user(origin):
+        return
+    parents = origin.__dict__.setdefault('_deleted_row_parents', {})
+    days = {}
+    for pk, owner, day in rows:
+        parents[(model, pk)] = (owner, day)
+        days.setdefault(owner, set()).add(day)
+    for owner, owner_days in days.items():
+        mark_rollups_dirty(owner, *owner_days)
+
+
+@receiver(pre_delete, sender=Student)
+def schedule_parents_of_deleted_student(sender, instance, origin=None, **kwargs):
+    if origin is None or _deleting_user(origin):
+        return
+    sessions = list(
+        AttendanceRecord.objects.filter(student=instance)
+        .values_list('attendance_id', 'attendance__user_id', 'attendance__date').distinct()
+    )
+    tests = list(
+        TestMark.objects.filter(student=instance)
+        .values_list('test_id', 'test__user_id', 'test__date').distinct()
+    )
+    _schedule_parents(origin, Attendance, sessions)
+    _schedule_parents(origin, Test, tests)
+    # The sessions and tests stay, one row shorter (synced inside them)
+    touch_sync_parents(Attendance, *(pk for pk, _, _ in sessions))
+    touch_sync_parents(Test, *(pk for pk, _, _ in tests))
+
+
+@receiver(pre_delete, sender=Attendance)
+@receiver(pre_delete, sender=Test)
+def schedule_deleted_session(sender, instance, origin=None, **kwargs):
+    _schedule_parents(origin, sender, [(instance.pk, instance.user_id, instance.date)])
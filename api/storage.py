@@ -0,0 +1,75 @@
+"""
+Content-addressed media storage.
+
+Files are saved under the SHA-256 of their bytes instead of the uploaded
+name, so identical uploads share one file:
+
+    student_profiles/IMG_0001.jpg  →  student_profiles/3f/3fa9…c1.jpg
+
+A name therefore never changes meaning, which makes hashed paths safe to
+cache forever. Because files are shared, nothing deletes them when a row
+goes away or a picture is replaced; `python manage.py sweep_media` removes
+the ones no longer referenced.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK = 64 * 1024
+
+# <dir>/<2 hex>/<64 hex>.<ext>
+HASHED_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}\.[A-Za-z0-9]+$')
+
+
+def content_hash(content):
+    """SHA-256 hex digest of a File, read in chunks; leaves it rewound."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in iter(lambda: content.read(HASH_CHUNK), b''):
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME.search(name))
+
+
+class ContentHashStorage(FileSystemStorage):
+    """FileSystemStorage that names files by content and skips duplicate writes."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = content_hash(content)
+        ext    = os.path.splitext(name)[1].lower()
+        hashed = '/'.join(filter(None, [os.path.dirname(name), digest[:2], f'{digest}{ext}']))
+        if self._reuse(hashed):
+            return hashed
+        return super().save(hashed, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # A concurrent save of the same bytes wrote the same file; reuse it
+        return name
+
+    def _save(self, name, content):
+        if self._reuse(name):
+            return name
+        return super()._save(name, content)
+
+    def _reuse(self, name):
+        """
+        Keep an existing copy of `name`, touching it: a file orphaned long ago
+        is old enough for sweep_media, which must see it as a fresh upload.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
@@ -0,0 +1,389 @@
+"""
+Delta sync for offline clients.
+
+    GET  /api/sync/                      everything (first sync), a page at a time
+    GET  /api/sync/?cursor=<cursor>      changes since the cursor
+    POST /api/sync/                      {"cursor": ..., "operations": [...]}
+                                         apply writes queued offline, then pull
+
+Each entity is read in (updated_at, id) order from its (user, updated_at, id)
+index and deletes are read the same way from SyncTombstone, so a sync reads
+only what changed since the cursor. Attendance records and test marks travel
+inside their session / test: writing one touches the parent's updated_at,
+and the parent is always sent with all of its children, so a client replaces
+the children it holds. Deleting a batch, student, session or test removes
+its children on the client the same way it does on the server.
+
+The cursor holds one position per stream. Once a stream is exhausted, its
+position is pulled back to SYNC_CURSOR_LAG seconds before the request, so
+rows stamped by a transaction that committed late are still picked up; the
+overlap is harmless because clients upsert by id.
+"""
+import base64
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import APIException, NotFound
+
+from .models import Attendance, Batch, FeePayment, Student, SyncTombstone, Test, TestMark
+from .serializers import (
+    AttendanceSerializer, BatchSerializer, FeePaymentSerializer, StudentSerializer, TestSerializer,
+)
+
+# Synced entities, in the order a client should apply them
+ENTITIES = {
+    'batches':      (Batch,      BatchSerializer),
+    'students':     (Student,    StudentSerializer),
+    'attendance':   (Attendance, AttendanceSerializer),
+    'fee_payments': (FeePayment, FeePaymentSerializer),
+    'tests':        (Test,       TestSerializer),
+}
+ENTITY_NAMES = {model: name for name, (model, _) in ENTITIES.items()}
+
+TOMBSTONES = 'deleted'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CursorExpired(APIException):
+    status_code    = 410
+    default_detail = 'Sync cursor expired; sync again without a cursor.'
+    default_code   = 'cursor_expired'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pull
+# ─────────────────────────────────────────────────────────────────────────────
+
+def pull(request, cursor=None):
+    """Changes of the request's tenant since `cursor`, one page per stream."""
+    positions = _decode_cursor(cursor) if cursor else {}
+    now       = timezone.now()
+    floor     = now - timedelta(seconds=_setting('SYNC_CURSOR_LAG', 60))
+    limit     = _setting('SYNC_PAGE_SIZE', 500)
+
+    deleted_pos = positions.get(TOMBSTONES)
+    if deleted_pos and deleted_pos[0] < now - timedelta(days=_setting('SYNC_TOMBSTONE_DAYS', 90)):
+        # Tombstones this old have been pruned; deletes may have been missed
+        raise CursorExpired()
+
+    changes, next_positions, has_more = {}, {}, False
+    for name, (model, serializer_class) in ENTITIES.items():
+        queryset = model.objects.filter(user=request.user)
+        if positions.get(name):
+            queryset = queryset.filter(_after('updated_at', positions[name]))
+        queryset = serializer_class.optimize_queryset(queryset.order_by('updated_at', 'id'), request)
+
+        rows, more = _page(queryset, limit)
+        changes[name]        = serializer_class(rows, many=True, context={'request': request}).data
+        next_positions[name] = _advance(positions.get(name), rows, more, floor, 'updated_at')
+        has_more |= more
+
+    tombstones = SyncTombstone.objects.filter(user=request.user)
+    if deleted_pos:
+        tombstones = tombstones.filter(_after('deleted_at', deleted_pos))
+    rows, more = _page(tombstones.order_by('deleted_at', 'id'), limit)
+    deleted = {name: [] for name in ENTITIES}
+    for row in rows:
+        deleted[row.entity].append(str(row.object_id))
+    next_positions[TOMBSTONES] = _advance(deleted_pos, rows, more, floor, 'deleted_at')
+    has_more |= more
+
+    return {
+        'cursor':   _encode_cursor(next_positions),
+        'has_more': has_more,
+        'changes':  changes,
+        'deleted':  deleted,
+    }
+
+
+def _page(queryset, limit):
+    rows = list(queryset[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def _after(field, position):
+    """Rows after `position` in (field, id) order; an id of None means "from `field` on"."""
+    at, pk = position
+    if pk is None:
+        return Q(**{f'{field}__gte': at})
+    # The redundant bound keeps this an index range scan (see api/pagination.py)
+    return Q(**{f'{field}__gte': at}) & (Q(**{f'{field}__gt': at}) | Q(**{field: at, 'id__gt': pk}))
+
+
+def _advance(position, rows, more, floor, field):
+    if rows:
+        position = (getattr(rows[-1], field), rows[-1].id)
+    if more:
+        return position
+    # Exhausted: step back to the lag floor so late commits are not skipped
+    if position is None or position[0] > floor:
+        return (floor, None)
+    return position
+
+
+def _encode_cursor(positions):
+    values = {
+        name: [at.isoformat(), None if pk is None else str(pk)]
+        for name, (at, pk) in positions.items()
+    }
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        positions = {}
+        for name, (at, pk) in values.items():
+            if name not in ENTITIES and name != TOMBSTONES:
+                raise ValueError(name)
+            moment = parse_datetime(at)
+            if moment is None:
+                raise ValueError(at)
+            # Tombstone ids are integers, entity ids UUIDs
+            positions[name] = (moment, None if pk is None else (int(pk) if name == TOMBSTONES else UUID(pk)))
+        return positions
+    except (ValueError, TypeError, AttributeError):
+        raise NotFound('Invalid cursor')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Push
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Rejected(Exception):
+
+    def __init__(self, errors, status='error', current=None):
+        super().__init__(errors)
+        self.errors  = errors
+        self.status  = status
+        self.current = current
+
+
+def push(request, operations):
+    """
+    Apply queued writes in order, each all-or-nothing, in one transaction.
+
+        {"entity": "students", "op": "upsert", "id": "<uuid>", "data": {...},
+         "base_updated_at": "<updated_at the client last saw>"}      optional
+        {"entity": "students", "op": "delete", "id": "<uuid>"}
+        {"entity": "test_marks", "op": "upsert",
+         "data": {"test": "<uuid>", "student": "<uuid>", "marks_obtained": 85}}
+
+    Ids are generated by the client, so a retried push creates nothing twice
+    (a payment with a known id is skipped). Returns
+    one result per operation: "ok", "error" (with errors) or "conflict"
+    (the row changed after base_updated_at; with the current row).
+    """
+    results = []
+    with transaction.atomic():
+        for index, operation in enumerate(operations):
+            result = {'index': index, 'entity': None, 'id': None}
+            try:
+                if not isinstance(operation, dict):
+                    raise Rejected('Each operation must be an object')
+                result['entity'] = operation.get('entity')
+                result['id']     = operation.get('id')
+                with transaction.atomic():
+                    result['id'] = _apply(request, operation)
+                result['status'] = 'ok'
+            except Rejected as rejected:
+                result['status'] = rejected.status
+                result['errors'] = rejected.errors
+                if rejected.current is not None:
+                    result['current'] = rejected.current
+            except IntegrityError as error:
+                result['status'] = 'error'
+                result['errors'] = str(error)
+            results.append(result)
+    return results
+
+
+def _apply(request, operation):
+    entity, op = operation.get('entity'), operation.get('op')
+    if entity == 'test_marks':
+        return _apply_mark(request, op, operation.get('data') or {})
+    if entity not in ENTITIES:
+        raise Rejected(f'Unknown entity "{entity}"')
+    if op not in ('upsert', 'delete'):
+        raise Rejected(f'Unknown op "{op}"')
+
+    model, serializer_class = ENTITIES[entity]
+    pk       = _uuid(operation.get('id'))
+    instance = model.objects.filter(user=request.user, pk=pk).first()
+    if instance is None and model.objects.filter(pk=pk).exists():
+        raise Rejected('Unknown id')
+
+    if op == 'delete':
+        if instance is not None:
+            _delete(instance)
+        return str(pk)
+
+    if entity == 'fee_payments':
+        # Payments are immutable; a known id is a retried push
+        if instance is None:
+            _record_payment(request, pk, operation.get('data') or {})
+        return str(pk)
+
+    if instance is None and entity == 'attendance':
+        # One session per batch and day: another device may have taken it
+        instance = _existing_session(request, operation.get('data') or {})
+
+    if instance is not None:
+        _check_base(instance, operation.get('base_updated_at'), serializer_class, request)
+
+    serializer = serializer_class(
+        instance, data=operation.get('data') or {}, partial=instance is not None,
+        context={'request': request},
+    )
+    if not serializer.is_valid():
+        raise Rejected(serializer.errors)
+    _check_owned(request.user, serializer.validated_data)
+
+    extra = {} if instance is not None else {'id': pk, 'user': request.user}
+    return str(serializer.save(**extra).pk)
+
+
+def _delete(instance):
+    if isinstance(instance, FeePayment):
+        # Reverse the payment like DELETE /api/fees/<id>/
+        Student.objects.filter(pk=instance.student_id).update(
+            fees_paid=F('fees_paid') - instance.amount, updated_at=timezone.now(),
+        )
+    instance.delete()
+
+
+def _record_payment(request, pk, data):
+    serializer = FeePaymentSerializer(data=data, context={'request': request})
+    if not serializer.is_valid():
+        raise Rejected(serializer.errors)
+    _check_owned(request.user, serializer.validated_data)
+
+    student = serializer.validated_data['student']
+    student.fees_paid = F('fees_paid') + serializer.validated_data['amount']
+    student.save()
+    serializer.save(id=pk, user=request.user)
+
+
+def _existing_session(request, data):
+    batch, day = data.get('batch'), data.get('date')
+    if not batch or not day:
+        return None
+    try:
+        return Attendance.objects.filter(user=request.user, batch_id=batch, date=day).first()
+    except (ValidationError, ValueError):
+        # Malformed values; the serializer reports them
+        return None
+
+
+def _apply_mark(request, op, data):
+    if op not in ('upsert', 'delete'):
+        raise Rejected(f'Unknown op "{op}"')
+    test = Test.objects.filter(user=request.user, pk=_uuid(data.get('test'))).first()
+    if test is None:
+        raise Rejected({'test': 'Unknown test'})
+    student_id = _uuid(data.get('student'))
+    if not Student.objects.filter(user=request.user, pk=student_id).exists():
+        raise Rejected({'student': 'Unknown student'})
+
+    if op == 'delete':
+        TestMark.objects.filter(test=test, student_id=student_id).delete()
+        touch_sync_parents(Test, test.pk)
+        return None
+
+    try:
+        value = Decimal(str(data.get('marks_obtained')))
+    except InvalidOperation:
+        raise Rejected({'marks_obtained': 'A number is required'})
+    if not 0 <= value <= test.total_marks:
+        raise Rejected({'marks_obtained': f'Must be between 0 and {test.total_marks}'})
+
+    mark, _ = TestMark.objects.update_or_create(
+        test=test, student_id=student_id, defaults={'marks_obtained': value},
+    )
+    return str(mark.pk)
+
+
+def _uuid(value):
+    try:
+        return UUID(str(value))
+    except (TypeError, ValueError):
+        raise Rejected({'id': 'A valid UUID is required'})
+
+
+def _check_base(instance, base, serializer_class, request):
+    """Reject the write if the row changed after the version the client edited."""
+    if not base:
+        return
+    seen = parse_datetime(str(base)) if not isinstance(base, datetime) else base
+    if seen is None:
+        raise Rejected({'base_updated_at': 'Invalid datetime'})
+    if timezone.is_naive(seen):
+        # Rendered in the current time zone by DATETIME_FORMAT
+        seen = timezone.make_aware(seen)
+    # Responses carry whole seconds
+    if instance.updated_at.replace(microsecond=0) > seen:
+        raise Rejected(
+            'Changed on the server', status='conflict',
+            current=serializer_class(instance, context={'request': request}).data,
+        )
+
+
+def _check_owned(user, validated_data):
+    """Related rows named in a write (batch, student, records' students) must be the tenant's."""
+    values = list(validated_data.values())
+    for value in validated_data.get('records') or []:
+        values.extend(value.values())
+    for value in values:
+        owner = getattr(value, 'user_id', None)
+        if owner is not None and owner != user.id:
+            raise Rejected('Unknown related object')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parent touches
+# Records and marks are synced inside their session / test, so writing one
+# must move the parent's updated_at. Once per parent and transaction, when it
+# commits.
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Parents waiting for the current transaction to commit, {model: {pk}}; kept
+# on the connection, which is per thread like the transaction itself
+_PENDING = 'api_sync_touch_pending'
+
+
+def touch_sync_parents(model, *pks):
+    pks = {pk for pk in pks if pk is not None}
+    if not pks:
+        return
+
+    pending = getattr(connection, _PENDING, None)
+    if pending is None:
+        pending = defaultdict(set)
+        setattr(connection, _PENDING, pending)
+    pending[model] |= pks
+
+    # As for rollups (api/rollups.py): every call registers the touch and the
+    # first to run takes the whole set, so none is lost to a rolled-back
+    # savepoint. Parents left by a rolled-back transaction are touched with
+    # the next one, which only makes clients re-read them.
+    transaction.on_commit(_touch_pending)
+
+
+def _touch_pending():
+    pending = getattr(connection, _PENDING, None)
+    setattr(connection, _PENDING, None)
+    now = timezone.now()
+    for model, pks in (pending or {}).items():
+        model.objects.filter(pk__in=pks).update(updated_at=now)
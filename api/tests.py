@@ -1,3 +1,1924 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import os
+import csv
+import json
+import shutil
+import tempfile
+import uuid
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import images, promotions
+from .json_sql import RawJSON, render_json, supports_sql_json
+from .queries import mark_percentage
+from .serializer_base import LazyRelationAccess
+from .serializers import FeePaymentSerializer, StudentSerializer, TestSerializer
+from .models import (
+    User, Batch, Student, Attendance, AttendanceRecord, FeePayment, Test, TestMark,
+    TenantDailyRollup, BatchDailyRollup, Promotion, FeeSnapshot,
+)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    SERIALIZER_STRICT_RELATIONS=True,
+)
+class TenantTestCase(TestCase):
+    """Creates one tenant with a couple of batches and students."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone='+919812345678', password='secret-pass', name='Owner', institute_name='Academy',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.batch_a = Batch.objects.create(user=self.user, name='Class 10', timing='4 PM')
+        self.batch_b = Batch.objects.create(user=self.user, name='Class 12', timing='6 PM')
+        self.students = [
+            Student.objects.create(
+                user=self.user, batch=batch, name=f'Student {i}', phone=f'+91981234{i:04d}',
+                roll=str(i), total_fees=Decimal('1000'), fees_paid=Decimal(i * 250 % 1250),
+            )
+            for i, batch in enumerate([self.batch_a] * 3 + [self.batch_b] * 3, start=1)
+        ]
+
+
+class DashboardOverviewTests(TenantTestCase):
+
+    def test_overview_totals(self):
+        today = timezone.now().date()
+        session = Attendance.objects.create(user=self.user, batch=self.batch_a, date=today)
+        for student, state in zip(self.students[:3], ['present', 'present', 'absent']):
+            AttendanceRecord.objects.create(attendance=session, student=student, status=state)
+        Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 1', date=date(2024, 1, 1),
+            total_marks=100, duration=1,
+        )
+        FeePayment.objects.create(user=self.user, student=self.students[0], amount=Decimal('250'))
+
+        response = self.client.get(reverse('dashboard-overview'))
+
+        self.assertEqual(response.status_code, 200)
+        overview = response.data['overview']
+        self.assertEqual(overview['total_students'], 6)
+        self.assertEqual(overview['total_batches'], 2)
+        self.assertEqual(overview['total_tests'], 1)
+        self.assertEqual(overview['total_expected_fees'], 6000.0)
+        self.assertEqual(overview['total_collected_fees'], 2750.0)
+        self.assertEqual(overview['pending_fees'], 3250.0)
+        self.assertEqual(overview['present_today'], 2)
+        self.assertEqual(len(response.data['defaulters']), 5)
+        self.assertEqual(response.data['recent_activities'][0]['student_name'], 'Student 1')
+
+    def test_overview_query_budget(self):
+        for student in self.students:
+            FeePayment.objects.create(user=self.user, student=student, amount=Decimal('10'))
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard-overview'))
+        self.assertEqual(len(response.data['recent_activities']), 6)
+
+    def test_overview_empty_tenant(self):
+        other = User.objects.create_user(
+            phone='+919800000000', password='secret-pass', name='New', institute_name='New',
+        )
+        self.client.force_authenticate(other)
+
+        response = self.client.get(reverse('dashboard-overview'))
+
+        self.assertEqual(response.data['overview']['total_students'], 0)
+        self.assertEqual(response.data['overview']['total_expected_fees'], 0.0)
+        self.assertEqual(response.data['overview']['fee_collection_percentage'], 0)
+
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class MarksBulkCreateTests(TransactionTestCase):
+    """Run in autocommit, as in production, so on_commit work really fires per transaction."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone='+919812345679', password='secret-pass', name='Owner', institute_name='Academy',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        batch = Batch.objects.create(user=self.user, name='Class 10', timing='4 PM')
+        self.students = [
+            Student.objects.create(user=self.user, batch=batch, name=f'Student {i}',
+                                   phone=f'+91981235{i:04d}', roll=str(i))
+            for i in range(1, 9)
+        ]
+        self.test = Test.objects.create(
+            user=self.user, batch=batch, name='Unit 1', date=timezone.localdate(), total_marks=100, duration=1,
+        )
+
+    def post_marks(self, students):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('test-marks-bulk-create', args=[self.test.id]), {
+                'marks': [{'student': str(s.id), 'marks_obtained': 50 + i} for i, s in enumerate(students)]
+                + [{'student': str(uuid.uuid4()), 'marks_obtained': 10}],
+            }, format='json')
+        rebuilds = [q for q in ctx.captured_queries if q['sql'].startswith('DELETE FROM "tenant_daily_rollups"')]
+        return response, len(rebuilds)
+
+    def test_the_day_is_rebuilt_once_per_request(self):
+        response, rebuilds = self.post_marks(self.students)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['marks']), 8)
+        self.assertEqual(rebuilds, 1)
+        rollup = TenantDailyRollup.objects.get(user=self.user, date=self.test.date)
+        self.assertEqual(rollup.mark_count, 8)
+
+        self.assertEqual(self.post_marks(self.students[:2])[1], 1)
+
+class DashboardAnalyticsTests(TenantTestCase):
+
+    def test_batch_statistics_in_one_query(self):
+        today = timezone.now().date()
+        with self.captureOnCommitCallbacks(execute=True):
+            session = Attendance.objects.create(user=self.user, batch=self.batch_a, date=today)
+            for student, state in zip(self.students[:3], ['present', 'present', 'absent']):
+                AttendanceRecord.objects.create(attendance=session, student=student, status=state)
+            test = Test.objects.create(
+                user=self.user, batch=self.batch_a, name='Unit 1', date=today, total_marks=50, duration=1,
+            )
+            for student, marks in zip(self.students[:2], [40, 30]):
+                TestMark.objects.create(test=test, student=student, marks_obtained=marks)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard-analytics'), {'period': 'week'})
+
+        analytics = response.data['analytics']
+        self.assertEqual(analytics['attendance']['attendance_percentage'], 66.67)
+        self.assertEqual(analytics['test_performance'], {'total_tests': 1, 'average_percentage': 70.0})
+
+        stats = {b['batch_name']: b for b in analytics['batch_statistics']}
+        self.assertEqual(stats['Class 10']['student_count'], 3)
+        self.assertEqual(stats['Class 10']['collected_fees'], 1500.0)
+        self.assertEqual(stats['Class 10']['attendance_percentage'], 66.67)
+        self.assertEqual(stats['Class 10']['average_test_percentage'], 70.0)
+        self.assertEqual(stats['Class 12']['attendance_percentage'], 0)
+        self.assertEqual(stats['Class 12']['average_test_percentage'], 0)
+
+    def test_custom_range_compares_with_previous_period(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for day, amount in [(date(2024, 3, 5), '300'), (date(2024, 3, 1), '200'),
+                                (date(2024, 2, 27), '400')]:
+                FeePayment.objects.create(
+                    user=self.user, student=self.students[0], amount=Decimal(amount),
+                    payment_date=timezone.make_aware(datetime.combine(day, time(12))),
+                )
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('dashboard-analytics'), {'start': '2024-03-01', 'end': '2024-03-07'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['period'], 'custom')
+        self.assertEqual(response.data['previous_range'], {
+            'start': date(2024, 2, 23), 'end': date(2024, 2, 29),
+        })
+        self.assertEqual(response.data['comparison']['total_collected'], {
+            'current': 500.0, 'previous': 400.0, 'change': 100.0, 'change_percentage': 25.0,
+        })
+        series = response.data['daily_series']
+        self.assertEqual(len(series), 7)
+        self.assertEqual([point['collected'] for point in series], [200.0, 0, 0, 0, 300.0, 0, 0])
+
+    def test_test_without_total_marks_scores_zero(self):
+        today = timezone.now().date()
+        with self.captureOnCommitCallbacks(execute=True):
+            test = Test.objects.create(
+                user=self.user, batch=self.batch_a, name='Oral', date=today, total_marks=0, duration=1,
+            )
+            TestMark.objects.create(test=test, student=self.students[0], marks_obtained=0)
+
+        # PostgreSQL raises on the division, SQLite yields NULL
+        pct = TestMark.objects.annotate(pct=mark_percentage()).values_list('pct', flat=True)
+        self.assertEqual(list(pct), [0.0])
+
+        rollup = TenantDailyRollup.objects.get(user=self.user, date=today)
+        self.assertEqual((rollup.mark_count, rollup.percentage_sum), (1, 0.0))
+
+        response = self.client.get(reverse('dashboard-analytics'), {'period': 'week'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['analytics']['test_performance'],
+                         {'total_tests': 1, 'average_percentage': 0.0})
+
+    def test_invalid_range_is_rejected(self):
+        for params in ({'start': '2024-03-07', 'end': '2024-03-01'}, {'start': 'March'},
+                       {'start': '2020-01-01', 'end': '2024-01-01'}):
+            response = self.client.get(reverse('dashboard-analytics'), params)
+            self.assertEqual(response.status_code, 400)
+
+
+class DailyRollupTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session = Attendance.objects.create(
+                user=self.user, batch=self.batch_a, date=self.today,
+            )
+            self.records = [
+                AttendanceRecord.objects.create(attendance=self.session, student=student, status=state)
+                for student, state in zip(self.students[:3], ['present', 'present', 'absent'])
+            ]
+            FeePayment.objects.create(user=self.user, student=self.students[0], amount=Decimal('250'))
+
+    def rollup(self, day=None):
+        return TenantDailyRollup.objects.get(user=self.user, date=day or self.today)
+
+    def test_writes_update_the_day(self):
+        rollup = self.rollup()
+        self.assertEqual((rollup.present, rollup.absent), (2, 1))
+        self.assertEqual((rollup.amount_collected, rollup.payment_count), (Decimal('250'), 1))
+        batch_rollup = BatchDailyRollup.objects.get(batch=self.batch_a, date=self.today)
+        self.assertEqual(batch_rollup.present, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.records[2].status = 'present'
+            self.records[2].save()
+            self.records[0].delete()
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.present, rollup.absent), (2, 0))
+
+    def test_moving_a_session_recomputes_both_days(self):
+        yesterday = self.today - timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.date = yesterday
+            self.session.save()
+
+        self.assertEqual(self.rollup().present, 0)
+        self.assertEqual(self.rollup(yesterday).present, 2)
+
+    def test_rolled_back_savepoint_does_not_drop_later_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    FeePayment.objects.create(user=self.user, student=self.students[1], amount=Decimal('100'))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            FeePayment.objects.create(user=self.user, student=self.students[2], amount=Decimal('400'))
+
+        # The first payment's flush went with its savepoint; the second's covers the day
+        self.assertEqual(self.rollup().amount_collected, Decimal('650'))
+
+    def test_deleting_a_student_reads_each_parent_once(self):
+        student = self.students[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(1, 21):
+                day = self.today - timedelta(days=i)
+                session = Attendance.objects.create(user=self.user, batch=self.batch_a, date=day)
+                AttendanceRecord.objects.create(attendance=session, student=student, status='present')
+                test = Test.objects.create(
+                    user=self.user, batch=self.batch_a, name=f'Unit {i}', date=day, total_marks=50, duration=1,
+                )
+                TestMark.objects.create(test=test, student=student, marks_obtained=40)
+        self.assertEqual(self.rollup(self.today - timedelta(days=5)).mark_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(13):        # whatever the number of records and marks
+                response = self.client.delete(reverse('student-detail', args=[student.id]))
+        self.assertEqual(response.status_code, 200)
+
+        # Every day the student counted towards was rebuilt
+        self.assertEqual(self.rollup().present, 1)
+        self.assertFalse(TenantDailyRollup.objects.filter(user=self.user, date__lt=self.today).exists())
+
+    def test_batch_delete_queries_do_not_grow_with_sessions(self):
+        def delete_batch(sessions):
+            batch = Batch.objects.create(user=self.user, name=f'Batch {sessions}', timing='9 AM')
+            for i in range(sessions):
+                day = self.today - timedelta(days=i)
+                session = Attendance.objects.create(user=self.user, batch=batch, date=day)
+                test = Test.objects.create(user=self.user, batch=batch, name='Quiz', date=day, total_marks=10, duration=1)
+                for student in self.students[:3]:
+                    AttendanceRecord.objects.create(attendance=session, student=student, status='present')
+                    TestMark.objects.create(test=test, student=student, marks_obtained=5)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.delete(reverse('batch-detail', args=[batch.id]))
+            return [q['sql'] for q in queries.captured_queries]
+
+        few, many = delete_batch(1), delete_batch(10)
+        # Only the tombstones of the sessions and tests themselves grow
+        lookups = lambda sql: [q for q in sql if not q.startswith('INSERT INTO "sync_tombstones"')]
+        self.assertEqual(len(lookups(few)), len(lookups(many)))
+
+    def test_rebuild_command_backfills(self):
+        TenantDailyRollup.objects.all().delete()
+        BatchDailyRollup.objects.all().delete()
+
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(self.rollup().present, 2)
+        self.assertEqual(self.rollup().payment_count, 1)
+
+
+class TenantResponseCacheTests(TenantTestCase):
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.client.get(reverse('dashboard-overview'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('dashboard-overview'))
+        self.assertEqual(response.data['overview']['total_students'], 6)
+
+        # The counters span every tenant: staff only
+        self.assertEqual(self.client.get(reverse('dashboard-cache-stats')).status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.user.refresh_from_db()
+        stats = self.client.get(reverse('dashboard-cache-stats')).data['endpoints']
+        self.assertEqual(stats['dashboard-overview']['hits'], 1)
+        self.assertEqual(stats['dashboard-overview']['misses'], 1)
+
+    def test_write_invalidates_cached_responses(self):
+        self.client.get(reverse('dashboard-overview'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(
+                user=self.user, batch=self.batch_a, name='New', phone='+919812300000', roll='99',
+            )
+
+        response = self.client.get(reverse('dashboard-overview'))
+        self.assertEqual(response.data['overview']['total_students'], 7)
+
+    def test_other_tenants_are_not_invalidated(self):
+        other = User.objects.create_user(
+            phone='+919800000000', password='secret-pass', name='New', institute_name='New',
+        )
+        self.client.get(reverse('dashboard-overview'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Batch.objects.create(user=other, name='Other', timing='9 AM')
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('dashboard-overview'))
+
+
+class ConditionalGetTests(TenantTestCase):
+
+    def test_current_etag_is_answered_with_304_before_the_view_runs(self):
+        url = reverse('student-list-create')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.content, b'')
+
+    def test_write_changes_the_etag(self):
+        url   = reverse('batch-fee-overview', args=[self.batch_a.id])
+        first = self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FeePayment.objects.create(user=self.user, student=self.students[0], amount=Decimal('100'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_if_modified_since_is_not_trusted(self):
+        # Two writes within one second would share a Last-Modified
+        url   = reverse('dashboard-overview')
+        first = self.client.get(url)
+        self.assertFalse(first.has_header('Last-Modified'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FeePayment.objects.create(user=self.user, student=self.students[0], amount=Decimal('100'))
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date((timezone.now() + timedelta(minutes=1)).timestamp()))
+        self.assertEqual(response.status_code, 200)
+
+    def test_etags_are_per_tenant_and_per_day(self):
+        url   = reverse('batch-list-create')
+        etag  = self.client.get(url)['ETag']
+        other = User.objects.create_user(
+            phone='+919800000002', password='secret-pass', name='Other', institute_name='Other',
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with mock.patch('django.utils.timezone.localdate', return_value=date.today() + timedelta(days=1)):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_auth_profile_follows_the_user_row(self):
+        url   = reverse('get-profile')
+        etag  = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.patch(reverse('update-profile'), {'name': 'Renamed'})
+        self.user.refresh_from_db()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['name'], 'Renamed')
+
+    def test_other_get_views_get_a_body_etag(self):
+        self.user.is_staff = True
+        self.user.save()
+        url   = reverse('dashboard-cache-stats')
+        first = self.client.get(url)
+        self.assertTrue(first.has_header('ETag'))
+
+    def test_errors_carry_no_validators(self):
+        response = self.client.get(reverse('student-detail', args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class StudentSearchTests(TenantTestCase):
+
+    def search(self, term, **params):
+        response = self.client.get(reverse('student-list-create'), {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [student['name'] for student in response.data['students']]
+
+    def test_ranks_roll_then_name_prefix_then_substring(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(
+                user=self.user, batch=self.batch_a, name='Anita Roy', phone='+919800000001', roll='A7',
+            )
+            Student.objects.create(
+                user=self.user, batch=self.batch_a, name='Roya Sen', phone='+919800000002', roll='roy',
+            )
+            Student.objects.create(
+                user=self.user, batch=self.batch_b, name='Royston Das', phone='+919800000003', roll='R9',
+            )
+
+        self.assertEqual(self.search('roy'), ['Roya Sen', 'Royston Das', 'Anita Roy'])
+        self.assertEqual(self.search('roy', batch_id=self.batch_a.id), ['Roya Sen', 'Anita Roy'])
+
+    def test_matches_roll_and_phone_digits(self):
+        self.assertEqual(self.search('3'), ['Student 3'])
+        self.assertEqual(self.search('12340005'), ['Student 5'])
+        self.assertEqual(self.search('+91 98123 40006'), ['Student 6'])
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.search('zara'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(
+                user=self.user, batch=self.batch_a, name='Zara Khan', phone='+919800000009', roll='77',
+            )
+
+        self.assertEqual(self.search('zara'), ['Zara Khan'])
+
+    def test_cut_off_results_are_reported(self):
+        url = reverse('student-list-create')
+        with mock.patch('api.views.student_views.SEARCH_LIMIT', 4):
+            cut = self.client.get(url, {'search': 'student'}).data
+            whole = self.client.get(url, {'search': 'student', 'batch_id': self.batch_a.id}).data
+
+        self.assertEqual((cut['count'], cut['has_more']), (4, True))
+        self.assertEqual((whole['count'], whole['has_more']), (3, False))
+
+
+class PhoneColumnTests(TenantTestCase):
+
+    def test_columns_follow_phone(self):
+        student = self.students[0]
+        self.assertEqual((student.phone_e164, student.phone_last10), ('+919812340001', '9812340001'))
+
+        student.phone = '09876543210'
+        student.save(update_fields=['phone'])
+        student.refresh_from_db()
+        self.assertEqual((student.phone_e164, student.phone_last10), ('+919876543210', '9876543210'))
+
+    def test_login_accepts_common_formats(self):
+        for phone in ['9812345678', '+91 98123 45678', '098123-45678', '919812345678']:
+            response = self.client.post(
+                reverse('login'), {'phone': phone, 'password': 'secret-pass'}, format='json',
+            )
+            self.assertEqual(response.status_code, 200, phone)
+
+        response = self.client.post(
+            reverse('login'), {'phone': '9812345679', 'password': 'secret-pass'}, format='json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_reset_finds_user_by_normalized_phone(self):
+        self.user.reset_token = 'token-1'
+        self.user.save()
+
+        response = self.client.post(reverse('password-reset-confirm'), {
+            'phone': '+91 98123 45678', 'token': 'token-1', 'new_password': 'another-pass-1',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('another-pass-1'))
+
+
+class KeysetPaginationTests(TenantTestCase):
+
+    def page(self, **params):
+        response = self.client.get(reverse('student-list-create'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_walks_every_row_once_in_order(self):
+        names, cursor = [], None
+        while True:
+            data = self.page(page_size=4, **({'cursor': cursor} if cursor else {}))
+            names += [s['name'] for s in data['students']]
+            cursor = data['next_cursor']
+            if not data['has_more']:
+                break
+
+        self.assertEqual(names, [f'Student {i}' for i in range(1, 7)])
+        self.assertIsNone(cursor)
+        self.assertNotIn('count', data)
+
+    def test_ties_on_the_ordering_field_are_stable(self):
+        for student in self.students:
+            student.name = 'Same Name'
+            student.save()
+
+        first  = self.page(page_size=4)
+        second = self.page(page_size=4, cursor=first['next_cursor'])
+
+        ids = [s['id'] for s in first['students'] + second['students']]
+        self.assertEqual(len(set(ids)), 6)
+
+    def test_later_pages_cost_the_same_as_the_first(self):
+        first = self.page(page_size=2)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('student-list-create'), {'page_size': 2})
+        with self.assertNumQueries(1):
+            self.client.get(reverse('student-list-create'), {'page_size': 2, 'cursor': first['next_cursor']})
+
+    def test_count_and_legacy_shape(self):
+        self.assertEqual(self.page(page_size=2, count='true')['count'], 6)
+
+        for legacy in (self.page(), self.page(paginate='false', page_size=2)):
+            self.assertEqual(legacy['count'], 6)
+            self.assertEqual(len(legacy['students']), 6)
+            self.assertNotIn('next_cursor', legacy)
+
+    @override_settings(PAGINATE_LIST_ENDPOINTS=True)
+    def test_setting_paginates_plain_requests(self):
+        data = self.page()
+        self.assertNotIn('count', data)
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.page(paginate='false')['count'], 6)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('student-list-create'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class SparseFieldsetTests(TenantTestCase):
+
+    def test_fields_prune_output_and_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-list-create'), {'fields': 'id,name,roll'})
+
+        self.assertEqual(set(response.data['students'][0]), {'id', 'name', 'roll'})
+        sql = queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('profile_pic', sql)
+        self.assertNotIn('total_fees', sql)
+
+    def test_exclude_and_dependent_columns(self):
+        response = self.client.get(
+            reverse('student-list-create'), {'exclude': 'batch_name,profile_pic,created_at,updated_at'},
+        )
+
+        student = response.data['students'][0]
+        self.assertNotIn('batch_name', student)
+        self.assertEqual(student['fees_due'], '750.00')
+
+    def test_related_field_keeps_its_join(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('student-list-create'), {'fields': 'name,batch_name', 'page_size': 50})
+        self.assertEqual(response.data['students'][0]['batch_name'], 'Class 10')
+
+    def test_writes_ignore_the_parameter(self):
+        response = self.client.post(
+            reverse('batch-list-create') + '?fields=id', {'name': 'Class 9', 'timing': '8 AM'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['batch']['name'], 'Class 9')
+
+
+class RelationAwareSerializerTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for student in self.students:
+            FeePayment.objects.create(
+                user=self.user, student=student, amount=Decimal('250'), payment_date=timezone.now(),
+            )
+        self.test = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 1', date=date.today(), total_marks=50, duration=Decimal('1.5'),
+        )
+        for student in self.students[:3]:
+            TestMark.objects.create(test=self.test, student=student, marks_obtained=Decimal('40'))
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        url = reverse('fee-payment-list-create')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for student in self.students:
+            FeePayment.objects.create(
+                user=self.user, student=student, amount=Decimal('100'), payment_date=timezone.now(),
+            )
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(response.data['payments']), 12)
+        self.assertEqual(response.data['payments'][0]['student_name'][:8], 'Student ')
+
+    def test_fee_status_history_is_one_query(self):
+        student = self.students[0]
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('student-fee-status', args=[student.id]))
+        self.assertEqual(response.data['payment_history'][0]['student_name'], student.name)
+
+    def test_batch_student_count_is_annotated(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('batch-list-create'), {'page_size': 50})
+        counts = {b['name']: b['student_count'] for b in response.data['batches']}
+        self.assertEqual(counts, {'Class 10': 3, 'Class 12': 3})
+
+    def test_nested_marks_and_single_instance(self):
+        with self.assertNumQueries(2):
+            data = TestSerializer(Test.objects.all(), many=True).data
+        self.assertEqual(data[0]['average_marks'], 40.0)
+        self.assertEqual(data[0]['marks'][0]['percentage'], '80.00')
+
+        test = Test.objects.get(pk=self.test.pk)
+        self.assertEqual(TestSerializer(test).data['marks'][0]['student_name'][:8], 'Student ')
+
+    def test_plan_is_built_once_per_serializer(self):
+        StudentSerializer.optimize_queryset(Student.objects.all())
+
+        # Later calls, whatever fields they select, reuse the per-field plans
+        request = RequestFactory().get('/', {'fields': 'id,name,batch_name'})
+        with mock.patch.object(StudentSerializer, 'get_fields', side_effect=AssertionError):
+            sparse = StudentSerializer.optimize_queryset(Student.objects.all(), request)
+            full   = StudentSerializer.optimize_queryset(Student.objects.all())
+
+        self.assertNotIn('total_fees', str(sparse.query))
+        self.assertIn('JOIN', str(sparse.query))
+        self.assertIn('total_fees', str(full.query))
+
+    def test_strict_mode_flags_lazy_relation_access(self):
+        payments = list(FeePayment.objects.all())      # not optimized
+        with self.assertRaises(LazyRelationAccess):
+            FeePaymentSerializer(payments, many=True).data
+
+
+class BatchStatsTests(TenantTestCase):
+
+    def test_stats_come_from_one_query(self):
+        Attendance.objects.create(user=self.user, batch=self.batch_a, date=date(2026, 3, 2))
+        Attendance.objects.create(user=self.user, batch=self.batch_a, date=date(2026, 3, 9))
+        Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 1', date=date(2026, 3, 5),
+            total_marks=50, duration=Decimal('1'),
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('batch-list-create'), {'with': 'stats', 'page_size': 50})
+
+        stats = {b['name']: b for b in response.data['batches']}
+        self.assertEqual(stats['Class 10']['student_count'], 3)
+        self.assertEqual(stats['Class 10']['fees_due'], '1500.00')
+        self.assertEqual(stats['Class 10']['last_attendance_date'], '2026-03-09')
+        self.assertEqual(stats['Class 10']['tests_count'], 1)
+        self.assertIsNone(stats['Class 12']['last_attendance_date'])
+
+    def test_picker_stays_light(self):
+        response = self.client.get(reverse('batch-list-create'))
+        self.assertNotIn('fees_due', response.data['batches'][0])
+
+    def test_detail_with_stats(self):
+        response = self.client.get(
+            reverse('batch-detail', args=[self.batch_b.id]), {'with': 'stats'},
+        )
+        self.assertEqual(response.data['batch']['student_count'], 3)
+        self.assertEqual(response.data['batch']['tests_count'], 0)
+
+
+def camera_jpeg(width=200, height=100, orientation=6):
+    """A JPEG whose EXIF says "rotate 90° to display", like a phone camera's."""
+    exif = Image.Exif()
+    exif[0x0112] = orientation          # Orientation
+    exif[0x010F] = 'PhoneMaker'         # Make
+    out = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(out, 'JPEG', exif=exif)
+    return SimpleUploadedFile('IMG_0001.jpg', out.getvalue(), content_type='image/jpeg')
+
+
+class MediaTestCase(TenantTestCase):
+    """TenantTestCase with a throwaway MEDIA_ROOT and inline picture processing."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, PROFILE_PIC_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, student, picture):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('student-upload-profile-pic', args=[student.id]),
+                {'profile_pic': picture}, format='multipart',
+            )
+        student.refresh_from_db()
+        return response
+
+
+class ProfilePicTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.students[0]
+        self.url = reverse('student-upload-profile-pic', args=[self.student.id])
+
+    def test_upload_returns_pending(self):
+        response = self.client.post(self.url, {'profile_pic': camera_jpeg()}, format='multipart')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['student']['profile_pic_status'], 'pending')
+        self.assertEqual(response.data['student']['profile_pic_thumbs'], {})
+
+    def test_processing_orients_strips_and_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'profile_pic': camera_jpeg()}, format='multipart')
+
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.profile_pic_status, Student.PIC_READY)
+        with default_storage.open(self.student.profile_pic.name) as f:
+            image = Image.open(f)
+            self.assertEqual(image.size, (100, 200))
+            self.assertEqual(dict(image.getexif()), {})
+
+        self.assertEqual(
+            set(self.student.profile_pic_thumbs),
+            {'small_webp', 'small_jpeg', 'medium_webp', 'medium_jpeg'},
+        )
+        with default_storage.open(self.student.profile_pic_thumbs['small_webp']) as f:
+            self.assertEqual(Image.open(f).size, (96, 96))
+
+        response = self.client.get(reverse('student-detail', args=[self.student.id]))
+        thumbs = response.data['student']['profile_pic_thumbs']
+        self.assertTrue(thumbs['medium']['jpeg'].startswith('http://testserver/api/media/student_thumbs/'))
+
+    def test_jobs_lost_in_a_restart_are_resumed(self):
+        with self.captureOnCommitCallbacks():        # queued, never run
+            self.client.post(self.url, {'profile_pic': camera_jpeg()}, format='multipart')
+
+        out = StringIO()
+        call_command('resume_profile_pics', stdout=out)
+        self.assertIn('Processed 0', out.getvalue())
+
+        call_command('resume_profile_pics', '--min-age', '0', stdout=out)
+        self.assertIn('Processed 1', out.getvalue())
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.profile_pic_status, Student.PIC_READY)
+        self.assertEqual(len(self.student.profile_pic_thumbs), 4)
+
+    def test_processing_is_picked_up_by_delta_sync(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(self.url, {'profile_pic': camera_jpeg()}, format='multipart')
+        pending = Student.objects.get(pk=self.student.pk).updated_at
+
+        for callback in callbacks:
+            callback()
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.profile_pic_status, Student.PIC_READY)
+        self.assertGreater(self.student.updated_at, pending)
+
+    def test_unreadable_upload_is_marked_failed(self):
+        junk = SimpleUploadedFile('notes.jpg', b'not an image', content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'profile_pic': junk}, format='multipart')
+
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.profile_pic_status, Student.PIC_FAILED)
+
+
+    def test_oversized_image_is_marked_failed(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, {'profile_pic': camera_jpeg()}, format='multipart')
+
+        self.assertEqual(response.status_code, 202)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.profile_pic_status, Student.PIC_FAILED)
+
+    def test_storage_failure_is_marked_failed(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(self.url, {'profile_pic': camera_jpeg()}, format='multipart')
+
+        with mock.patch('api.images.default_storage.save', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('api.images', 'ERROR'):
+            for callback in callbacks:
+                callback()
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.profile_pic_status, Student.PIC_FAILED)
+
+        # Same on the worker thread; its connection cleanup would close the
+        # test's own connection, which lives inside the test transaction
+        Student.objects.filter(pk=self.student.pk).update(profile_pic_status=Student.PIC_PENDING)
+        with mock.patch('api.images.process_profile_pic', side_effect=RuntimeError('worker died')), \
+                mock.patch('api.images.close_old_connections'), \
+                self.assertLogs('api.images', 'ERROR'):
+            images._run_in_worker(self.student.pk, self.student.profile_pic.name)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.profile_pic_status, Student.PIC_FAILED)
+
+
+class MediaStorageTests(MediaTestCase):
+
+    def media_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(d, f), self.media_root)
+            for d, _, files in os.walk(self.media_root) for f in files
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.students[:2]
+        self.upload(first, camera_jpeg())
+        self.upload(second, camera_jpeg())
+
+        self.assertEqual(first.profile_pic.name, second.profile_pic.name)
+        self.assertEqual(first.profile_pic_thumbs, second.profile_pic_thumbs)
+        self.assertRegex(first.profile_pic.name, r'^student_profiles/([0-9a-f]{2})/\1[0-9a-f]{62}\.jpg$')
+        # raw upload + cleaned picture + 4 thumbnails, stored once
+        self.assertEqual(len(self.media_files()), 6)
+
+    def test_sweep_removes_only_unreferenced_files(self):
+        kept, dropped = self.students[:2]
+        self.upload(kept, camera_jpeg())
+        self.upload(dropped, camera_jpeg(width=300))
+        dropped.delete()
+
+        out = StringIO()
+        call_command('sweep_media', '--min-age', '0', stdout=out)
+
+        expected = sorted([kept.profile_pic.name, *kept.profile_pic_thumbs.values()])
+        self.assertEqual(self.media_files(), expected)
+        # Both pictures are plain red, so the thumbnails were shared; the two
+        # raw uploads and the deleted student's cleaned picture go.
+        self.assertIn('Removed 3 of 8 files', out.getvalue())
+
+    def test_reused_file_is_kept_by_a_running_sweep(self):
+        first, second = self.students[:2]
+        self.upload(first, camera_jpeg())
+        name = first.profile_pic.name
+        first.delete()
+        path = os.path.join(self.media_root, name)
+        os.utime(path, (0, 0))                     # orphaned long ago
+
+        self.upload(second, camera_jpeg())
+        self.assertEqual(second.profile_pic.name, name)
+        self.assertGreater(os.stat(path).st_mtime, 0)
+
+        # References read before the re-upload: the files are checked again
+        os.utime(path, (0, 0))
+        for thumb in second.profile_pic_thumbs.values():
+            os.utime(os.path.join(self.media_root, thumb), (0, 0))
+        with mock.patch('api.management.commands.sweep_media._referenced_names', return_value=set()):
+            call_command('sweep_media', '--min-age', '0', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+        for thumb in second.profile_pic_thumbs.values():
+            self.assertTrue(default_storage.exists(thumb))
+
+    def test_sweep_dry_run_and_min_age(self):
+        self.upload(self.students[0], camera_jpeg())
+        self.students[0].delete()
+
+        call_command('sweep_media', '--min-age', '0', '--dry-run', stdout=StringIO())
+        call_command('sweep_media', stdout=StringIO())          # files are too new
+        self.assertEqual(len(self.media_files()), 6)
+
+
+class MediaDeliveryTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.students[0]
+        self.upload(self.student, camera_jpeg())
+        self.name = self.student.profile_pic.name
+        self.anonymous = APIClient()
+
+    def signed_url(self):
+        response = self.client.get(reverse('student-detail', args=[self.student.id]))
+        return response.data['student']['profile_pic']
+
+    def test_signed_link_needs_no_token(self):
+        response = self.anonymous.get(self.signed_url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+        self.assertEqual(Image.open(BytesIO(b''.join(response.streaming_content))).size, (100, 200))
+
+    def test_hashed_files_answer_conditional_requests(self):
+        url   = self.signed_url()
+        first = self.anonymous.get(url)
+        b''.join(first.streaming_content)
+
+        response = self.anonymous.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn(first['ETag'].strip('"'), self.name)
+
+    def test_links_are_stable_within_the_ttl(self):
+        self.assertEqual(self.signed_url(), self.signed_url())
+
+    def test_bad_or_expired_signature_is_refused(self):
+        url = reverse('media-file', args=[self.name])
+        self.assertEqual(self.anonymous.get(url, {'exp': '9999999999', 'sig': 'forged'}).status_code, 404)
+        self.assertEqual(self.anonymous.get(url).status_code, 404)
+
+        with override_settings(MEDIA_URL_TTL=-7200):
+            expired = self.signed_url()
+        self.assertEqual(self.anonymous.get(expired).status_code, 404)
+
+    def test_owner_can_fetch_without_signature(self):
+        url = reverse('media-file', args=[self.student.profile_pic_thumbs['small_webp']])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        other = User.objects.create_user(
+            phone='+919800000001', password='x', name='Other', institute_name='Other Academy',
+        )
+        intruder = APIClient()
+        intruder.force_authenticate(other)
+        self.assertEqual(intruder.get(url).status_code, 404)
+
+    @override_settings(MEDIA_DELIVERY='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_front_server_sends_the_bytes(self):
+        response = self.anonymous.get(self.signed_url())
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_paths_outside_media_dirs_are_refused(self):
+        for name in ['../db.sqlite3', 'student_profiles/../../manage.py', 'cache/x']:
+            self.assertEqual(self.client.get(reverse('media-file', args=[name])).status_code, 404)
+
+
+class StudentHistoryMixin:
+    """A student with 40 days of attendance, a payment and a test mark."""
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.students[1]
+        for day, status in enumerate(['present', 'present', 'absent', 'leave'] * 10):
+            session = Attendance.objects.create(
+                user=self.user, batch=self.batch_a, date=date(2025, 1, 1) + timedelta(days=day),
+            )
+            AttendanceRecord.objects.create(attendance=session, student=self.student, status=status)
+        FeePayment.objects.create(
+            user=self.user, student=self.student, amount=Decimal('500'), payment_date=timezone.now(),
+        )
+        test = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 1', date=date(2025, 1, 20),
+            total_marks=40, duration=Decimal('1'),
+        )
+        TestMark.objects.create(test=test, student=self.student, marks_obtained=Decimal('30'))
+        self.url = reverse('student-full-profile', args=[self.student.id])
+
+
+class StudentProfileTests(StudentHistoryMixin, TenantTestCase):
+
+    def test_query_budget(self):
+        with self.assertNumQueries(2 if supports_sql_json() else 5):
+            response = self.client.get(self.url)
+
+        # PostgreSQL answers with a RawJSONResponse, which has no .data
+        data = json.loads(response.content)
+        attendance = data['attendance']
+        self.assertEqual(attendance['totals'], {'total': 40, 'present': 20, 'absent': 10, 'leave': 10, 'pct': 50})
+        self.assertEqual(attendance['monthly']['2025-02'], {'present': 4, 'absent': 2, 'leave': 3, 'total': 9, 'pct': 44})
+        self.assertEqual(attendance['date_map']['2025-01-03'], 'absent')
+        self.assertEqual(data['tests'][0]['pct'], 75)
+        self.assertEqual(data['fees']['payments'][0]['student_name'], self.student.name)
+        self.assertEqual(data['summary']['overall_status'], 'needs_attention')
+
+    def test_sections_are_selectable(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'sections': 'tests'})
+
+        data = json.loads(response.content)
+        self.assertNotIn('attendance', data)
+        self.assertNotIn('fees', data)
+        self.assertEqual(data['summary']['tests_count'], 1)
+        self.assertNotIn('overall_status', data['summary'])
+
+    def test_unknown_section(self):
+        response = self.client.get(self.url, {'sections': 'tests,gossip'})
+        self.assertEqual(response.status_code, 400)
+
+
+def canonical_json(content):
+    """
+    `content` re-encoded with numbers spelled one way ("30", "30.0" and
+    "3E+1" all become "3E+1") and no whitespace; key order is kept.
+    """
+    number = lambda text: Decimal(text).normalize()
+    return json.dumps(
+        json.loads(content, parse_float=number, parse_int=number),
+        separators=(',', ':'), ensure_ascii=False, default=str,
+    ).encode()
+
+
+class RenderJSONTests(TestCase):
+
+    def test_raw_fragments_are_spliced_unchanged(self):
+        data = {'a': [1, 'x'], 'b': {'c': None, 'd': 'ünï'}}
+        spliced = render_json({'a': RawJSON('[1, "x"]'), 'b': {'c': None, 'd': 'ünï'}})
+
+        self.assertEqual(spliced.replace(b', ', b','), JSONRenderer().render(data))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQL-built JSON is PostgreSQL only')
+class SQLJSONEquivalenceTests(StudentHistoryMixin, TenantTestCase):
+    """The database-built documents match the ORM-built ones."""
+
+    def setUp(self):
+        super().setUp()
+        FeePayment.objects.create(
+            user=self.user, student=self.student, amount=Decimal('120.50'), notes='Ünï "cash"',
+            payment_date=timezone.now() - timedelta(days=3),
+        )
+        test = Test.objects.create(
+            user=self.user, batch=self.batch_b, name='Unit 2', date=date(2025, 2, 20),
+            total_marks=8, duration=Decimal('1'),
+        )
+        TestMark.objects.create(test=test, student=self.student, marks_obtained=Decimal('1'))  # 12.5 %
+
+    def both_paths(self, url, params=None, module='student_views'):
+        sql = self.client.get(url, params or {})
+        cache.clear()
+        with mock.patch(f'api.views.{module}.supports_sql_json', return_value=False):
+            orm = self.client.get(url, params or {})
+        return sql, orm
+
+    def assertSameDocument(self, sql, orm):
+        self.assertEqual(sql.status_code, 200)
+        self.assertEqual(canonical_json(sql.content), canonical_json(orm.content))
+
+    def test_profile(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        cache.clear()
+        self.assertSameDocument(*self.both_paths(self.url))
+
+    def test_profile_sections(self):
+        for sections in ('attendance', 'fees', 'tests', 'fees,tests'):
+            cache.clear()
+            self.assertSameDocument(*self.both_paths(self.url, {'sections': sections}))
+
+    def test_attendance_report(self):
+        url = reverse('student-attendance-report', args=[self.student.id])
+        for params in ({}, {'month': '2025-02'}, {'month': '2024-12'}):
+            cache.clear()
+            self.assertSameDocument(*self.both_paths(url, params, module='attendance_views'))
+
+    def test_sessions_of_other_tenants_are_left_out(self):
+        other = User.objects.create_user(
+            phone='+919800000000', password='secret-pass', name='Other', institute_name='Other',
+        )
+        batch = Batch.objects.create(user=other, name='Class 9', timing='5 PM')
+        session = Attendance.objects.create(user=other, batch=batch, date=date(2025, 2, 25))
+        AttendanceRecord.objects.create(attendance=session, student=self.student, status='present')
+
+        report = reverse('student-attendance-report', args=[self.student.id])
+        for url, module in ((self.url, 'student_views'), (report, 'attendance_views')):
+            cache.clear()
+            sql, orm = self.both_paths(url, module=module)
+            self.assertSameDocument(sql, orm)
+            self.assertNotIn('2025-02-25', sql.content.decode())
+
+
+@override_settings(SYNC_CURSOR_LAG=0)
+class SyncTests(TenantTestCase):
+
+    def sync(self, cursor=None):
+        response = self.client.get(reverse('sync'), {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def push(self, *operations, cursor=None):
+        return self.client.post(
+            reverse('sync'), {'cursor': cursor, 'operations': list(operations)}, format='json',
+        )
+
+    def test_body_must_be_an_object(self):
+        response = self.client.post(reverse('sync'), [{'entity': 'students'}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_first_sync_returns_everything_and_then_nothing(self):
+        first = self.sync()
+        self.assertEqual(len(first['changes']['students']), 6)
+        self.assertEqual(len(first['changes']['batches']), 2)
+        self.assertFalse(first['has_more'])
+
+        again = self.sync(first['cursor'])
+        self.assertEqual(sum(len(rows) for rows in again['changes'].values()), 0)
+
+    def test_only_changes_since_the_cursor_are_read(self):
+        cursor = self.sync()['cursor']
+        student = self.students[2]
+        student.name = 'Renamed'
+        student.save()
+
+        data = self.sync(cursor)
+        self.assertEqual([row['name'] for row in data['changes']['students']], ['Renamed'])
+        self.assertEqual(data['changes']['batches'], [])
+
+    def test_deletes_come_back_as_tombstones(self):
+        cursor = self.sync()['cursor']
+        student_id = str(self.students[0].id)
+        self.students[0].delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted']['students'], [student_id])
+        self.assertEqual(data['changes']['students'], [])
+
+    def test_deleting_a_batch_resends_its_students(self):
+        cursor   = self.sync()['cursor']
+        batch_id = str(self.batch_b.id)
+        self.batch_b.delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted']['batches'], [batch_id])
+        self.assertEqual(len(data['changes']['students']), 3)
+        self.assertTrue(all(row['batch'] is None for row in data['changes']['students']))
+
+    def test_mark_writes_resend_the_test_with_its_marks(self):
+        test = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 1', date=date(2024, 1, 1),
+            total_marks=100, duration=Decimal('1.5'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            TestMark.objects.create(test=test, student=self.students[0], marks_obtained=50)
+        cursor = self.sync()['cursor']
+
+        # The test is touched when the mark's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            TestMark.objects.create(test=test, student=self.students[1], marks_obtained=70)
+
+        tests = self.sync(cursor)['changes']['tests']
+        self.assertEqual(len(tests), 1)
+        self.assertEqual(len(tests[0]['marks']), 2)
+
+    def test_touch_survives_a_rolled_back_savepoint(self):
+        test = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 2', date=date(2024, 1, 2),
+            total_marks=100, duration=1,
+        )
+        cursor = self.sync()['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    TestMark.objects.create(test=test, student=self.students[0], marks_obtained=10)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            TestMark.objects.create(test=test, student=self.students[1], marks_obtained=70)
+
+        tests = self.sync(cursor)['changes']['tests']
+        self.assertEqual([len(t['marks']) for t in tests], [1])
+
+    @override_settings(SYNC_PAGE_SIZE=4)
+    def test_large_syncs_are_paged(self):
+        seen, cursor, pages = set(), None, 0
+        while True:
+            data = self.sync(cursor)
+            seen.update(row['id'] for row in data['changes']['students'])
+            cursor, pages = data['cursor'], pages + 1
+            if not data['has_more']:
+                break
+        self.assertEqual(pages, 2)
+        self.assertEqual(len(seen), 6)
+
+    def test_empty_sync_costs_one_query_per_stream(self):
+        cursor = self.sync()['cursor']
+        with self.assertNumQueries(6):
+            self.sync(cursor)
+
+    def test_bad_and_expired_cursors(self):
+        self.assertEqual(self.client.get(reverse('sync'), {'cursor': 'nonsense'}).status_code, 404)
+
+        cursor = self.sync()['cursor']
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=91)):
+            self.assertEqual(self.client.get(reverse('sync'), {'cursor': cursor}).status_code, 410)
+
+    def test_push_applies_offline_writes_in_order(self):
+        batch_id, student_id, payment_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        operations = [
+            {'entity': 'batches', 'op': 'upsert', 'id': str(batch_id),
+             'data': {'name': 'Offline batch', 'timing': '7 AM'}},
+            {'entity': 'students', 'op': 'upsert', 'id': str(student_id),
+             'data': {'name': 'Offline', 'phone': '+919811100000', 'roll': '77',
+                      'batch': str(batch_id), 'total_fees': '900'}},
+            {'entity': 'fee_payments', 'op': 'upsert', 'id': str(payment_id),
+             'data': {'student': str(student_id), 'amount': '300'}},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.push(*operations)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'ok', 'ok'])
+        self.assertIn(str(student_id), [row['id'] for row in response.data['changes']['students']])
+
+        # A retried push changes nothing
+        self.push(*operations)
+        student = Student.objects.get(pk=student_id)
+        self.assertEqual(student.batch_id, batch_id)
+        self.assertEqual(student.fees_paid, Decimal('300'))
+        self.assertEqual(FeePayment.objects.filter(student=student).count(), 1)
+
+        cursor = self.sync()['cursor']
+        self.push({'entity': 'fee_payments', 'op': 'delete', 'id': str(payment_id)})
+        student.refresh_from_db()
+        self.assertEqual(student.fees_paid, Decimal('0'))
+        # The reversed balance reaches the other devices
+        changed = self.sync(cursor)['changes']['students']
+        self.assertEqual([(row['id'], row['fees_paid']) for row in changed], [(str(student_id), '0.00')])
+
+    def test_push_reports_errors_and_conflicts_per_operation(self):
+        student = self.students[0]
+        seen    = self.client.get(reverse('student-detail', args=[student.id])).data['student']['updated_at']
+        student.name = 'Changed elsewhere'
+        student.save(update_fields=['name', 'updated_at'])
+        Student.objects.filter(pk=student.pk).update(updated_at=student.updated_at + timedelta(seconds=2))
+
+        other = User.objects.create_user(
+            phone='+919800000003', password='secret-pass', name='Other', institute_name='Other',
+        )
+        foreign = Batch.objects.create(user=other, name='Theirs', timing='9 AM')
+
+        response = self.push(
+            {'entity': 'students', 'op': 'upsert', 'id': str(student.id),
+             'data': {'name': 'Mine'}, 'base_updated_at': seen},
+            {'entity': 'batches', 'op': 'upsert', 'id': str(foreign.id), 'data': {'name': 'Stolen'}},
+            {'entity': 'students', 'op': 'upsert', 'id': str(uuid.uuid4()),
+             'data': {'name': 'X', 'phone': '+919811100001', 'batch': str(foreign.id)}},
+            {'entity': 'students', 'op': 'upsert', 'id': str(self.students[1].id), 'data': {'roll': '77'}},
+        )
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['conflict', 'error', 'error', 'ok'])
+        self.assertEqual(results[0]['current']['name'], 'Changed elsewhere')
+        self.assertEqual(Student.objects.get(pk=student.pk).name, 'Changed elsewhere')
+        self.assertEqual(Batch.objects.get(pk=foreign.pk).name, 'Theirs')
+        self.assertEqual(Student.objects.get(pk=self.students[1].pk).roll, '77')
+
+
+class MultiRequestTests(TenantTestCase):
+
+    def multi(self, *requests):
+        return self.client.post(reverse('multi-request'), {'requests': list(requests)}, format='json')
+
+    def test_sub_responses_match_direct_calls(self):
+        response = self.multi(
+            {'id': 'overview', 'path': '/api/dashboard/overview/'},
+            {'id': 'batches',  'path': '/api/batches/?page_size=1'},
+            {'id': 'profile',  'path': '/api/auth/profile/'},
+        )
+        self.assertEqual(response.status_code, 200)
+        items = json.loads(response.content)['responses']
+        self.assertEqual([item['id'] for item in items], ['overview', 'batches', 'profile'])
+        self.assertEqual([item['status'] for item in items], [200, 200, 200])
+
+        direct = self.client.get(reverse('batch-list-create'), {'page_size': 1})
+        self.assertEqual(items[1]['body'], json.loads(direct.content))
+        self.assertEqual(items[1]['headers']['ETag'], direct['ETag'])
+        self.assertEqual(items[2]['body']['user']['name'], 'Owner')
+
+    def test_each_item_has_its_own_status(self):
+        profile_etag = self.client.get(reverse('get-profile'))['ETag']
+        items = json.loads(self.multi(
+            {'path': f'/api/students/{uuid.uuid4()}/'},
+            {'path': '/api/nowhere/'},
+            {'path': '/api/auth/profile/', 'headers': {'If-None-Match': profile_etag}},
+        ).content)['responses']
+
+        self.assertEqual([item['status'] for item in items], [404, 404, 304])
+        self.assertEqual([item['id'] for item in items], [0, 1, 2])
+        self.assertIsNone(items[2]['body'])
+
+    def test_sub_requests_are_scoped_to_the_caller(self):
+        other = User.objects.create_user(
+            phone='+919800000004', password='secret-pass', name='Other', institute_name='Other',
+        )
+        foreign = Batch.objects.create(user=other, name='Theirs', timing='9 AM')
+
+        items = json.loads(self.multi({'path': f'/api/batches/{foreign.id}/'}).content)['responses']
+        self.assertEqual(items[0]['status'], 404)
+
+    @override_settings(MULTI_REQUEST_LIMIT=3, MULTI_REQUEST_MAX_COST=5)
+    def test_limits(self):
+        cheap = {'path': '/api/batches/'}
+        self.assertEqual(self.multi(*[cheap] * 4).status_code, 400)
+        self.assertEqual(self.multi({'path': '/api/dashboard/analytics/'}, cheap).status_code, 400)
+        self.assertEqual(self.multi({'path': '/api/multi/'}).status_code, 400)
+        self.assertEqual(self.multi({'path': '/api/batches/', 'headers': {'Authorization': 'x'}}).status_code, 400)
+        self.assertEqual(self.multi().status_code, 400)
+        self.assertEqual(self.multi(*[cheap] * 3).status_code, 200)
+
+    def test_concurrent_execution_keeps_order(self):
+        # Endpoints that read no tables: SQLite locks them across threads
+        self.user.is_staff = True
+        self.user.save()
+        with mock.patch('api.multi._can_run_concurrently', return_value=True):
+            items = json.loads(self.multi(
+                {'id': 'profile', 'path': '/api/auth/profile/'},
+                {'id': 'stats',   'path': '/api/dashboard/cache-stats/'},
+            ).content)['responses']
+
+        self.assertEqual([item['id'] for item in items], ['profile', 'stats'])
+        self.assertEqual([item['status'] for item in items], [200, 200])
+
+
+class StudentImportTests(TenantTestCase):
+
+    def upload(self, rows, name='students.csv'):
+        if name.endswith('.xlsx'):
+            from openpyxl import Workbook
+            workbook = Workbook()
+            for row in rows:
+                workbook.active.append(row)
+            buffer = BytesIO()
+            workbook.save(buffer)
+            content = buffer.getvalue()
+        else:
+            buffer = StringIO()
+            csv.writer(buffer).writerows(rows)
+            content = buffer.getvalue().encode()
+        return self.client.post(
+            reverse('student-import'), {'file': SimpleUploadedFile(name, content)}, format='multipart',
+        )
+
+    def sheet(self, count, start=100):
+        return [['Name', 'Phone', 'Roll', 'Batch', 'Total Fees']] + [
+            [f'Imported {i}', f'98765{i:05d}', str(i), 'class 10', '1200'] for i in range(start, start + count)
+        ]
+
+    def test_valid_rows_are_inserted_and_bad_rows_reported(self):
+        rows = self.sheet(3) + [
+            ['Bad phone',  '12345',      '200', '',          ''],
+            ['No batch',   '9876500201', '201', 'Class 99',  ''],
+            ['Repeat',     '9876500202', '100', '',          ''],
+            ['Existing',   '9876500203', '1',   '',          ''],
+            ['Bad fees',   '9876500204', '204', '',          '12.345'],
+            ['',           '9876500205', '205', '',          ''],
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(rows)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['rejected'], 6)
+        self.assertEqual([e['line'] for e in response.data['errors']], [5, 6, 7, 8, 9, 10])
+        self.assertIn('repeats line 2', response.data['errors'][2]['error'])
+
+        student = Student.objects.get(user=self.user, roll='101')
+        self.assertEqual(student.batch, self.batch_a)
+        self.assertEqual(student.phone_last10, '9876500101')
+        self.assertEqual(student.total_fees, Decimal('1200'))
+        self.assertEqual(self.client.get(reverse('student-list-create'), {'search': 'Imported 102'}).data['count'], 1)
+
+    def test_error_report_can_be_downloaded_by_its_owner(self):
+        url = self.upload(self.sheet(1) + [['Bad', 'x', '9', '', '']]).data['error_report']
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0], 'Name,Phone,Roll,Batch,Total Fees,error')
+        self.assertTrue(lines[1].startswith('Bad,x,9,,,'))
+        self.assertEqual(len(lines), 2)
+
+        other = User.objects.create_user(
+            phone='+919800000005', password='secret-pass', name='Other', institute_name='Other',
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            self.upload(self.sheet(5))
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.upload(self.sheet(400, start=1000)).data['created'], 400)
+        # Only the INSERTs grow (SQLite caps the rows per statement)
+        lookups = lambda ctx: [q for q in ctx.captured_queries if not q['sql'].startswith('INSERT')]
+        self.assertEqual(len(lookups(small)), len(lookups(large)))
+
+    def test_xlsx_numbers_are_read_as_text(self):
+        response = self.upload([['name', 'phone', 'roll'], ['Sheet', 9876512345, 501]], name='students.xlsx')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Student.objects.filter(user=self.user, roll='501', phone_last10='9876512345').exists())
+
+    def test_header_needs_name_and_phone(self):
+        response = self.upload([['roll', 'batch'], ['1', 'Class 10']])
+        self.assertEqual(response.status_code, 400)
+
+
+class TestComparisonTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tests = {}
+        for batch, day, marks in [(self.batch_a, date(2024, 3, 1), [40, 30, 20]),
+                                  (self.batch_b, date(2024, 3, 2), [50, 45, 40])]:
+            test = self.tests[batch.name] = Test.objects.create(
+                user=self.user, batch=batch, name='Unit 1', board='CBSE', date=day, total_marks=50, duration=1,
+            )
+            students = [s for s in self.students if s.batch_id == batch.id]
+            for student, obtained in zip(students, marks):
+                TestMark.objects.create(test=test, student=student, marks_obtained=obtained)
+        # Another paper: same name, different total
+        other = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 1', board='CBSE', date=date(2024, 3, 3),
+            total_marks=100, duration=1,
+        )
+        TestMark.objects.create(test=other, student=self.students[0], marks_obtained=10)
+
+    def compare(self):
+        response = self.client.get(reverse('test-comparison'), {'test_id': str(self.tests['Class 10'].id)})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_batches_are_normalised_against_every_batch(self):
+        data = self.compare()
+
+        self.assertEqual(data['paper'], {'name': 'Unit 1', 'board': 'CBSE', 'total_marks': 50})
+        self.assertEqual(data['overall'], {'students': 6, 'mean': 75.0, 'stdev': 19.79})
+
+        batches = {b['batch_name']: b for b in data['batches']}
+        self.assertEqual(
+            {k: batches['Class 10'][k] for k in ('students', 'mean_pct', 'stdev_pct', 'highest_pct', 'lowest_pct', 'z_mean')},
+            {'students': 3, 'mean_pct': 60.0, 'stdev_pct': 16.33, 'highest_pct': 80.0, 'lowest_pct': 40.0, 'z_mean': -0.76},
+        )
+        self.assertEqual((batches['Class 12']['mean_pct'], batches['Class 12']['z_mean']), (90.0, 0.76))
+
+    def test_students_are_ranked_within_their_batch(self):
+        students = self.compare()['students']
+
+        self.assertEqual([s['roll'] for s in students], ['1', '2', '3', '4', '5', '6'])
+        self.assertEqual([s['pct'] for s in students], [80.0, 60.0, 40.0, 100.0, 90.0, 80.0])
+        top = students[0]
+        # 20 points over a batch mean of 60 (stdev 16.33), 5 over the overall 75 (stdev 19.79)
+        self.assertEqual((top['z_batch'], top['z_overall']), (1.22, 0.25))
+        # Same score, different standing in each batch
+        self.assertEqual((students[0]['z_overall'], students[5]['z_overall']), (0.25, 0.25))
+        self.assertEqual(students[5]['z_batch'], -1.22)
+
+    def test_mark_change_invalidates_the_cached_comparison(self):
+        self.compare()
+        with self.assertNumQueries(2):        # test lookup and fingerprint only
+            self.compare()
+
+        mark = TestMark.objects.get(test=self.tests['Class 10'], student=self.students[2])
+        mark.marks_obtained = 50
+        mark.save()
+
+        batches = {b['batch_name']: b for b in self.compare()['batches']}
+        self.assertEqual(batches['Class 10']['mean_pct'], 80.0)
+
+        mark.delete()
+        self.assertEqual(self.compare()['overall']['students'], 5)
+
+    def test_renames_invalidate_the_cached_comparison(self):
+        self.compare()
+        student = self.students[0]
+        student.name = 'Renamed'
+        student.save()
+        self.batch_b.name = 'Class 12 B'
+        self.batch_b.save()
+
+        data = self.compare()
+        self.assertEqual(data['students'][0]['name'], 'Renamed')
+        self.assertIn('Class 12 B', [b['batch_name'] for b in data['batches']])
+
+    def test_query_count_does_not_grow_with_batches(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            self.compare()
+
+        for i in range(4):
+            batch = Batch.objects.create(user=self.user, name=f'Extra {i}', timing='8 AM')
+            test = Test.objects.create(
+                user=self.user, batch=batch, name='Unit 1', board='CBSE', date=date(2024, 3, 5), total_marks=50,
+                duration=1,
+            )
+            for student in self.students:
+                TestMark.objects.create(test=test, student=student, marks_obtained=25)
+
+        cache.clear()
+        with self.assertNumQueries(len(small.captured_queries)):
+            data = self.compare()
+        self.assertEqual(len(data['batches']), 6)
+        self.assertEqual(data['overall']['students'], 30)
+
+    def test_paper_must_be_identified(self):
+        response = self.client.get(reverse('test-comparison'), {'name': 'Unit 1'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MarksImportTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.test = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 1', date=date(2024, 3, 1), total_marks=50, duration=1,
+        )
+
+    def upload(self, rows, **data):
+        buffer = StringIO()
+        csv.writer(buffer).writerows(rows)
+        data = data or {'test_id': str(self.test.id)}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('test-marks-import'),
+                {'file': SimpleUploadedFile('marks.csv', buffer.getvalue().encode()), **data},
+                format='multipart',
+            )
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return lines[:-1], lines[-1]
+
+    def marks(self):
+        return dict(TestMark.objects.filter(test=self.test).values_list('student__roll', 'marks_obtained'))
+
+    def test_valid_cells_are_saved_and_bad_cells_reported(self):
+        TestMark.objects.create(test=self.test, student=self.students[1], marks_obtained=10)
+        rows = [['roll', 'marks'], ['1', '42'], ['2', '45.5'], ['99', '30'], ['3', '51'],
+                ['4', '-1'], ['5', 'absent'], ['6', '']]
+        chunks, summary = self.upload(rows)
+
+        self.assertEqual(self.marks(), {'1': Decimal('42'), '2': Decimal('45.5')})
+        self.assertEqual(chunks[0]['errors'], [
+            {'line': 4, 'error': 'Unknown roll "99"'},
+            {'line': 5, 'test': 'Unit 1', 'error': '51 is outside 0-50'},
+            {'line': 6, 'test': 'Unit 1', 'error': '-1 is outside 0-50'},
+            {'line': 7, 'test': 'Unit 1', 'error': '"absent" is not a number'},
+        ])
+        self.assertEqual(
+            {key: summary[key] for key in ('done', 'success', 'rows', 'upserted', 'errors')},
+            {'done': True, 'success': False, 'rows': 7, 'upserted': 2, 'errors': 4},
+        )
+
+    def test_last_occurrence_of_a_roll_wins(self):
+        rows = [['roll', 'marks'], ['1', '10'], ['2', '20'], ['1', '30']]
+        with mock.patch('api.views.test_views.MARKS_IMPORT_CHUNK_SIZE', 2):
+            chunks, summary = self.upload(rows + [['1', '40']])
+
+        # Within a chunk the later row replaces the earlier one; across chunks the upsert does
+        self.assertEqual([chunk['upserted'] for chunk in chunks], [2, 1])
+        self.assertEqual(self.marks(), {'1': Decimal('40'), '2': Decimal('20')})
+        self.assertTrue(summary['success'])
+
+    def test_header_names_a_column_per_test(self):
+        other = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Unit 2', date=date(2024, 3, 8), total_marks=20, duration=1,
+        )
+        chunks, summary = self.upload([['roll', 'unit 1', str(other.id)], ['1', '35', '18'], ['2', '', '12']],
+                                      batch_id=str(self.batch_a.id))
+
+        self.assertEqual(summary['upserted'], 3)
+        self.assertEqual(self.marks(), {'1': Decimal('35')})
+        self.assertEqual(TestMark.objects.filter(test=other).count(), 2)
+
+        response = self.client.post(
+            reverse('test-marks-import'),
+            {'file': SimpleUploadedFile('marks.csv', b'roll,Unit 9\n1,10\n')}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], ['No test found for column "Unit 9"'])
+
+    def test_nan_is_not_a_number(self):
+        chunks, summary = self.upload([['roll', 'marks'], ['1', 'NaN'], ['2', 'sNaN'], ['3', 'Infinity']])
+
+        self.assertEqual(summary['errors'], 3)
+        self.assertEqual([e['error'] for e in chunks[0]['errors']],
+                         ['"NaN" is not a number', '"sNaN" is not a number', '"Infinity" is not a number'])
+        self.assertEqual(self.marks(), {})
+
+    def test_rolls_differing_only_in_case_are_not_guessed(self):
+        for roll in ('Ab', 'aB'):
+            Student.objects.create(user=self.user, batch=self.batch_a, name=roll, phone='', roll=roll)
+        chunks, summary = self.upload([['roll', 'marks'], ['Ab', '10'], ['aB', '20'], ['AB', '30']])
+
+        self.assertEqual(self.marks(), {'Ab': Decimal('10'), 'aB': Decimal('20')})
+        self.assertEqual(chunks[0]['errors'], [
+            {'line': 4, 'error': 'Roll "AB" matches several students; use the exact case'},
+        ])
+        # A roll without a case twin still matches in any case
+        Student.objects.filter(user=self.user, roll='aB').update(roll='cd')
+        self.upload([['roll', 'marks'], ['AB', '30']])
+        self.assertEqual(self.marks()['Ab'], Decimal('30'))
+
+    def test_invalid_ids_are_rejected(self):
+        for data in ({'test_id': 'nope'}, {'batch_id': '12'}):
+            data['file'] = SimpleUploadedFile('marks.csv', b'roll,marks\n1,10\n')
+            response = self.client.post(reverse('test-marks-import'), data, format='multipart')
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(SYNC_CURSOR_LAG=0)
+class BulkStudentOperationTests(TenantTestCase):
+
+    def bulk(self, **data):
+        return self.client.post(reverse('student-bulk'), data, format='json')
+
+    def test_body_must_be_an_object(self):
+        response = self.client.post(reverse('student-bulk'), [str(self.students[0].id)], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_move_batch_by_filter(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk(batch_id=str(self.batch_a.id), operation={'type': 'move_batch', 'batch': str(self.batch_b.id)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['matched'], response.data['affected']), (3, 3))
+        self.assertEqual(Student.objects.filter(user=self.user, batch=self.batch_b).count(), 6)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+
+        # Already there: matched but not changed
+        response = self.bulk(ids=[str(self.students[3].id)], operation={'type': 'move_batch', 'batch': str(self.batch_b.id)})
+        self.assertEqual((response.data['matched'], response.data['affected']), (1, 0))
+
+    def test_adjust_fees_by_percent_and_range_check(self):
+        ids = [str(s.id) for s in self.students[:2]]
+        response = self.bulk(ids=ids, operation={'type': 'adjust_fees', 'percent': '10'})
+
+        self.assertEqual(response.data['affected'], 2)
+        self.assertEqual(
+            sorted(Student.objects.filter(user=self.user).values_list('total_fees', flat=True)),
+            [Decimal('1000')] * 4 + [Decimal('1100')] * 2,
+        )
+
+        response = self.bulk(all=True, operation={'type': 'adjust_fees', 'amount': -1050})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Student.objects.filter(user=self.user, total_fees__lt=1000).exists())
+
+    def test_dry_run_previews_without_writing(self):
+        response = self.bulk(all=True, dry_run=True, operation={'type': 'adjust_fees', 'percent': 12.5})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['dry_run'])
+        self.assertEqual(response.data['affected'], 6)
+        self.assertEqual(response.data['preview'][0]['new_total_fees'], '1125.00')
+        self.assertFalse(Student.objects.filter(user=self.user).exclude(total_fees=1000).exists())
+
+    def test_delete_removes_dependents_and_leaves_tombstones(self):
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            session = Attendance.objects.create(user=self.user, batch=self.batch_a, date=today)
+            for student in self.students[:3]:
+                AttendanceRecord.objects.create(attendance=session, student=student, status='present')
+            FeePayment.objects.create(user=self.user, student=self.students[0], amount=Decimal('250'))
+        cursor = self.client.get(reverse('sync')).data['cursor']
+        ids    = [str(s.id) for s in self.students[:2]]
+
+        preview = self.bulk(ids=ids, dry_run=True, operation={'type': 'delete'})
+        self.assertEqual(preview.data['deleted'], {
+            'students': 2, 'attendance_records': 2, 'test_marks': 0, 'fee_payments': 1,
+        })
+        self.assertEqual(Student.objects.filter(user=self.user).count(), 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bulk(ids=ids, operation={'type': 'delete'})
+
+        self.assertEqual(response.data['deleted'], preview.data['deleted'])
+        self.assertEqual(Student.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(AttendanceRecord.objects.filter(attendance=session).count(), 1)
+        data = self.client.get(reverse('sync'), {'cursor': cursor}).data
+        self.assertEqual(len(data['deleted']['students']), 2)
+        self.assertEqual(len(data['deleted']['fee_payments']), 1)
+        self.assertEqual([len(row['records']) for row in data['changes']['attendance']], [1])
+        self.assertEqual(TenantDailyRollup.objects.get(user=self.user, date=today).present, 1)
+
+    def test_selection_is_required_and_tenant_scoped(self):
+        self.assertEqual(self.bulk(operation={'type': 'delete'}).status_code, 400)
+        self.assertEqual(self.bulk(all=True, operation={'type': 'rename'}).status_code, 400)
+
+        other = User.objects.create_user(
+            phone='+919800000006', password='secret-pass', name='Other', institute_name='Other',
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.post(reverse('student-bulk'), {
+            'ids': [str(self.students[0].id)], 'operation': {'type': 'delete'},
+        }, format='json')
+        self.assertEqual((response.data['matched'], response.data['affected']), (0, 0))
+        self.assertTrue(Student.objects.filter(id=self.students[0].id).exists())
+
+
+class ExportTests(TenantTestCase):
+
+    def export(self, name, **params):
+        response = self.client.get(reverse('export', args=[name]), params)
+        if not response.streaming:
+            return response, None
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('\ufeff'))
+        return response, list(csv.reader(StringIO(content[1:])))
+
+    def test_students_export_streams_every_row(self):
+        self.students[0].name = '=HYPERLINK("x")'
+        self.students[0].save()
+
+        response, rows = self.export('students')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="students-', response['Content-Disposition'])
+        self.assertEqual(rows[0], ['Name', 'Roll', 'Phone', 'Batch', 'Total Fees', 'Fees Paid'])
+        self.assertEqual(len(rows), 7)
+        self.assertIn(['Student 2', '2', '+919812340002', 'Class 10', '1000.00', '500.00'], rows)
+        # Excel would run it as a formula
+        self.assertIn('\'=HYPERLINK("x")', [row[0] for row in rows])
+
+    def test_attendance_export_filters_by_batch_and_date(self):
+        today = timezone.localdate()
+        for day, batch in ((today, self.batch_a), (today - timedelta(days=40), self.batch_a), (today, self.batch_b)):
+            session = Attendance.objects.create(user=self.user, batch=batch, date=day)
+            for student in self.students:
+                if student.batch_id == batch.id:
+                    AttendanceRecord.objects.create(attendance=session, student=student, status='present')
+
+        _, rows = self.export('attendance')
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[1][0], str(today - timedelta(days=40)))
+
+        _, rows = self.export('attendance', batch_id=str(self.batch_a.id), **{'from': str(today - timedelta(days=7))})
+        self.assertEqual(rows[1:], [[str(today), 'Class 10', f'Student {i}', str(i), 'present'] for i in (1, 2, 3)])
+
+    def test_payments_export_uses_local_time(self):
+        paid_at = timezone.make_aware(datetime(2024, 1, 20, 23, 30))
+        FeePayment.objects.create(
+            user=self.user, student=self.students[0], amount=Decimal('250'), payment_date=paid_at, notes='-cash',
+        )
+
+        _, rows = self.export('payments')
+        self.assertEqual(rows[1], ['2024-01-20 23:30:00', 'Student 1', '1', 'Class 10', '250.00', "'-cash"])
+
+    def test_bad_filters_and_unknown_exports(self):
+        self.assertEqual(self.export('attendance', **{'from': '20-01-2024'})[0].status_code, 400)
+        self.assertEqual(self.export('payments', **{'to': '2024-02-30'})[0].status_code, 400)
+        self.assertEqual(self.export('students', **{'from': '2024-01-01'})[0].status_code, 400)
+        self.assertEqual(self.export('marks', batch_id='nope')[0].status_code, 400)
+        self.assertEqual(self.export('teachers')[0].status_code, 404)
+
+
+@override_settings(PROMOTION_WORKERS=0)
+class PromotionTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        test = Test.objects.create(
+            user=self.user, batch=self.batch_a, name='Finals', date=date(2026, 3, 1), total_marks=100, duration=3,
+        )
+        # Student 1 fails, 2 passes, 3 has no marks (passes)
+        TestMark.objects.create(test=test, student=self.students[0], marks_obtained=20)
+        TestMark.objects.create(test=test, student=self.students[1], marks_obtained=80)
+
+    def promote(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('promotion-list-create'), {'session': '2026-27', **data}, format='json')
+        if response.status_code == 202:
+            response.job = self.client.get(response.data['status_url']).data['promotion']
+        return response
+
+    def test_roll_over_clones_batches_and_promotes_passing_students(self):
+        response = self.promote(pass_percentage=33, batches=[
+            {'from': str(self.batch_a.id), 'name': 'Class 11', 'total_fees': 1500},
+            {'from': str(self.batch_b.id)},
+        ])
+
+        self.assertEqual(response.status_code, 202)
+        job = response.job
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['progress']['percent'], 100)
+        self.assertEqual((job['result']['promoted'], job['result']['held_back']), (5, 1))
+        self.assertEqual(job['result']['snapshot'], {'students': 6, 'total_fees': '6000.00', 'fees_paid': '2750.00'})
+
+        class_11 = Batch.objects.get(user=self.user, name='Class 11')
+        self.assertTrue(Batch.objects.filter(user=self.user, name='Class 12 (2026-27)').exists())
+        self.assertEqual(
+            sorted(Student.objects.filter(batch=class_11).values_list('roll', 'total_fees', 'fees_paid')),
+            [('2', Decimal('1500'), Decimal('0')), ('3', Decimal('1500'), Decimal('0'))],
+        )
+        held = Student.objects.get(id=self.students[0].id)
+        self.assertEqual((held.batch_id, held.total_fees, held.fees_paid), (self.batch_a.id, Decimal('1000'), Decimal('0')))
+
+        snapshot = FeeSnapshot.objects.get(promotion_id=job['id'], student=self.students[1])
+        self.assertEqual((snapshot.batch_id, snapshot.fees_paid), (self.batch_a.id, Decimal('500')))
+
+        self.assertEqual(self.promote().status_code, 409)
+
+    def test_rehearsal_reports_without_changing_anything(self):
+        before = list(Student.objects.filter(user=self.user).values_list('id', 'batch_id', 'fees_paid'))
+
+        job = self.promote(pass_percentage=33, hold_back=[str(self.students[5].id)], rehearsal=True).job
+
+        self.assertEqual(job['status'], 'done')
+        self.assertTrue(job['rehearsal'])
+        self.assertEqual((job['result']['promoted'], job['result']['held_back']), (4, 2))
+        self.assertEqual([b['held_back'] for b in job['result']['batches']], [1, 1])
+        self.assertEqual(Batch.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(list(Student.objects.filter(user=self.user).values_list('id', 'batch_id', 'fees_paid')), before)
+        self.assertFalse(FeeSnapshot.objects.exists())
+
+        # A rehearsal does not count as the roll-over
+        self.assertEqual(self.promote().status_code, 202)
+
+    def test_promoted_students_can_be_bulk_deleted(self):
+        job = self.promote().job
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('student-bulk'), {'all': True, 'operation': {'type': 'delete'}}, format='json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted']['students'], 6)
+        snapshots = FeeSnapshot.objects.filter(promotion_id=job['id'])
+        self.assertEqual(snapshots.count(), 6)
+        self.assertFalse(snapshots.filter(student__isnull=False).exists())
+
+    def test_plan_is_validated(self):
+        other = Batch.objects.create(
+            user=User.objects.create_user(phone='+919800000007', password='x', name='O', institute_name='O'),
+            name='Theirs', timing='1 PM',
+        )
+        self.assertEqual(self.promote(session='').status_code, 400)
+        self.assertEqual(self.promote(batches=[{'from': str(other.id)}]).status_code, 400)
+        self.assertEqual(self.promote(pass_percentage=150).status_code, 400)
+        self.assertEqual(self.promote(since='March').status_code, 400)
+        self.assertEqual(self.promote(since='2024-02-30').status_code, 400)
+        self.assertEqual(self.client.post(reverse('promotion-list-create'), ['2026-27'], format='json').status_code, 400)
+        self.assertFalse(Promotion.objects.exists())
+
+    def test_failed_roll_over_rolls_back(self):
+        with mock.patch('api.promotions.FeeSnapshot.objects.bulk_create', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('api.promotions', 'ERROR'):
+            job = self.promote().job
+
+        self.assertEqual((job['status'], job['error']), ('failed', 'disk full'))
+        self.assertEqual(Batch.objects.filter(user=self.user).count(), 2)
+
+    def test_second_queued_roll_over_does_not_run(self):
+        # As if two requests both passed their checks before either job ran
+        first  = Promotion.objects.create(user=self.user, session='2026-27', plan=self.promote(rehearsal=True).job['plan'])
+        second = Promotion.objects.create(user=self.user, session='2027-28', plan=first.plan)
+        promotions.run_promotion(first.pk)
+        with self.assertLogs('api.promotions', 'WARNING'):
+            promotions.run_promotion(second.pk)
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, Promotion.FAILED)
+        self.assertIn('Another roll-over', second.error)
+        self.assertEqual(Batch.objects.filter(user=self.user).count(), 4)
+        self.assertFalse(FeeSnapshot.objects.filter(promotion=second).exists())
+
+    def test_job_of_a_dead_process_is_marked_failed(self):
+        job = Promotion.objects.create(user=self.user, session='2026-27', status=Promotion.RUNNING, plan={})
+        self.assertEqual(self.promote().status_code, 409)
+
+        Promotion.objects.filter(pk=job.pk).update(created_at=timezone.now() - promotions.STALE_AFTER)
+        response = self.client.get(reverse('promotion-detail', args=[job.pk]))
+
+        self.assertEqual(response.data['promotion']['status'], 'failed')
+        self.assertEqual(Promotion.objects.get(pk=job.pk).status, Promotion.FAILED)
+        self.assertEqual(self.promote().status_code, 202)
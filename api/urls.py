@@ -6,13 +6,17 @@ from .views import (
     batch_list_create_view, batch_detail_view,
     student_list_create_view, student_detail_view,
     student_upload_profile_pic_view, student_full_profile_view,
+    student_import_view, student_import_report_view, student_bulk_view,
     attendance_list_create_view, attendance_detail_view,
     student_attendance_report_view, class_attendance_report_view,
     fee_payment_list_create_view, fee_payment_detail_view,
     student_fee_status_view, batch_fee_overview_view, fee_analytics_view,
     test_list_create_view, test_detail_view,
     test_marks_bulk_create_view, test_marks_list_view, student_test_report_view,
-    dashboard_overview_view, dashboard_analytics_view,
+    test_comparison_view, test_marks_import_view,
+    dashboard_overview_view, dashboard_analytics_view, dashboard_cache_stats_view,
+    media_file_view, sync_view, multi_request_view, export_view,
+    promotion_list_create_view, promotion_detail_view,
 )
 
 urlpatterns = [
@@ -30,6 +34,9 @@ urlpatterns = [
     path('batches/<uuid:batch_id>/',     batch_detail_view,           name='batch-detail'),
 
     path('students/',                                       student_list_create_view,        name='student-list-create'),
+    path('students/import/',                                student_import_view,              name='student-import'),
+    path('students/import/<str:token>/errors.csv',          student_import_report_view,       name='student-import-report'),
+    path('students/bulk/',                                  student_bulk_view,                name='student-bulk'),
     path('students/<uuid:student_id>/profile/',             student_full_profile_view,       name='student-full-profile'),
     path('students/<uuid:student_id>/upload-profile-pic/', student_upload_profile_pic_view,  name='student-upload-profile-pic'),
     path('students/<uuid:student_id>/',                    student_detail_view,              name='student-detail'),
@@ -46,6 +53,8 @@ urlpatterns = [
     path('fees/<uuid:payment_id>/',                          fee_payment_detail_view,        name='fee-payment-detail'),
 
     path('tests/',                                           test_list_create_view,          name='test-list-create'),
+    path('tests/marks/import/',                              test_marks_import_view,         name='test-marks-import'),
+    path('tests/compare/',                                   test_comparison_view,           name='test-comparison'),
     path('tests/student/<uuid:student_id>/report/',          student_test_report_view,       name='student-test-report'),
     path('tests/<uuid:test_id>/',                            test_detail_view,               name='test-detail'),
     path('tests/<uuid:test_id>/marks/bulk/',                 test_marks_bulk_create_view,    name='test-marks-bulk-create'),
@@ -53,4 +62,14 @@ urlpatterns = [
 
     path('dashboard/overview/',                              dashboard_overview_view,        name='dashboard-overview'),
     path('dashboard/analytics/',                             dashboard_analytics_view,       name='dashboard-analytics'),
+    path('dashboard/cache-stats/',                           dashboard_cache_stats_view,     name='dashboard-cache-stats'),
+
+    path('media/<path:name>',                                media_file_view,                name='media-file'),
+
+    path('sync/',                                            sync_view,                      name='sync'),
+    path('multi/',                                           multi_request_view,             name='multi-request'),
+    path('exports/<slug:name>.csv',                          export_view,                    name='export'),
+
+    path('promotions/',                                      promotion_list_create_view,     name='promotion-list-create'),
+    path('promotions/<uuid:promotion_id>/',                  promotion_detail_view,          name='promotion-detail'),
 ]
\ No newline at end of file
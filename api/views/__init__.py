@@ -4,4 +4,9 @@ from .student_views import *
 from .attendance_views import *
 from .fee_views import *
 from .test_views import *
-from .dashboard_views import *
\ No newline at end of file
+from .dashboard_views import *
+from .media_views import *
+from .sync_views import *
+from .multi_views import *
+from .export_views import *
+from .promotion_views import *
@@ -3,9 +3,15 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from datetime import date
 
 from ..models import Attendance, AttendanceRecord, Batch, Student
 from ..serializers import AttendanceSerializer
+from ..cache import cached_tenant_response, conditional_get
+from ..json_sql import RawJSONResponse, attendance_report, render_json, supports_sql_json
+from ..pagination import keyset_paginate
+
+ATTENDANCE_ORDERING = ('-date', '-id')
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -14,6 +20,7 @@ from ..serializers import AttendanceSerializer
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def attendance_list_create_view(request):
     """
     GET  /api/attendance/          — list all attendance sessions
@@ -36,7 +43,7 @@ def attendance_list_create_view(request):
     }
     """
     if request.method == 'GET':
-        qs = Attendance.objects.filter(user=request.user).prefetch_related('records')
+        qs = Attendance.objects.filter(user=request.user)
 
         batch_id = request.query_params.get('batch_id')
         if batch_id:
@@ -54,10 +61,12 @@ def attendance_list_create_view(request):
             except ValueError:
                 pass
 
-        serializer = AttendanceSerializer(qs, many=True)
+        qs   = AttendanceSerializer.optimize_queryset(qs, request)
+        page = keyset_paginate(request, qs, ATTENDANCE_ORDERING)
+        serializer = AttendanceSerializer(page.object_list, many=True, context={'request': request})
         return Response({
             'success':     True,
-            'count':       qs.count(),
+            **page.meta,
             'attendances': serializer.data,
         }, status=status.HTTP_200_OK)
 
@@ -101,6 +110,7 @@ def attendance_list_create_view(request):
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def attendance_detail_view(request, attendance_id):
     """
     GET    /api/attendance/<id>/  — retrieve
@@ -113,7 +123,7 @@ def attendance_detail_view(request, attendance_id):
     if request.method == 'GET':
         return Response({
             'success':    True,
-            'attendance': AttendanceSerializer(attendance).data,
+            'attendance': AttendanceSerializer(attendance, context={'request': request}).data,
         })
 
     if request.method in ('PUT', 'PATCH'):
@@ -144,6 +154,8 @@ def attendance_detail_view(request, attendance_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('student-attendance-report')
 def student_attendance_report_view(request, student_id):
     """
     GET /api/attendance/student/<student_id>/report/
@@ -155,16 +167,28 @@ def student_attendance_report_view(request, student_id):
 
     Query params:
       month — restrict to a single month (YYYY-MM)
+
+    On PostgreSQL the date map and monthly counts are built as JSON by the
+    database (api/json_sql.py) and spliced into the response.
     """
     student = get_object_or_404(Student, id=student_id, user=request.user)
 
+    month = request.query_params.get('month')
+    if supports_sql_json():
+        month_range = _month_range(month) if month else (None, None)
+        if month_range is not None:
+            report = attendance_report(student, *month_range)
+            return RawJSONResponse(render_json(_attendance_report_payload(
+                student, report['date_map'], report['monthly'],
+                report['present'], report['absent'], report['leave'], report['total'],
+            )))
+
     records = AttendanceRecord.objects.filter(
         student=student,
         attendance__user=request.user,
     ).select_related('attendance').order_by('attendance__date')
 
     # Optional month filter
-    month = request.query_params.get('month')
     if month:
         try:
             year, month_num = month.split('-')
@@ -198,9 +222,16 @@ def student_attendance_report_view(request, student_id):
     present = records.filter(status='present').count()
     absent  = records.filter(status='absent').count()
     leave   = records.filter(status='leave').count()
-    pct     = round(present / total * 100) if total else 0
 
-    return Response({
+    return Response(
+        _attendance_report_payload(student, date_map, monthly, present, absent, leave, total),
+        status=status.HTTP_200_OK,
+    )
+
+
+def _attendance_report_payload(student, date_map, monthly, present, absent, leave, total):
+    pct = round(present / total * 100) if total else 0
+    return {
         'success': True,
         'student': {
             'id':   str(student.id),
@@ -224,7 +255,18 @@ def student_attendance_report_view(request, student_id):
             'leave_days':            leave,
             'attendance_percentage': pct,
         },
-    }, status=status.HTTP_200_OK)
+    }
+
+
+def _month_range(month):
+    """[first day, first day of next month) for 'YYYY-MM', or None."""
+    try:
+        year, month_num = (int(part) for part in month.split('-'))
+        start = date(year, month_num, 1)
+    except (TypeError, ValueError):
+        return None
+    end = date(year + 1, 1, 1) if month_num == 12 else date(year, month_num + 1, 1)
+    return start, end
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -233,6 +275,8 @@ def student_attendance_report_view(request, student_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('class-attendance-report')
 def class_attendance_report_view(request):
     """
     GET /api/attendance/class-report/
@@ -18,6 +18,8 @@ from ..serializers import (
     ChangePasswordSerializer,
 )
 from ..utils import send_password_reset_email
+from ..phones import to_e164
+from ..cache import conditional_get, user_data_version
 
 
 @api_view(['POST'])
@@ -121,6 +123,7 @@ def logout_view(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get(user_data_version)
 def get_profile_view(request):
     """
     Get current user profile
@@ -249,7 +252,7 @@ def password_reset_request_view(request):
     }, status=status.HTTP_200_OK)
 
     try:
-        user = User.objects.get(phone=phone)
+        user = User.objects.get(phone_e164=to_e164(phone))
     except User.DoesNotExist:
         return generic_ok
 
@@ -346,7 +349,7 @@ def password_reset_confirm_view(request):
     new_password = serializer.validated_data['new_password']
 
     try:
-        user = User.objects.get(phone=phone, reset_token=token)
+        user = User.objects.get(phone_e164=to_e164(phone), reset_token=token)
     except User.DoesNotExist:
         return Response({
             'success': False,
@@ -5,14 +5,26 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 
 from ..models import Batch
-from ..serializers import BatchSerializer
+from ..serializers import BatchSerializer, BatchStatsSerializer
+from ..cache import conditional_get
+from ..pagination import keyset_paginate
+
+BATCH_ORDERING = ('-created_at', '-id')
+
+
+def _batch_serializer_class(request):
+    """?with=stats adds fees due, last attendance date and test count."""
+    extras = {w.strip() for w in request.query_params.get('with', '').split(',')}
+    return BatchStatsSerializer if 'stats' in extras else BatchSerializer
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def batch_list_create_view(request):
     """
     GET /api/batches/ - List all batches for current user
+                        (?with=stats adds fees_due, last_attendance_date, tests_count)
     POST /api/batches/ - Create a new batch
     Headers: Authorization: Bearer <access_token>
     
@@ -22,11 +34,13 @@ def batch_list_create_view(request):
     }
     """
     if request.method == 'GET':
-        batches = Batch.objects.filter(user=request.user)
-        serializer = BatchSerializer(batches, many=True)
+        serializer_class = _batch_serializer_class(request)
+        batches = serializer_class.optimize_queryset(Batch.objects.filter(user=request.user), request)
+        page = keyset_paginate(request, batches, BATCH_ORDERING)
+        serializer = serializer_class(page.object_list, many=True, context={'request': request})
         return Response({
             'success': True,
-            'count': batches.count(),
+            **page.meta,
             'batches': serializer.data
         }, status=status.HTTP_200_OK)
     
@@ -50,9 +64,10 @@ def batch_list_create_view(request):
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def batch_detail_view(request, batch_id):
     """
-    GET /api/batches/<id>/ - Get batch details
+    GET /api/batches/<id>/ - Get batch details (?with=stats as for the list)
     PUT/PATCH /api/batches/<id>/ - Update batch
     DELETE /api/batches/<id>/ - Delete batch
     Headers: Authorization: Bearer <access_token>
@@ -60,7 +75,7 @@ def batch_detail_view(request, batch_id):
     batch = get_object_or_404(Batch, id=batch_id, user=request.user)
     
     if request.method == 'GET':
-        serializer = BatchSerializer(batch)
+        serializer = _batch_serializer_class(request)(batch, context={'request': request})
         return Response({
             'success': True,
             'batch': serializer.data
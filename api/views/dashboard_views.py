@@ -1,49 +1,70 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg, F, Q
+from django.db.models import Sum, Count, Avg, F, Q, OuterRef, DecimalField, FloatField
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
-from ..models import Student, Batch, Attendance, AttendanceRecord, FeePayment, Test, TestMark
+from ..models import (
+    User, Student, Batch, Attendance, AttendanceRecord, FeePayment, Test, TestMark,
+    TenantDailyRollup, BatchDailyRollup,
+)
+from ..queries import subquery_aggregate
+from ..rollups import ROLLUP_FIELDS
+from ..cache import cached_tenant_response, cache_stats, conditional_get
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('dashboard-overview')
 def dashboard_overview_view(request):
     """
     Get dashboard overview statistics
     GET /api/dashboard/overview/
     Headers: Authorization: Bearer <access_token>
+
+    Query budget: 3 — one row of counts/sums (scalar subqueries on the
+    user row), the top defaulters and the recent payments with student names.
     """
-    user = request.user
-    
-    # Basic counts
-    total_students = Student.objects.filter(user=user).count()
-    total_batches = Batch.objects.filter(user=user).count()
-    total_tests = Test.objects.filter(user=user).count()
-    
-    # Fee statistics
-    students = Student.objects.filter(user=user)
-    total_expected_fees = students.aggregate(total=Sum('total_fees'))['total'] or Decimal('0.00')
-    total_collected_fees = students.aggregate(total=Sum('fees_paid'))['total'] or Decimal('0.00')
-    pending_fees = total_expected_fees - total_collected_fees
-    
-    # Today's attendance
+    user  = request.user
     today = timezone.now().date()
-    today_attendance = Attendance.objects.filter(user=user, date=today)
-    present_today = AttendanceRecord.objects.filter(
-        attendance__in=today_attendance,
-        status='present'
-    ).count()
-    
+    money = DecimalField(max_digits=12, decimal_places=2)
+    tenant_students = Student.objects.filter(user=OuterRef('pk'))
+
+    # Counts and fee totals in a single round trip
+    stats = User.objects.filter(pk=user.pk).annotate(
+        total_students=subquery_aggregate(tenant_students, Count('id')),
+        total_batches=subquery_aggregate(Batch.objects.filter(user=OuterRef('pk')), Count('id')),
+        total_tests=subquery_aggregate(Test.objects.filter(user=OuterRef('pk')), Count('id')),
+        total_expected_fees=subquery_aggregate(
+            tenant_students, Sum('total_fees'), Decimal('0.00'), money
+        ),
+        total_collected_fees=subquery_aggregate(
+            tenant_students, Sum('fees_paid'), Decimal('0.00'), money
+        ),
+        present_today=subquery_aggregate(
+            AttendanceRecord.objects.filter(
+                attendance__user=OuterRef('pk'), attendance__date=today
+            ),
+            Count('id', filter=Q(status='present')),
+        ),
+    ).values(
+        'total_students', 'total_batches', 'total_tests',
+        'total_expected_fees', 'total_collected_fees', 'present_today',
+    ).get()
+
+    total_expected_fees  = stats['total_expected_fees']
+    total_collected_fees = stats['total_collected_fees']
+    pending_fees = total_expected_fees - total_collected_fees
+
     # Fee defaulters
-    defaulters = students.filter(total_fees__gt=F('fees_paid')).values(
+    defaulters = Student.objects.filter(user=user, total_fees__gt=F('fees_paid')).values(
         'id', 'name', 'roll', 'batch__name', 'total_fees', 'fees_paid'
     )[:10]  # Top 10 defaulters
-    
+
     defaulters_list = []
     for student in defaulters:
         defaulters_list.append({
@@ -53,29 +74,31 @@ def dashboard_overview_view(request):
             'batch': student['batch__name'],
             'due_amount': float(student['total_fees']) - float(student['fees_paid'])
         })
-    
-    # Recent activities (last 10 fee payments)
-    recent_payments = FeePayment.objects.filter(user=user).order_by('-created_at')[:10]
+
+    # Recent activities (last 10 fee payments, student names joined in)
+    recent_payments = FeePayment.objects.filter(user=user).order_by('-created_at').values(
+        'student__name', 'amount', 'payment_date'
+    )[:10]
+
     recent_activities = []
-    
     for payment in recent_payments:
         recent_activities.append({
             'type': 'fee_payment',
-            'student_name': payment.student.name,
-            'amount': float(payment.amount),
-            'date': payment.payment_date
+            'student_name': payment['student__name'],
+            'amount': float(payment['amount']),
+            'date': payment['payment_date']
         })
-    
+
     return Response({
         'success': True,
         'overview': {
-            'total_students': total_students,
-            'total_batches': total_batches,
-            'total_tests': total_tests,
+            'total_students': stats['total_students'],
+            'total_batches': stats['total_batches'],
+            'total_tests': stats['total_tests'],
             'total_expected_fees': float(total_expected_fees),
             'total_collected_fees': float(total_collected_fees),
             'pending_fees': float(pending_fees),
-            'present_today': present_today,
+            'present_today': stats['present_today'],
             'fee_collection_percentage': round(
                 (float(total_collected_fees) / float(total_expected_fees) * 100), 2
             ) if total_expected_fees > 0 else 0
@@ -85,8 +108,14 @@ def dashboard_overview_view(request):
     }, status=status.HTTP_200_OK)
 
 
+ANALYTICS_PERIODS  = {'week': 7, 'month': 30, 'year': 365}
+MAX_ANALYTICS_DAYS = 731
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('dashboard-analytics')
 def dashboard_analytics_view(request):
     """
     Get detailed analytics for dashboard
@@ -94,86 +123,198 @@ def dashboard_analytics_view(request):
     Headers: Authorization: Bearer <access_token>
     
     Query params:
-    - period: 'week', 'month', 'year' (default: month)
+    - period: 'week', 'month', 'year' (default: month), ending today
+    - start, end: YYYY-MM-DD, an explicit range (overrides period)
+
+    Figures for the range are compared with the previous range of the same
+    length, and returned as a daily series as well. Both ranges are read from
+    the daily rollup tables (api/rollups.py) in one query of at most two rows
+    per day. Batch statistics (fees, attendance % and average test %) come
+    from a single annotated Batch query.
     """
     user = request.user
     period = request.query_params.get('period', 'month')
     
     # Calculate date range
     today = timezone.now().date()
-    if period == 'week':
-        start_date = today - timedelta(days=7)
-    elif period == 'year':
-        start_date = today - timedelta(days=365)
-    else:  # month
-        start_date = today - timedelta(days=30)
-    
-    # Fee collection trend
-    payments = FeePayment.objects.filter(
-        user=user,
-        payment_date__date__gte=start_date
-    )
-    
-    total_collected_period = payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    
-    # Attendance trend
-    attendance_records = AttendanceRecord.objects.filter(
-        attendance__user=user,
-        attendance__date__gte=start_date
+    try:
+        start_date, end_date = _analytics_range(request.query_params, period, today)
+    except ValueError as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    days           = (end_date - start_date).days + 1
+    previous_end   = start_date - timedelta(days=1)
+    previous_start = previous_end - timedelta(days=days - 1)
+
+    # Both windows in one pass over the daily rollups
+    rollups = TenantDailyRollup.objects.filter(
+        user=user, date__gte=previous_start, date__lte=end_date,
+    ).values('date', *ROLLUP_FIELDS)
+
+    current, previous = _empty_totals(), _empty_totals()
+    series = {start_date + timedelta(days=i): None for i in range(days)}
+    for row in rollups:
+        if row['date'] >= start_date:
+            _add_totals(current, row)
+            series[row['date']] = row
+        else:
+            _add_totals(previous, row)
+
+    current_figures  = _analytics_figures(current)
+    previous_figures = _analytics_figures(previous)
+
+    # Batch-wise statistics — one annotated query for every batch
+    batch_students = Student.objects.filter(batch=OuterRef('pk'))
+    batch_rollups  = BatchDailyRollup.objects.filter(
+        batch=OuterRef('pk'), date__gte=start_date, date__lte=end_date,
     )
-    
-    total_present = attendance_records.filter(status='present').count()
-    total_records = attendance_records.count()
-    attendance_percentage = (total_present / total_records * 100) if total_records > 0 else 0
-    
-    # Test performance trend
-    test_marks = TestMark.objects.filter(
-        test__user=user,
-        test__date__gte=start_date
+    money = DecimalField(max_digits=12, decimal_places=2)
+
+    batches = Batch.objects.filter(user=user).annotate(
+        student_count=subquery_aggregate(batch_students, Count('id')),
+        total_fees=subquery_aggregate(batch_students, Sum('total_fees'), Decimal('0.00'), money),
+        collected_fees=subquery_aggregate(batch_students, Sum('fees_paid'), Decimal('0.00'), money),
+        attendance_total=subquery_aggregate(
+            batch_rollups, Sum(F('present') + F('absent') + F('leave'))
+        ),
+        attendance_present=subquery_aggregate(batch_rollups, Sum('present')),
+        marks_count=subquery_aggregate(batch_rollups, Sum('mark_count')),
+        percentage_sum=subquery_aggregate(
+            batch_rollups, Sum('percentage_sum'), 0.0, FloatField()
+        ),
+    ).values(
+        'id', 'name', 'student_count', 'total_fees', 'collected_fees',
+        'attendance_total', 'attendance_present', 'marks_count', 'percentage_sum',
     )
-    
-    avg_test_percentage = 0
-    if test_marks.exists():
-        total_percentage = sum([mark.percentage for mark in test_marks])
-        avg_test_percentage = total_percentage / test_marks.count()
-    
-    # Batch-wise statistics
-    batches = Batch.objects.filter(user=user)
     batch_stats = []
-    
+
     for batch in batches:
-        batch_students = Student.objects.filter(batch=batch)
-        batch_total_fees = batch_students.aggregate(total=Sum('total_fees'))['total'] or Decimal('0.00')
-        batch_collected_fees = batch_students.aggregate(total=Sum('fees_paid'))['total'] or Decimal('0.00')
-        
+        batch_total_fees     = batch['total_fees']
+        batch_collected_fees = batch['collected_fees']
+
         batch_stats.append({
-            'batch_id': str(batch.id),
-            'batch_name': batch.name,
-            'student_count': batch_students.count(),
+            'batch_id': str(batch['id']),
+            'batch_name': batch['name'],
+            'student_count': batch['student_count'],
             'total_fees': float(batch_total_fees),
             'collected_fees': float(batch_collected_fees),
             'collection_percentage': round(
                 (float(batch_collected_fees) / float(batch_total_fees) * 100), 2
-            ) if batch_total_fees > 0 else 0
+            ) if batch_total_fees > 0 else 0,
+            'attendance_percentage': round(
+                batch['attendance_present'] / batch['attendance_total'] * 100, 2
+            ) if batch['attendance_total'] else 0,
+            'average_test_percentage': round(
+                batch['percentage_sum'] / batch['marks_count'], 2
+            ) if batch['marks_count'] else 0,
+            'marks_recorded': batch['marks_count'],
         })
-    
+
     return Response({
         'success': True,
-        'period': period,
+        'period': period if 'start' not in request.query_params else 'custom',
+        'range': {'start': start_date, 'end': end_date},
+        'previous_range': {'start': previous_start, 'end': previous_end},
         'analytics': {
             'fee_collection': {
-                'total_collected': float(total_collected_period),
-                'payment_count': payments.count()
+                'total_collected': current_figures['total_collected'],
+                'payment_count': current_figures['payment_count']
             },
             'attendance': {
-                'total_records': total_records,
-                'total_present': total_present,
-                'attendance_percentage': round(attendance_percentage, 2)
+                'total_records': current_figures['total_records'],
+                'total_present': current_figures['total_present'],
+                'attendance_percentage': current_figures['attendance_percentage']
             },
             'test_performance': {
-                'total_tests': test_marks.values('test').distinct().count(),
-                'average_percentage': round(avg_test_percentage, 2)
+                'total_tests': current_figures['total_tests'],
+                'average_percentage': current_figures['average_percentage']
             },
             'batch_statistics': batch_stats
-        }
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+        },
+        'comparison': {
+            metric: _delta(current_figures[metric], previous_figures[metric])
+            for metric in current_figures
+        },
+        'daily_series': [_series_point(day, row) for day, row in series.items()],
+    }, status=status.HTTP_200_OK)
+
+
+def _analytics_range(params, period, today):
+    """(start, end) from ?start=&end= or from a named period ending today."""
+    if 'start' in params or 'end' in params:
+        try:
+            start_date = date.fromisoformat(params.get('start', ''))
+            end_date   = date.fromisoformat(params['end']) if params.get('end') else today
+        except ValueError:
+            raise ValueError('start and end must be dates in YYYY-MM-DD format')
+        if start_date > end_date:
+            raise ValueError('start must not be after end')
+        if (end_date - start_date).days + 1 > MAX_ANALYTICS_DAYS:
+            raise ValueError(f'The range may span at most {MAX_ANALYTICS_DAYS} days')
+        return start_date, end_date
+
+    return today - timedelta(days=ANALYTICS_PERIODS.get(period, 30)), today
+
+
+def _empty_totals():
+    return {field: 0 for field in ROLLUP_FIELDS}
+
+
+def _add_totals(totals, row):
+    for field in ROLLUP_FIELDS:
+        totals[field] += row[field]
+
+
+def _analytics_figures(totals):
+    records = totals['present'] + totals['absent'] + totals['leave']
+    return {
+        'total_collected': float(totals['amount_collected']),
+        'payment_count': totals['payment_count'],
+        'total_records': records,
+        'total_present': totals['present'],
+        'attendance_percentage': round(totals['present'] / records * 100, 2) if records else 0,
+        'total_tests': totals['test_count'],
+        'average_percentage': round(
+            totals['percentage_sum'] / totals['mark_count'], 2
+        ) if totals['mark_count'] else 0,
+    }
+
+
+def _delta(current, previous):
+    change = current - previous
+    return {
+        'current': current,
+        'previous': previous,
+        'change': round(change, 2),
+        'change_percentage': round(change / previous * 100, 2) if previous else None,
+    }
+
+
+def _series_point(day, row):
+    figures = _analytics_figures(row or _empty_totals())
+    return {
+        'date': day,
+        'present': figures['total_present'],
+        'total_records': figures['total_records'],
+        'attendance_percentage': figures['attendance_percentage'],
+        'collected': figures['total_collected'],
+        'payment_count': figures['payment_count'],
+        'tests': figures['total_tests'],
+        'average_percentage': figures['average_percentage'],
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def dashboard_cache_stats_view(request):
+    """
+    Hit/miss counters of the per-tenant response cache
+    GET /api/dashboard/cache-stats/
+    Headers: Authorization: Bearer <access_token>
+
+    The counters cover every tenant, so only staff users may read them.
+    """
+    return Response({
+        'success': True,
+        'endpoints': cache_stats(),
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,37 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+
+from ..cache import conditional_get
+from ..exports import EXPORTS, ExportError, export_rows, stream_csv
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_get()
+def export_view(request, name):
+    """
+    Download a CSV export
+    GET /api/exports/<students|payments|attendance|marks>.csv
+    Headers: Authorization: Bearer <access_token>
+
+    Query params:
+    - batch_id: only this batch
+    - from, to: date range (YYYY-MM-DD); not for students
+
+    The file is streamed as it is read, so large exports start at once and
+    use little memory on the server. See api/exports.py.
+    """
+    if name not in EXPORTS:
+        raise Http404
+    try:
+        rows = export_rows(request.user, name, request.query_params)
+    except ExportError as e:
+        return Response({'success': False, 'message': str(e)}, status=400)
+
+    response = StreamingHttpResponse(stream_csv(name, rows), content_type='text/csv; charset=utf-8')
+    filename = f'{name}-{timezone.localdate():%Y-%m-%d}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -8,10 +8,15 @@ from decimal import Decimal
 
 from ..models import FeePayment, Student, Batch
 from ..serializers import FeePaymentSerializer
+from ..cache import cached_tenant_response, conditional_get
+from ..pagination import keyset_paginate
+
+FEE_PAYMENT_ORDERING = ('-payment_date', '-id')
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def fee_payment_list_create_view(request):
     """
     GET /api/fees/ - List all fee payments
@@ -55,15 +60,21 @@ def fee_payment_list_create_view(request):
             except:
                 pass
         
-        serializer = FeePaymentSerializer(payments, many=True)
+        page = keyset_paginate(
+            request, FeePaymentSerializer.optimize_queryset(payments, request), FEE_PAYMENT_ORDERING,
+        )
+        serializer = FeePaymentSerializer(page.object_list, many=True, context={'request': request})
         
-        # Calculate totals
-        total_collected = payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        # Calculate totals (whole result, so only when asked for when paginated)
+        totals = {}
+        if page.wants_totals:
+            total_collected = payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            totals['total_collected'] = float(total_collected)
         
         return Response({
             'success': True,
-            'count': payments.count(),
-            'total_collected': float(total_collected),
+            **page.meta,
+            **totals,
             'payments': serializer.data
         }, status=status.HTTP_200_OK)
     
@@ -105,6 +116,7 @@ def fee_payment_list_create_view(request):
 
 @api_view(['GET', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def fee_payment_detail_view(request, payment_id):
     """
     GET /api/fees/<id>/ - Get payment details
@@ -114,7 +126,7 @@ def fee_payment_detail_view(request, payment_id):
     payment = get_object_or_404(FeePayment, id=payment_id, user=request.user)
     
     if request.method == 'GET':
-        serializer = FeePaymentSerializer(payment)
+        serializer = FeePaymentSerializer(payment, context={'request': request})
         return Response({
             'success': True,
             'payment': serializer.data
@@ -136,6 +148,8 @@ def fee_payment_detail_view(request, payment_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('student-fee-status')
 def student_fee_status_view(request, student_id):
     """
     Get fee status for a specific student
@@ -160,12 +174,16 @@ def student_fee_status_view(request, student_id):
             'fees_due': float(student.fees_due),
             'payment_percentage': round((float(student.fees_paid) / float(student.total_fees) * 100), 2) if student.total_fees > 0 else 0
         },
-        'payment_history': FeePaymentSerializer(payments, many=True).data
+        'payment_history': FeePaymentSerializer(
+            payments, many=True, context={'request': request}
+        ).data
     }, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('batch-fee-overview')
 def batch_fee_overview_view(request, batch_id):
     """
     Get fee overview for a specific batch
@@ -214,6 +232,8 @@ def batch_fee_overview_view(request, batch_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('fee-analytics')
 def fee_analytics_view(request):
     """
     Get overall fee analytics for the user
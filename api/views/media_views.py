@@ -0,0 +1,59 @@
+import os
+
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from ..media import cache_control, clean_name, content_type, tenant_owns, valid_signature
+from ..storage import is_hashed_name
+
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([AllowAny])
+def media_file_view(request, name):
+    """
+    GET /api/media/<name>?exp=<unix time>&sig=<signature>
+    GET /api/media/<name>          (Authorization: Bearer <access_token>)
+
+    Serves a profile picture or thumbnail to whoever holds a signed link from
+    an API response, or to the tenant whose student uses it. See api/media.py.
+    """
+    name = clean_name(name)
+    if name is None:
+        raise Http404
+
+    signed = valid_signature(name, request.query_params.get('exp'), request.query_params.get('sig'))
+    if not signed and not (request.user.is_authenticated and tenant_owns(request.user, name)):
+        # 404 rather than 403 so file names cannot be probed
+        raise Http404
+    if not default_storage.exists(name):
+        raise Http404
+
+    # Hashed names are their own ETag; checked before the file is opened
+    etag          = '"' + os.path.splitext(os.path.basename(name))[0] + '"' if is_hashed_name(name) else None
+    last_modified = int(default_storage.get_modified_time(name).timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['Cache-Control'] = cache_control(name)
+        return response
+
+    delivery = getattr(settings, 'MEDIA_DELIVERY', '')
+    if delivery == 'x-accel':
+        response = HttpResponse(content_type=content_type(name))
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + name
+    elif delivery == 'x-sendfile':
+        response = HttpResponse(content_type=content_type(name))
+        response['X-Sendfile'] = default_storage.path(name)
+    else:
+        response = FileResponse(default_storage.open(name), content_type=content_type(name))
+
+    if etag:
+        response['ETag'] = etag
+    response['Last-Modified']       = http_date(last_modified)
+    response['Cache-Control']       = cache_control(name)
+    response['Content-Disposition'] = f'inline; filename="{os.path.basename(name)}"'
+    return response
@@ -0,0 +1,38 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ..json_sql import RawJSONResponse, render_json
+from ..multi import MultiRequestError, parse_requests, run_requests
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def multi_request_view(request):
+    """
+    Run several GET requests in one call
+    POST /api/multi/
+    Headers: Authorization: Bearer <access_token>
+
+    Body: {
+        "requests": [
+            {"id": "overview", "path": "/api/dashboard/overview/"},
+            {"id": "batches",  "path": "/api/batches/?page_size=20"}
+        ]
+    }
+
+    Returns {"success": true, "responses": [{"id", "status", "headers", "body"}, ...]}
+    in request order. See api/multi.py for limits and concurrency.
+    """
+    items = request.data.get('requests') if isinstance(request.data, dict) else None
+    try:
+        calls = parse_requests(items)
+    except MultiRequestError as error:
+        return Response({
+            'success': False,
+            'message': str(error),
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    results = run_requests(request, calls)
+    return RawJSONResponse(render_json({'success': True, 'responses': results}))
@@ -0,0 +1,79 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from ..models import Promotion
+from ..promotions import (
+    PromotionConflict, PromotionError, check_roll_over, lock_tenant, parse_plan, promotion_data,
+    schedule_promotion,
+)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def promotion_list_create_view(request):
+    """
+    GET  /api/promotions/   — recent roll-over jobs
+    POST /api/promotions/   — roll the institute over to a new session
+    Headers: Authorization: Bearer <access_token>
+
+    POST body (JSON):
+    {
+        "session": "2026-27",
+        "batches": [                                   optional: default every batch
+            {"from": "<uuid>", "name": "Class 11", "timing": "4 PM", "total_fees": 15000}
+        ],
+        "pass_percentage": 33,                         optional: hold back students below it
+        "since": "2025-04-01",                         optional: tests counted from this date
+        "hold_back": ["<student uuid>", ...],          optional
+        "reset_fees": true,                            default true
+        "rehearsal": true                              report the result, change nothing
+    }
+
+    Responds 202 with the job; poll "status_url" for progress and the
+    result. See api/promotions.py.
+    """
+    if request.method == 'GET':
+        promotions = Promotion.objects.filter(user=request.user)[:20]
+        return Response({'success': True, 'promotions': [promotion_data(p) for p in promotions]})
+
+    try:
+        plan = parse_plan(request.user, request.data)
+    except PromotionError as e:
+        return Response({'success': False, 'message': str(e)}, status=400)
+
+    session   = request.data['session'].strip()
+    rehearsal = bool(request.data.get('rehearsal'))
+    with transaction.atomic():
+        if not rehearsal:
+            # Concurrent requests take turns, so only one of them queues a job
+            lock_tenant(request.user.pk)
+            try:
+                check_roll_over(request.user.pk, session)
+            except PromotionConflict as e:
+                return Response({'success': False, 'message': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        promotion = Promotion.objects.create(user=request.user, session=session, rehearsal=rehearsal, plan=plan)
+        schedule_promotion(promotion)
+    return Response({
+        'success':    True,
+        'message':    'Rehearsal started' if rehearsal else 'Roll-over started',
+        'promotion':  promotion_data(promotion),
+        'status_url': request.build_absolute_uri(reverse('promotion-detail', args=[promotion.id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def promotion_detail_view(request, promotion_id):
+    """
+    GET /api/promotions/<promotion_id>/ — status, progress and result of a roll-over
+
+    Not conditional: progress changes without a tenant data write.
+    """
+    promotion = get_object_or_404(Promotion, id=promotion_id, user=request.user)
+    return Response({'success': True, 'promotion': promotion_data(promotion)})
@@ -3,10 +3,31 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg, Sum, Count, F
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Sum, Count, F, Q
+from django.db.models.functions import TruncMonth
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from decimal import Decimal, InvalidOperation
+import csv
+import io
+import secrets
 
 from ..models import Student, Batch, Attendance, AttendanceRecord, FeePayment, Test, TestMark
 from ..serializers import StudentSerializer, FeePaymentSerializer, TestMarkSerializer
+from ..cache import bump_tenant_version, cached_tenant_response, conditional_get
+from ..images import schedule_profile_pic
+from ..imports import SpreadsheetError, chunked, iter_sheet_rows
+from ..json_sql import RawJSONResponse, profile_sections, render_json, supports_sql_json
+from ..phones import parse_phone, phone_columns
+from ..search import SEARCH_LIMIT, search_students
+from ..bulk import BulkError, apply_operation, parse_operation, preview_operation, select_students
+from ..pagination import keyset_paginate
+
+STUDENT_ORDERING = ('name', 'id')
+
+PROFILE_SECTIONS = ('attendance', 'fees', 'tests')
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -15,13 +36,16 @@ from ..serializers import StudentSerializer, FeePaymentSerializer, TestMarkSeria
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def student_list_create_view(request):
     """
     GET  /api/students/        — list students (filters: batch_id, search)
+                                 search matches name, roll and phone digits, best first;
+                                 at most SEARCH_LIMIT, "has_more" when there were more
     POST /api/students/        — create student (multipart/form-data or JSON)
     """
     if request.method == 'GET':
-        students = Student.objects.filter(user=request.user).select_related('batch')
+        students = Student.objects.filter(user=request.user)
 
         batch_id = request.query_params.get('batch_id')
         if batch_id:
@@ -29,12 +53,21 @@ def student_list_create_view(request):
 
         search = request.query_params.get('search', '').strip()
         if search:
-            students = students.filter(name__icontains=search) | students.filter(phone__icontains=search)
+            # Ranked, capped at SEARCH_LIMIT — see api/search.py. One extra
+            # row tells whether matches were cut off.
+            found    = search_students(request.user, search, batch_id=batch_id, limit=SEARCH_LIMIT + 1)
+            students = found[:SEARCH_LIMIT]
+            meta     = {'count': len(students), 'has_more': len(found) > SEARCH_LIMIT}
+        else:
+            students = StudentSerializer.optimize_queryset(students, request)
+            page     = keyset_paginate(request, students, STUDENT_ORDERING)
+            students = page.object_list
+            meta     = page.meta
 
         serializer = StudentSerializer(students, many=True, context={'request': request})
         return Response({
             'success':  True,
-            'count':    students.count(),
+            **meta,
             'students': serializer.data,
         })
 
@@ -70,6 +103,7 @@ def student_list_create_view(request):
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def student_detail_view(request, student_id):
     """
     GET    /api/students/<id>/   — retrieve
@@ -125,6 +159,9 @@ def student_upload_profile_pic_view(request, student_id):
     """
     POST /api/students/<id>/upload-profile-pic/
     Body: multipart/form-data  key = "profile_pic"
+
+    Returns 202 straight away with profile_pic_status "pending"; thumbnails
+    appear in profile_pic_thumbs once processing finishes (api/images.py).
     """
     student = get_object_or_404(Student, id=student_id, user=request.user)
 
@@ -132,12 +169,272 @@ def student_upload_profile_pic_view(request, student_id):
         return Response({'success': False, 'message': 'No file provided'}, status=400)
 
     student.profile_pic = request.FILES['profile_pic']
-    student.save(update_fields=['profile_pic'])
+    student.save(update_fields=['profile_pic', 'updated_at'])
+    schedule_profile_pic(student)
 
     return Response({
         'success': True,
-        'message': 'Profile picture updated',
+        'message': 'Profile picture received, processing',
         'student': StudentSerializer(student, context={'request': request}).data,
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bulk import
+# ─────────────────────────────────────────────────────────────────────────────
+
+STUDENT_IMPORT_CHUNK_SIZE = 500
+STUDENT_IMPORT_REPORT_TTL = 60 * 60 * 24
+
+# Sheet header → Student field; headers are matched case-insensitively
+STUDENT_IMPORT_COLUMNS = {
+    'name':       'name',
+    'phone':      'phone',
+    'roll':       'roll',
+    'batch':      'batch',
+    'batch_name': 'batch',
+    'total_fees': 'total_fees',
+    'fees_paid':  'fees_paid',
+}
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def student_import_view(request):
+    """
+    Import students from a CSV/XLSX sheet
+    POST /api/students/import/
+    Headers: Authorization: Bearer <access_token>
+    Body: multipart/form-data  key = "file"
+
+    The first row is a header with "name" and "phone", and optionally
+    "roll", "batch" (batch name), "total_fees" and "fees_paid".
+
+    Every row is checked before anything is written: batches are looked up
+    by name, phones validated, and rolls checked against the institute and
+    the rest of the sheet. Valid rows are inserted in chunks. Rejected rows
+    are listed in a CSV, with an "error" column, at "error_report"; fix them
+    there and import that file again.
+    """
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'success': False, 'message': 'No file provided'}, status=400)
+
+    rows = iter_sheet_rows(upload)
+    try:
+        header = next(rows, None)
+        if header is None:
+            return Response({'success': False, 'message': 'The file is empty'}, status=400)
+        columns = _student_import_columns(header)
+        if 'name' not in columns.values() or 'phone' not in columns.values():
+            return Response({
+                'success': False,
+                'message': 'The header row needs "name" and "phone" columns',
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        students, failed = _read_student_rows(request.user, rows, columns)
+    except SpreadsheetError as e:
+        return Response({'success': False, 'message': str(e)}, status=400)
+
+    created = 0
+    for chunk in chunked(students, STUDENT_IMPORT_CHUNK_SIZE):
+        inserted, conflicts = _insert_students(request.user, chunk)
+        created += inserted
+        failed  += conflicts
+    if created:
+        # bulk_create sends no post_save signals
+        bump_tenant_version(request.user.id)
+
+    failed.sort(key=lambda row: row[0])
+    report = _store_import_report(request, header, failed) if failed else None
+    return Response({
+        'success':      not failed,
+        'message':      f'{created} students imported, {len(failed)} rows rejected',
+        'created':      created,
+        'rejected':     len(failed),
+        'errors':       [{'line': line, 'error': error} for line, _, error in failed[:100]],
+        'error_report': report,
+    }, status=status.HTTP_201_CREATED if not failed else status.HTTP_207_MULTI_STATUS)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def student_import_report_view(request, token):
+    """
+    GET /api/students/import/<token>/errors.csv — rows rejected by an import
+    """
+    content = cache.get(_import_report_key(request.user.id, token))
+    if content is None:
+        raise Http404
+    response = HttpResponse(content, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="student-import-errors.csv"'
+    return response
+
+
+def _student_import_columns(header):
+    columns = {}
+    for index, label in enumerate(header):
+        field = STUDENT_IMPORT_COLUMNS.get(label.strip().lower().replace(' ', '_'))
+        if field and field not in columns.values():
+            columns[index] = field
+    return columns
+
+
+def _read_student_rows(user, rows, columns):
+    """Validate every row in one pass. Returns ([(line, cells, Student)], [(line, cells, error)])."""
+    batches = {}
+    for batch_id, name in Batch.objects.filter(user=user).values_list('id', 'name'):
+        batches.setdefault(name.strip().lower(), []).append(batch_id)
+    # Every roll the institute already uses, against the (user, roll) constraint
+    rolls = dict.fromkeys(Student.objects.filter(user=user).values_list('roll', flat=True), 0)
+
+    students, failed = [], []
+    for line, cells in enumerate(rows, start=2):
+        values = {field: cells[index] if index < len(cells) else '' for index, field in columns.items()}
+        try:
+            student = _student_from_row(user, values, batches)
+        except ValueError as e:
+            failed.append((line, cells, str(e)))
+            continue
+
+        if student.roll in rolls:
+            first = rolls[student.roll]
+            failed.append((line, cells, f'Roll "{student.roll}" repeats line {first}' if first
+                           else f'Roll "{student.roll}" already exists'))
+            continue
+        rolls[student.roll] = line
+        students.append((line, cells, student))
+    return students, failed
+
+
+def _student_from_row(user, values, batches):
+    name = values.get('name', '')
+    if not name:
+        raise ValueError('Name is required')
+    if len(name) > 255:
+        raise ValueError('Name is longer than 255 characters')
+
+    phone = parse_phone(values.get('phone', ''))
+    if phone is None:
+        raise ValueError(f'"{values.get("phone", "")}" is not a valid phone number')
+
+    roll = values.get('roll', '')
+    if len(roll) > 50:
+        raise ValueError('Roll is longer than 50 characters')
+
+    batch_id = None
+    if values.get('batch'):
+        matches = batches.get(values['batch'].lower(), [])
+        if len(matches) != 1:
+            raise ValueError(f'{len(matches) or "No"} batches named "{values["batch"]}"')
+        batch_id = matches[0]
+
+    student = Student(
+        user=user, batch_id=batch_id, name=name, phone=phone, roll=roll,
+        total_fees=_import_amount(values.get('total_fees'), 'total_fees'),
+        fees_paid=_import_amount(values.get('fees_paid'), 'fees_paid'),
+    )
+    # bulk_create skips save(), which fills these
+    student.phone_e164, student.phone_last10 = phone_columns(phone)
+    return student
+
+
+def _import_amount(raw, label):
+    if not raw:
+        return Decimal('0')
+    try:
+        amount = Decimal(raw.replace(',', ''))
+    except InvalidOperation:
+        raise ValueError(f'{label} "{raw}" is not a number')
+    if not amount.is_finite() or not Decimal('0') <= amount < Decimal('100000000') or amount != amount.quantize(Decimal('0.01')):
+        raise ValueError(f'{label} "{raw}" must be 0 to 99999999.99 with at most 2 decimals')
+    return amount
+
+
+def _insert_students(user, chunk):
+    """Insert one chunk in its own transaction; rolls taken meanwhile are rejected."""
+    try:
+        with transaction.atomic():
+            Student.objects.bulk_create([student for _, _, student in chunk])
+        return len(chunk), []
+    except IntegrityError:
+        pass
+
+    # Another request created some of these rolls since they were checked
+    taken = set(Student.objects.filter(
+        user=user, roll__in=[student.roll for _, _, student in chunk],
+    ).values_list('roll', flat=True))
+    rest  = [row for row in chunk if row[2].roll not in taken]
+    with transaction.atomic():
+        Student.objects.bulk_create([student for _, _, student in rest])
+    conflicts = [(line, cells, f'Roll "{student.roll}" already exists')
+                 for line, cells, student in chunk if student.roll in taken]
+    return len(rest), conflicts
+
+
+def _import_report_key(user_id, token):
+    return f'student-import-errors:{user_id}:{token}'
+
+
+def _store_import_report(request, header, failed):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([*header, 'error'])
+    for line, cells, error in failed:
+        writer.writerow([*cells, *[''] * (len(header) - len(cells)), error])
+
+    token = secrets.token_urlsafe(16)
+    cache.set(_import_report_key(request.user.id, token), buffer.getvalue(), STUDENT_IMPORT_REPORT_TTL)
+    return request.build_absolute_uri(reverse('student-import-report', args=[token]))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bulk operations
+# ─────────────────────────────────────────────────────────────────────────────
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def student_bulk_view(request):
+    """
+    Move, re-price or delete many students at once
+    POST /api/students/bulk/
+    Headers: Authorization: Bearer <access_token>
+    Body (JSON):
+    {
+        "ids": ["<uuid>", ...],            ┐ at least one; combined
+        "batch_id": "<uuid>" | "none",     │ "none" = students without a batch
+        "all": true,                       ┘
+        "operation": {"type": "move_batch",  "batch": "<uuid>" | null}
+                   | {"type": "adjust_fees", "percent": 10 | "amount": 500 | "set": 12000}
+                   | {"type": "delete"},
+        "dry_run": true                     optional: report what would change
+    }
+
+    Runs as one UPDATE/DELETE per chunk of students (api/bulk.py) and
+    returns how many were matched and affected. A dry run writes nothing
+    and adds a preview of the first students with their new values.
+    """
+    data = request.data
+    if not isinstance(data, dict):
+        return Response({'success': False, 'message': 'The body must be a JSON object'}, status=400)
+    try:
+        operation = parse_operation(request.user, data.get('operation'))
+        students  = select_students(request.user, data)
+        if data.get('dry_run'):
+            result = preview_operation(students, operation)
+        else:
+            result = apply_operation(request.user, students, operation)
+    except BulkError as e:
+        return Response({'success': False, 'message': str(e)}, status=400)
+
+    dry_run = bool(data.get('dry_run'))
+    verb    = 'would be' if dry_run else 'were'
+    return Response({
+        'success':   True,
+        'message':   f'{result["affected"]} of {result["matched"]} matched students {verb} changed',
+        'operation': operation.name,
+        'dry_run':   dry_run,
+        **result,
     })
 
 
@@ -148,9 +445,12 @@ def student_upload_profile_pic_view(request, student_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('student-full-profile')
 def student_full_profile_view(request, student_id):
     """
     GET /api/students/<id>/profile/
+    GET /api/students/<id>/profile/?sections=attendance,tests
 
     Returns a complete student profile in ONE request:
       - student          basic info
@@ -158,97 +458,38 @@ def student_full_profile_view(request, student_id):
       - attendance       date → status map + monthly stats + totals
       - fees             payment history + summary
       - tests            all test results with percentage
-      - summary          key KPIs for the overview tab
-    """
-    student = get_object_or_404(Student, id=student_id, user=request.user)
-    batch   = student.batch
-
-    # ── Attendance ────────────────────────────────────────────────────────────
-    att_records = AttendanceRecord.objects.filter(
-        student=student,
-        attendance__user=request.user,
-    ).select_related('attendance').order_by('attendance__date')
-
-    date_map: dict[str, str] = {}
-    monthly:  dict[str, dict] = {}
-
-    for rec in att_records:
-        date_str  = str(rec.attendance.date)
-        month_key = date_str[:7]
-        date_map[date_str] = rec.status
-
-        if month_key not in monthly:
-            monthly[month_key] = {'present': 0, 'absent': 0, 'leave': 0, 'total': 0, 'pct': 0}
-        monthly[month_key][rec.status] += 1
-        monthly[month_key]['total']    += 1
-
-    for m in monthly.values():
-        m['pct'] = round(m['present'] / m['total'] * 100) if m['total'] else 0
-
-    att_total   = att_records.count()
-    att_present = att_records.filter(status='present').count()
-    att_absent  = att_records.filter(status='absent').count()
-    att_leave   = att_records.filter(status='leave').count()
-    att_pct     = round(att_present / att_total * 100) if att_total else 0
-
-    # ── Fees ──────────────────────────────────────────────────────────────────
-    fee_payments = FeePayment.objects.filter(
-        student=student, user=request.user
-    ).order_by('-payment_date')
-
-    fee_serializer = FeePaymentSerializer(fee_payments, many=True)
-
-    total_fee   = float(student.total_fees)
-    fees_paid   = float(student.fees_paid)
-    fees_due    = total_fee - fees_paid
-    fee_pct     = round(fees_paid / total_fee * 100) if total_fee > 0 else 0
-
-    # ── Tests ─────────────────────────────────────────────────────────────────
-    test_marks = TestMark.objects.filter(
-        student=student,
-        test__user=request.user,
-    ).select_related('test', 'test__batch').order_by('-test__date')
+      - summary          key KPIs for the overview tab (of the sections returned)
 
-    tests_data = []
-    for tm in test_marks:
-        t   = tm.test
-        pct = round(float(tm.marks_obtained) / t.total_marks * 100) if t.total_marks > 0 else 0
-        tests_data.append({
-            'test_id':      str(t.id),
-            'test_name':    t.name,
-            'date':         str(t.date),
-            'board':        t.board,
-            'batch_name':   t.batch.name if t.batch else '',
-            'total_marks':  t.total_marks,
-            'marks_obtained': float(tm.marks_obtained),
-            'pct':          pct,
-            'grade':        _grade(pct),
-        })
+    `sections` picks any of attendance, fees, tests (default: all).
+
+    Query budget: 5 with every section — the student with its batch, the
+    attendance (date, status) rows, the per-month counts grouped in SQL, the
+    payments with the student name, and the marks joined to their tests.
+    Each section costs at most 2 of those, whatever the history length.
+    The student lookup is the tenant check; the section queries filter on the
+    student alone so they walk its index rather than the whole tenant's.
 
-    avg_test_pct = (
-        round(sum(t['pct'] for t in tests_data) / len(tests_data))
-        if tests_data else None
+    On PostgreSQL the sections are built as JSON by the database in a single
+    query (api/json_sql.py) and spliced into the response: 2 queries.
+    """
+    sections = _profile_sections(request)
+    if sections is None:
+        return Response({
+            'success': False,
+            'message': f"sections must be a comma separated subset of: {', '.join(PROFILE_SECTIONS)}",
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    student = get_object_or_404(
+        Student.objects.select_related('batch'), id=student_id, user=request.user,
     )
+    batch = student.batch
 
-    # ── Summary KPIs ──────────────────────────────────────────────────────────
-    summary = {
-        'attendance_pct':  att_pct,
-        'attendance_total': att_total,
-        'attendance_present': att_present,
-        'fees_paid':       fees_paid,
-        'fees_due':        fees_due,
-        'fee_pct':         fee_pct,
-        'tests_count':     len(tests_data),
-        'avg_test_pct':    avg_test_pct,
-        'overall_status':  (
-            'excellent' if att_pct >= 75 and fee_pct >= 80 and (avg_test_pct or 0) >= 70
-            else 'good' if att_pct >= 75 and fee_pct >= 50
-            else 'needs_attention'
-        ),
-    }
+    total_fee = float(student.total_fees)
+    fees_paid = float(student.fees_paid)
+    fees_due  = total_fee - fees_paid
+    fee_pct   = round(fees_paid / total_fee * 100) if total_fee > 0 else 0
 
-    # ── Response ──────────────────────────────────────────────────────────────
-    return Response({
+    payload = {
         'success': True,
         'student': StudentSerializer(student, context={'request': request}).data,
         'batch': {
@@ -256,29 +497,133 @@ def student_full_profile_view(request, student_id):
             'name':   batch.name   if batch else None,
             'timing': batch.timing if batch else None,
         },
-        'attendance': {
-            'date_map': date_map,
-            'monthly':  monthly,
-            'totals': {
-                'total':   att_total,
-                'present': att_present,
-                'absent':  att_absent,
-                'leave':   att_leave,
-                'pct':     att_pct,
-            },
-        },
-        'fees': {
+    }
+    att_summary, test_summary = {}, {}
+    in_sql = profile_sections(student, sections) if supports_sql_json() else None
+
+    if 'attendance' in sections:
+        payload['attendance'] = in_sql['attendance'] if in_sql else _profile_attendance(student)
+        totals = payload['attendance']['totals']
+        totals['pct'] = round(totals['present'] / totals['total'] * 100) if totals['total'] else 0
+        att_summary.update({
+            'attendance_pct':     totals['pct'],
+            'attendance_total':   totals['total'],
+            'attendance_present': totals['present'],
+        })
+
+    if 'fees' in sections:
+        if in_sql:
+            payments = in_sql['payments']
+        else:
+            fee_payments = FeePayment.objects.filter(student=student).order_by('-payment_date')
+            payments = FeePaymentSerializer(fee_payments, many=True).data
+        payload['fees'] = {
             'summary': {
                 'total_fee':  total_fee,
                 'fees_paid':  fees_paid,
                 'fees_due':   fees_due,
                 'fee_pct':    fee_pct,
             },
-            'payments': fee_serializer.data,
-        },
-        'tests': tests_data,
-        'summary': summary,
-    }, status=status.HTTP_200_OK)
+            'payments': payments,
+        }
+
+    if 'tests' in sections:
+        tests_data, tests_count, pct_sum = in_sql['tests'] if in_sql else _profile_tests(student)
+        payload['tests'] = tests_data
+        test_summary.update({
+            'tests_count':  tests_count,
+            'avg_test_pct': round(pct_sum / tests_count) if tests_count else None,
+        })
+
+    summary = {
+        **att_summary,
+        'fees_paid': fees_paid,
+        'fees_due':  fees_due,
+        'fee_pct':   fee_pct,
+        **test_summary,
+    }
+    if {'attendance', 'tests'} <= sections:
+        att_pct, avg_test_pct = summary['attendance_pct'], summary['avg_test_pct']
+        summary['overall_status'] = (
+            'excellent' if att_pct >= 75 and fee_pct >= 80 and (avg_test_pct or 0) >= 70
+            else 'good' if att_pct >= 75 and fee_pct >= 50
+            else 'needs_attention'
+        )
+
+    payload['summary'] = summary
+    if in_sql:
+        return RawJSONResponse(render_json(payload))
+    return Response(payload, status=status.HTTP_200_OK)
+
+
+def _profile_sections(request):
+    """Sections asked for with ?sections=, or None if any name is unknown."""
+    raw = request.query_params.get('sections')
+    if not raw:
+        return set(PROFILE_SECTIONS)
+    sections = {s.strip() for s in raw.split(',') if s.strip()}
+    return sections if sections <= set(PROFILE_SECTIONS) else None
+
+
+def _profile_attendance(student):
+    """Date map, monthly counts and totals (without pct) — 2 queries."""
+    # Sessions of the student's own institute, as in the SQL path
+    records = AttendanceRecord.objects.filter(student=student, attendance__user_id=student.user_id)
+
+    date_map = {
+        str(day): status_
+        for day, status_ in records.order_by('attendance__date').values_list('attendance__date', 'status')
+    }
+
+    monthly = {}
+    totals  = {'total': 0, 'present': 0, 'absent': 0, 'leave': 0}
+    rows = (
+        records.annotate(month=TruncMonth('attendance__date'))
+        .values('month')
+        .annotate(
+            present=Count('id', filter=Q(status='present')),
+            absent=Count('id', filter=Q(status='absent')),
+            leave=Count('id', filter=Q(status='leave')),
+            total=Count('id'),
+        )
+        .order_by('month')
+    )
+    for row in rows:
+        monthly[row['month'].strftime('%Y-%m')] = {
+            'present': row['present'],
+            'absent':  row['absent'],
+            'leave':   row['leave'],
+            'total':   row['total'],
+            'pct':     round(row['present'] / row['total'] * 100) if row['total'] else 0,
+        }
+        for key in totals:
+            totals[key] += row[key]
+
+    return {'date_map': date_map, 'monthly': monthly, 'totals': totals}
+
+
+def _profile_tests(student):
+    """(results newest first, count, sum of percentages) — 1 query."""
+    marks = TestMark.objects.filter(student=student).order_by('-test__date').values_list(
+        'test_id', 'test__name', 'test__date', 'test__board', 'test__batch__name',
+        'test__total_marks', 'marks_obtained',
+    )
+
+    tests_data = []
+    for test_id, name, day, board, batch_name, total_marks, obtained in marks:
+        pct = round(float(obtained) / total_marks * 100) if total_marks > 0 else 0
+        tests_data.append({
+            'test_id':      str(test_id),
+            'test_name':    name,
+            'date':         str(day),
+            'board':        board,
+            'batch_name':   batch_name or '',
+            'total_marks':  total_marks,
+            'marks_obtained': float(obtained),
+            'pct':          pct,
+            'grade':        _grade(pct),
+        })
+    return tests_data, len(tests_data), sum(t['pct'] for t in tests_data)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -0,0 +1,60 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from django.conf import settings
+
+from ..cache import conditional_get
+from ..sync import pull, push
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@conditional_get()
+def sync_view(request):
+    """
+    GET  /api/sync/?cursor=<cursor>   — changes since the cursor (omit it for everything)
+    POST /api/sync/                   — apply queued offline writes, then pull
+
+    POST body:
+    {
+        "cursor": "<cursor>",
+        "operations": [
+            {"entity": "students", "op": "upsert", "id": "<uuid>", "data": {...}},
+            {"entity": "fee_payments", "op": "delete", "id": "<uuid>"}
+        ]
+    }
+
+    Keep calling with the returned cursor while "has_more" is true. A 410
+    means the cursor is too old to know every delete: sync from scratch.
+    See api/sync.py for the protocol.
+    """
+    if request.method == 'GET':
+        return Response({'success': True, **pull(request, request.query_params.get('cursor'))})
+
+    if not isinstance(request.data, dict):
+        return Response({
+            'success': False,
+            'message': 'The body must be a JSON object',
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    operations = request.data.get('operations', [])
+    limit      = getattr(settings, 'SYNC_PUSH_LIMIT', 500)
+    if not isinstance(operations, list):
+        return Response({
+            'success': False,
+            'message': '"operations" must be a list',
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > limit:
+        return Response({
+            'success': False,
+            'message': f'At most {limit} operations per push',
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    results = push(request, operations)
+    failed  = any(result['status'] != 'ok' for result in results)
+    return Response({
+        'success': not failed,
+        'results': results,
+        **pull(request, request.data.get('cursor')),
+    }, status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK)
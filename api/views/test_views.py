@@ -3,14 +3,33 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg
+from django.http import StreamingHttpResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Value, Window
+from django.db.models.functions import Coalesce, Greatest, NullIf, Sqrt
+from decimal import Decimal, InvalidOperation
+import hashlib
+import json
+import uuid
 
 from ..models import Test, TestMark, Batch, Student
 from ..serializers import TestSerializer, TestMarkSerializer
+from ..queries import mark_percentage
+from ..imports import SpreadsheetError, iter_sheet_rows, chunked
+from ..cache import cached_tenant_response, bump_tenant_version, conditional_get
+from ..rollups import mark_rollups_dirty
+from ..sync import touch_sync_parents
+from ..pagination import keyset_paginate
+
+TEST_ORDERING            = ('-date', '-id')
+COMPARISON_CACHE_TIMEOUT = 60 * 60 * 24
+MARKS_IMPORT_CHUNK_SIZE  = 500
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def test_list_create_view(request):
     """
     GET /api/tests/ - List all tests
@@ -37,10 +56,12 @@ def test_list_create_view(request):
         if batch_id:
             tests = tests.filter(batch_id=batch_id)
         
-        serializer = TestSerializer(tests, many=True)
+        tests = TestSerializer.optimize_queryset(tests, request)
+        page  = keyset_paginate(request, tests, TEST_ORDERING)
+        serializer = TestSerializer(page.object_list, many=True, context={'request': request})
         return Response({
             'success': True,
-            'count': tests.count(),
+            **page.meta,
             'tests': serializer.data
         }, status=status.HTTP_200_OK)
     
@@ -68,6 +89,7 @@ def test_list_create_view(request):
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
 def test_detail_view(request, test_id):
     """
     GET /api/tests/<id>/ - Get test details
@@ -78,7 +100,7 @@ def test_detail_view(request, test_id):
     test = get_object_or_404(Test, id=test_id, user=request.user)
     
     if request.method == 'GET':
-        serializer = TestSerializer(test)
+        serializer = TestSerializer(test, context={'request': request})
         return Response({
             'success': True,
             'test': serializer.data
@@ -136,25 +158,29 @@ def test_marks_bulk_create_view(request, test_id):
     created_marks = []
     errors = []
     
-    for mark_data in marks_data:
-        student_id = mark_data.get('student')
-        marks_obtained = mark_data.get('marks_obtained')
-        
-        try:
-            student = Student.objects.get(id=student_id, user=request.user)
+    # One transaction, so the rollup rebuild, version bump and sync touch
+    # that every saved mark schedules run once on commit, not once per row.
+    # update_or_create keeps a savepoint per row for the rows that fail.
+    with transaction.atomic():
+        for mark_data in marks_data:
+            student_id = mark_data.get('student')
+            marks_obtained = mark_data.get('marks_obtained')
             
-            # Update if exists, create if not
-            mark, created = TestMark.objects.update_or_create(
-                test=test,
-                student=student,
-                defaults={'marks_obtained': marks_obtained}
-            )
-            
-            created_marks.append(TestMarkSerializer(mark).data)
-        except Student.DoesNotExist:
-            errors.append(f"Student {student_id} not found")
-        except Exception as e:
-            errors.append(f"Error for student {student_id}: {str(e)}")
+            try:
+                student = Student.objects.get(id=student_id, user=request.user)
+                
+                # Update if exists, create if not
+                mark, created = TestMark.objects.update_or_create(
+                    test=test,
+                    student=student,
+                    defaults={'marks_obtained': marks_obtained}
+                )
+                
+                created_marks.append(TestMarkSerializer(mark).data)
+            except Student.DoesNotExist:
+                errors.append(f"Student {student_id} not found")
+            except Exception as e:
+                errors.append(f"Error for student {student_id}: {str(e)}")
     
     return Response({
         'success': len(errors) == 0,
@@ -164,8 +190,180 @@ def test_marks_bulk_create_view(request, test_id):
     }, status=status.HTTP_200_OK if len(errors) == 0 else status.HTTP_207_MULTI_STATUS)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def test_marks_import_view(request):
+    """
+    Import marks from a CSV/XLSX sheet
+    POST /api/tests/marks/import/
+    Headers: Authorization: Bearer <access_token>
+    Body: multipart/form-data  key = "file"
+
+    Optional fields:
+    - test_id:  import a single test; the sheet is "roll, marks"
+    - batch_id: restrict test-name lookup to one batch
+
+    Without test_id the first row is a header: "roll" followed by one column
+    per test, named by test id or test name. Blank cells are skipped.
+
+    Rows are upserted in chunks and the response is a stream of JSON lines,
+    one per chunk, followed by a final summary line.
+    """
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'success': False, 'message': 'No file provided'}, status=400)
+
+    tests    = Test.objects.filter(user=request.user)
+    test_id  = request.data.get('test_id') or request.query_params.get('test_id')
+    batch_id = request.data.get('batch_id') or request.query_params.get('batch_id')
+    for label, value in (('test_id', test_id), ('batch_id', batch_id)):
+        try:
+            if value:
+                uuid.UUID(str(value))
+        except ValueError:
+            return Response({'success': False, 'message': f'"{label}" is not a valid id'}, status=400)
+    rows = iter_sheet_rows(upload)
+
+    try:
+        header = next(rows, None)
+        if header is None:
+            return Response({'success': False, 'message': 'The file is empty'}, status=400)
+
+        if test_id:
+            columns = {1: get_object_or_404(tests, id=test_id)}
+        else:
+            if batch_id:
+                tests = tests.filter(batch_id=batch_id)
+            columns, header_errors = _resolve_test_columns(header, tests)
+            if header_errors:
+                return Response({
+                    'success': False,
+                    'message': 'Could not match sheet columns to tests',
+                    'errors':  header_errors,
+                }, status=status.HTTP_400_BAD_REQUEST)
+    except SpreadsheetError as e:
+        return Response({'success': False, 'message': str(e)}, status=400)
+
+    # One lookup for the whole sheet instead of one query per row. Rolls are
+    # unique as typed, so "A1" and "a1" can both exist: a roll that differs
+    # only in case from several students' matches none of them (None).
+    students, folded = {}, {}
+    for roll, pk in Student.objects.filter(user=request.user).values_list('roll', 'id'):
+        roll = roll.strip()
+        if roll:
+            students[roll] = pk
+            folded[roll.lower()] = None if roll.lower() in folded else pk
+
+    return StreamingHttpResponse(
+        _stream_marks_import(request.user.id, rows, columns, students, folded),
+        content_type='application/x-ndjson',
+    )
+
+
+def _resolve_test_columns(header, tests):
+    """Map sheet column index → Test using a single query for every header."""
+    by_id, by_name = {}, {}
+    for test in tests:
+        by_id[str(test.id)] = test
+        by_name.setdefault(test.name.strip().lower(), []).append(test)
+
+    columns, errors = {}, []
+    for index, label in enumerate(header[1:], start=1):
+        if not label:
+            continue
+        test = by_id.get(label.lower())
+        if test is None:
+            matches = by_name.get(label.lower(), [])
+            if len(matches) > 1:
+                errors.append(f'"{label}" matches {len(matches)} tests; use the test id or batch_id')
+                continue
+            test = matches[0] if matches else None
+        if test is None:
+            errors.append(f'No test found for column "{label}"')
+            continue
+        columns[index] = test
+
+    if not columns and not errors:
+        errors.append('No test columns found after "roll"')
+    return columns, errors
+
+
+def _stream_marks_import(user_id, rows, columns, students, folded):
+    totals = {'rows': 0, 'upserted': 0, 'errors': 0}
+    line   = 1    # header
+
+    try:
+        for chunk_no, chunk in enumerate(chunked(rows, MARKS_IMPORT_CHUNK_SIZE), start=1):
+            marks, errors = {}, []
+
+            for cells in chunk:
+                line += 1
+                roll = cells[0] if cells else ''
+                student_id = students.get(roll) or folded.get(roll.lower())
+                if student_id is None:
+                    error = (f'Roll "{roll}" matches several students; use the exact case'
+                             if roll.lower() in folded else f'Unknown roll "{roll}"')
+                    errors.append({'line': line, 'error': error})
+                    continue
+
+                for index, test in columns.items():
+                    raw = cells[index] if index < len(cells) else ''
+                    if raw == '':
+                        continue
+                    try:
+                        value = Decimal(raw)
+                    except InvalidOperation:
+                        value = None
+                    # Decimal() also parses "NaN" and "Infinity", which cannot be compared
+                    if value is None or not value.is_finite():
+                        errors.append({'line': line, 'test': test.name, 'error': f'"{raw}" is not a number'})
+                        continue
+                    if not 0 <= value <= test.total_marks:
+                        errors.append({'line': line, 'test': test.name,
+                                       'error': f'{raw} is outside 0-{test.total_marks}'})
+                        continue
+                    # Last occurrence wins if a roll repeats within the sheet
+                    marks[(test.id, student_id)] = TestMark(
+                        id=uuid.uuid4(), test=test, student_id=student_id, marks_obtained=value,
+                    )
+
+            with transaction.atomic():
+                TestMark.objects.bulk_create(
+                    marks.values(),
+                    update_conflicts=True,
+                    unique_fields=['test', 'student'],
+                    update_fields=['marks_obtained', 'updated_at'],
+                )
+                # bulk_create sends no post_save signals
+                bump_tenant_version(user_id)
+                touch_sync_parents(Test, *{mark.test_id for mark in marks.values()})
+                mark_rollups_dirty(user_id, *{mark.test.date for mark in marks.values()})
+
+            totals['rows']     += len(chunk)
+            totals['upserted'] += len(marks)
+            totals['errors']   += len(errors)
+            yield json.dumps({
+                'chunk':    chunk_no,
+                'rows':     len(chunk),
+                'upserted': len(marks),
+                'errors':   errors,
+            }) + '\n'
+    except SpreadsheetError as e:
+        totals['errors'] += 1
+        yield json.dumps({'line': line, 'error': str(e)}) + '\n'
+
+    yield json.dumps({
+        'done':    True,
+        'success': totals['errors'] == 0,
+        'message': f"{totals['upserted']} marks recorded from {totals['rows']} rows",
+        **totals,
+    }) + '\n'
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('test-marks-list')
 def test_marks_list_view(request, test_id):
     """
     Get all marks for a specific test
@@ -175,7 +373,7 @@ def test_marks_list_view(request, test_id):
     test = get_object_or_404(Test, id=test_id, user=request.user)
     marks = TestMark.objects.filter(test=test)
     
-    serializer = TestMarkSerializer(marks, many=True)
+    serializer = TestMarkSerializer(marks, many=True, context={'request': request})
     
     # Calculate statistics
     if marks.exists():
@@ -209,6 +407,8 @@ def test_marks_list_view(request, test_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get()
+@cached_tenant_response('student-test-report')
 def student_test_report_view(request, student_id):
     """
     Get test report for a specific student
@@ -249,4 +449,162 @@ def student_test_report_view(request, student_id):
             'average_percentage': round(avg_percentage, 2)
         },
         'tests': report
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_get()
+def test_comparison_view(request):
+    """
+    Compare the same paper across batches
+    GET /api/tests/compare/
+    Headers: Authorization: Bearer <access_token>
+
+    Query params (either):
+    - test_id: compare every test matching this test's name/board/total_marks
+    - name, board, total_marks: identify the paper directly
+
+    Percentages are normalised per batch and across all batches (z-scores).
+    The whole comparison is one windowed query over the matching marks and
+    is cached until a contributing test, mark, student or batch changes.
+    """
+    test_id = request.query_params.get('test_id')
+    if test_id:
+        ref = get_object_or_404(Test, id=test_id, user=request.user)
+        name, board, total_marks = ref.name, ref.board, ref.total_marks
+    else:
+        name  = request.query_params.get('name', '').strip()
+        board = request.query_params.get('board', '').strip()
+        try:
+            total_marks = int(request.query_params.get('total_marks', ''))
+        except ValueError:
+            total_marks = None
+
+        if not name or not board or total_marks is None:
+            return Response({
+                'success': False,
+                'message': 'Provide test_id, or name, board and total_marks.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    if total_marks <= 0:
+        return Response({
+            'success': False,
+            'message': 'total_marks must be greater than zero.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    tests = Test.objects.filter(
+        user=request.user, name__iexact=name, board=board, total_marks=total_marks
+    )
+
+    # Cheap fingerprint: any edit, new mark or deleted mark/test changes it,
+    # as does renaming a student or batch shown in the comparison
+    fingerprint = tests.aggregate(
+        test_count=Count('id', distinct=True),
+        test_updated=Max('updated_at'),
+        mark_count=Count('marks'),
+        mark_updated=Max('marks__updated_at'),
+        student_updated=Max('marks__student__updated_at'),
+        batch_updated=Max('batch__updated_at'),
+    )
+    paper_key = hashlib.sha1(f'{name.lower()}|{board}|{total_marks}'.encode()).hexdigest()
+    state_key = hashlib.sha1(repr(sorted(fingerprint.items())).encode()).hexdigest()
+    cache_key = f'test-compare:{request.user.id}:{paper_key}:{state_key}'
+
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = _build_test_comparison(tests, name, board, total_marks)
+        cache.set(cache_key, payload, COMPARISON_CACHE_TIMEOUT)
+
+    return Response({'success': True, **payload}, status=status.HTTP_200_OK)
+
+
+def _build_test_comparison(tests, name, board, total_marks):
+    pct = mark_percentage()
+
+    def spread(partition=None):
+        # mean, population stdev and z-score of `pct` over a window,
+        # with stdev = sqrt(E[x²] - E[x]²) and z = 0 when there is no spread
+        mean  = Window(Avg(pct), partition_by=partition)
+        stdev = Sqrt(Greatest(
+            Window(Avg(pct * pct), partition_by=partition) - mean * mean, Value(0.0)
+        ))
+        z = Coalesce((pct - mean) / NullIf(stdev, Value(0.0)), Value(0.0))
+        return mean, stdev, z
+
+    batch_mean,   batch_stdev,   z_batch   = spread([F('test_id')])
+    overall_mean, overall_stdev, z_overall = spread()
+
+    rows = (
+        TestMark.objects
+        .filter(test__in=tests)
+        .annotate(
+            pct           = pct,
+            batch_mean    = batch_mean,
+            batch_stdev   = batch_stdev,
+            batch_count   = Window(Count('id'), partition_by=[F('test_id')]),
+            overall_mean  = overall_mean,
+            overall_stdev = overall_stdev,
+            z_batch       = z_batch,
+            z_overall     = z_overall,
+        )
+        .values(
+            'student_id', 'student__name', 'student__roll', 'marks_obtained',
+            'test_id', 'test__date', 'test__batch_id', 'test__batch__name',
+            'pct', 'batch_mean', 'batch_stdev', 'batch_count',
+            'overall_mean', 'overall_stdev', 'z_batch', 'z_overall',
+        )
+        .order_by('test__batch__name', '-marks_obtained')
+    )
+
+    batches: dict[str, dict] = {}
+    students = []
+    overall  = {'students': 0, 'mean': 0, 'stdev': 0}
+
+    for row in rows:
+        p   = round(row['pct'], 2)
+        key = str(row['test_id'])
+        overall_stdev = row['overall_stdev']
+
+        if not students:
+            overall['mean']  = round(row['overall_mean'], 2)
+            overall['stdev'] = round(overall_stdev, 2)
+
+        b = batches.get(key)
+        if b is None:
+            b = batches[key] = {
+                'batch_id':    str(row['test__batch_id']),
+                'batch_name':  row['test__batch__name'],
+                'test_id':     key,
+                'test_date':   str(row['test__date']),
+                'students':    row['batch_count'],
+                'mean_pct':    round(row['batch_mean'], 2),
+                'stdev_pct':   round(row['batch_stdev'], 2),
+                'highest_pct': p,
+                'lowest_pct':  p,
+                'z_mean': round(
+                    (row['batch_mean'] - row['overall_mean']) / overall_stdev, 2
+                ) if overall_stdev else 0,
+            }
+        b['highest_pct'] = max(b['highest_pct'], p)
+        b['lowest_pct']  = min(b['lowest_pct'],  p)
+        overall['students'] += 1
+
+        students.append({
+            'student_id':     str(row['student_id']),
+            'name':           row['student__name'],
+            'roll':           row['student__roll'],
+            'batch_id':       b['batch_id'],
+            'test_id':        key,
+            'marks_obtained': float(row['marks_obtained']),
+            'pct':            p,
+            'z_batch':        round(row['z_batch'], 2),
+            'z_overall':      round(row['z_overall'], 2),
+        })
+
+    return {
+        'paper':    {'name': name, 'board': board, 'total_marks': total_marks},
+        'overall':  overall,
+        'batches':  list(batches.values()),
+        'students': students,
+    }
@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  
+    # ETag/304 for GET views without their own validators (see api/cache.py)
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -108,6 +110,24 @@ else:
     }
 
 
+# ==============================================================================
+#  CACHE
+# ==============================================================================
+
+# Shared by every gunicorn worker so tenant data versions stay consistent.
+# No external service needed; point CACHE_DIR at a fast local disk.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / '.cache')),
+        'TIMEOUT': 60 * 15,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=20000, cast=int),
+        },
+    }
+}
+
+
 # ==============================================================================
 #  PASSWORD VALIDATION
 # ==============================================================================
@@ -140,6 +160,44 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored under the hash of their content and deduplicated
+# (api/storage.py); `manage.py sweep_media` removes unreferenced files.
+STORAGES = {
+    'default':     {'BACKEND': 'api.storage.ContentHashStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Media is served by /api/media/ (api/media.py) with signed links valid for
+# MEDIA_URL_TTL to 2×MEDIA_URL_TTL seconds. Django checks access and hands the
+# transfer to the front server: 'x-accel' (nginx; an `internal` location at
+# MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile' (Apache/lighttpd).
+# Empty streams the file from Django.
+MEDIA_URL_TTL      = config('MEDIA_URL_TTL', default=3600, cast=int)
+MEDIA_DELIVERY     = config('MEDIA_DELIVERY', default='')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
+# Threads per process that orient/strip/thumbnail uploaded profile pictures
+# (api/images.py). 0 processes inline, in the request.
+PROFILE_PIC_WORKERS = config('PROFILE_PIC_WORKERS', default=2, cast=int)
+
+# Threads per process running session roll-overs (api/promotions.py).
+# 0 runs them inline, in the request.
+PROMOTION_WORKERS = config('PROMOTION_WORKERS', default=1, cast=int)
+
+# Delta sync for offline clients (api/sync.py): rows per entity per response,
+# seconds of overlap between syncs (covers transactions that commit late),
+# operations per push, and days deletes are remembered (older cursors get 410).
+SYNC_PAGE_SIZE      = config('SYNC_PAGE_SIZE', default=500, cast=int)
+SYNC_CURSOR_LAG     = config('SYNC_CURSOR_LAG', default=60, cast=int)
+SYNC_PUSH_LIMIT     = config('SYNC_PUSH_LIMIT', default=500, cast=int)
+SYNC_TOMBSTONE_DAYS = config('SYNC_TOMBSTONE_DAYS', default=90, cast=int)
+
+# POST /api/multi/ (api/multi.py): sub-requests per call, their summed cost,
+# and threads running them concurrently (SQLite always runs them in turn).
+MULTI_REQUEST_LIMIT    = config('MULTI_REQUEST_LIMIT', default=10, cast=int)
+MULTI_REQUEST_MAX_COST = config('MULTI_REQUEST_MAX_COST', default=20, cast=int)
+MULTI_REQUEST_WORKERS  = config('MULTI_REQUEST_WORKERS', default=4, cast=int)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -185,6 +243,15 @@ REST_FRAMEWORK = {
     'DATETIME_FORMAT': '%Y-%m-%d %H:%M:%S',
 }
 
+# List endpoints keep the legacy "every row + count" shape unless a request
+# sends page_size or cursor (api/pagination.py). Set to True once every client
+# pages, to paginate plain requests too; ?paginate=true|false always wins.
+PAGINATE_LIST_ENDPOINTS = config('PAGINATE_LIST_ENDPOINTS', default=False, cast=bool)
+
+# Raise instead of querying when a serializer reads a relation it did not
+# declare (api/serializer_base.py). The test suite turns this on.
+SERIALIZER_STRICT_RELATIONS = False
+
 
 # ==============================================================================
 #  JWT SETTINGS
@@ -205,6 +272,9 @@ SIMPLE_JWT = {
 # Custom User Model
 AUTH_USER_MODEL = 'api.User'
 
+# Phone login through the indexed phone_e164 column
+AUTHENTICATION_BACKENDS = ['api.backends.PhoneBackend']
+
 # Phone Number Field Settings
 PHONENUMBER_DEFAULT_REGION = 'IN'
 PHONENUMBER_DB_FORMAT = 'NATIONAL'